@@ -1,7 +1,8 @@
 import os
+import json
 import uuid
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import threading
@@ -83,13 +84,24 @@ def initialize_system():
                 print("✓ Vector store loaded from cache")
                 print(f"✓ {len(all_documents)} documents loaded")
             
+            # Load pre-aggregated rollups (built alongside the vector store)
+            rollup_cube = embedding_manager.load_rollups("main")
+            if rollup_cube is None:
+                print("\n⚠ Rollups not found. Building from cached data...")
+                rollup_cube = embedding_manager.build_and_save_rollups(
+                    extractor.extract_all_datasets(force_refresh=False),
+                    name="main"
+                )
+            print("✓ Metric rollups ready")
+            
             # Initialize RAG pipeline
             if use_advanced_rag:
                 print("\nInitializing Advanced RAG Pipeline...")
                 rag_pipeline = AdvancedRAGPipeline(
                     vector_store,
                     all_documents,
-                    openai_api_key
+                    openai_api_key,
+                    rollup_cube=rollup_cube
                 )
                 print("✓ Advanced RAG Pipeline ready!")
             else:
@@ -161,6 +173,80 @@ def create_session():
         return jsonify({'error': str(e)}), 500
 
 
+def load_chat_history(db, session_id):
+    """Previous messages of a session as role/content dicts"""
+    if not session_id:
+        return []
+    
+    messages = db.query(ChatMessage)\
+        .filter_by(session_id=session_id)\
+        .order_by(ChatMessage.timestamp)\
+        .all()
+    
+    return [
+        {'role': msg.role, 'content': msg.content} 
+        for msg in messages
+    ]
+
+
+def save_exchange(db, session_id, question, result):
+    """Save the question and its answer to the session"""
+    if not session_id:
+        return
+    
+    # Save user message
+    user_msg = ChatMessage(
+        session_id=session_id,
+        role='user',
+        content=question,
+        sources=None
+    )
+    db.add(user_msg)
+    
+    # Save assistant message
+    assistant_msg = ChatMessage(
+        session_id=session_id,
+        role='assistant',
+        content=result['answer'],
+        sources=result['sources']
+    )
+    db.add(assistant_msg)
+    
+    # Update session activity
+    session = db.query(ChatSession)\
+        .filter_by(session_id=session_id)\
+        .first()
+    
+    if session:
+        session.last_active = datetime.utcnow()
+    
+    db.commit()
+
+
+def build_chat_response(result):
+    """Client payload for a pipeline result"""
+    response = {
+        'answer': result['answer'],
+        'sources': result['sources'],
+        'num_sources': result['num_sources'],
+        'num_documents': result.get('num_documents', 0),
+    }
+    
+    # Add advanced features info if available
+    if 'confidence' in result:
+        response['confidence'] = result['confidence']
+    
+    if 'pipeline_info' in result:
+        response['pipeline_info'] = result['pipeline_info']
+    
+    return response
+
+
+def sse_event(event, data):
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Main chat endpoint with advanced RAG"""
@@ -185,17 +271,7 @@ def chat():
         db = get_db_session()
         
         # Retrieve chat history
-        chat_history = []
-        if session_id:
-            messages = db.query(ChatMessage)\
-                .filter_by(session_id=session_id)\
-                .order_by(ChatMessage.timestamp)\
-                .all()
-            
-            chat_history = [
-                {'role': msg.role, 'content': msg.content} 
-                for msg in messages
-            ]
+        chat_history = load_chat_history(db, session_id)
         
         # Process query with RAG pipeline
         print(f"\n{'='*60}")
@@ -211,53 +287,10 @@ def chat():
         )
         
         # Save to database
-        if session_id:
-            # Save user message
-            user_msg = ChatMessage(
-                session_id=session_id,
-                role='user',
-                content=question,
-                sources=None
-            )
-            db.add(user_msg)
-            
-            # Save assistant message
-            assistant_msg = ChatMessage(
-                session_id=session_id,
-                role='assistant',
-                content=result['answer'],
-                sources=result['sources']
-            )
-            db.add(assistant_msg)
-            
-            # Update session activity
-            session = db.query(ChatSession)\
-                .filter_by(session_id=session_id)\
-                .first()
-            
-            if session:
-                session.last_active = datetime.utcnow()
-            
-            db.commit()
-        
+        save_exchange(db, session_id, question, result)
         db.close()
         
-        # Prepare response
-        response = {
-            'answer': result['answer'],
-            'sources': result['sources'],
-            'num_sources': result['num_sources'],
-            'num_documents': result.get('num_documents', 0),
-        }
-        
-        # Add advanced features info if available
-        if 'confidence' in result:
-            response['confidence'] = result['confidence']
-        
-        if 'pipeline_info' in result:
-            response['pipeline_info'] = result['pipeline_info']
-        
-        return jsonify(response)
+        return jsonify(build_chat_response(result))
     
     except Exception as e:
         print(f"\n❌ ERROR in chat endpoint: {str(e)}")
@@ -266,6 +299,68 @@ def chat():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Chat endpoint streaming the answer as server-sent events:
+    'token' events with answer text as it is generated, then one 'final'
+    event with the cleaned answer, sources, confidence and pipeline_info
+    (or an 'error' event)
+    """
+    is_ready, error = ensure_system_initialized()
+    if not is_ready:
+        return jsonify({
+            'error': f'System not initialized: {error}. Please wait a moment and try again.'
+        }), 503
+    
+    if not hasattr(rag_pipeline, 'process_query_stream'):
+        return jsonify({'error': 'Streaming requires the advanced RAG pipeline'}), 501
+    
+    data = request.json
+    question = data.get('question', '').strip()
+    session_id = data.get('session_id', '')
+    category = data.get('category')
+    
+    if not question:
+        return jsonify({'error': 'Question is required'}), 400
+    
+    def generate():
+        db = get_db_session()
+        try:
+            chat_history = load_chat_history(db, session_id)
+            
+            print(f"\n{'='*60}")
+            print(f"New Query (streaming): {question}")
+            print(f"Session: {session_id[:8]}...")
+            print(f"{'='*60}")
+            
+            for event, payload in rag_pipeline.process_query_stream(
+                question,
+                chat_history=chat_history,
+                category=category,
+                enable_all_features=use_advanced_rag
+            ):
+                if event == 'final':
+                    save_exchange(db, session_id, question, payload)
+                    payload = build_chat_response(payload)
+                yield sse_event(event, payload)
+        
+        except Exception as e:
+            print(f"\n❌ ERROR in streaming chat endpoint: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield sse_event('error', {'error': str(e)})
+        
+        finally:
+            db.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/history/<session_id>', methods=['GET'])
 def get_history(session_id):
     """Retrieve chat history for a session"""
@@ -358,12 +453,13 @@ def rebuild_index():
             use_advanced_chunking=True
         )
         
-        # Reinitialize pipeline
+        # Reinitialize pipeline (rollups were rebuilt with the vector store)
         if use_advanced_rag:
             rag_pipeline = AdvancedRAGPipeline(
                 vector_store,
                 all_documents,
-                openai_api_key
+                openai_api_key,
+                rollup_cube=embedding_manager.load_rollups("main")
             )
         else:
             rag_pipeline = SimpleRAGPipeline(vector_store, openai_api_key)
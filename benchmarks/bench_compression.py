@@ -0,0 +1,124 @@
+"""
+Benchmark context compression modes against the local fake LLM.
+
+Each query compresses --docs report-style documents (long enough that the
+sentence extract still needs LLM compression). Reports LLM round trips,
+prompt/completion tokens and wall time per query for:
+  batched     - one call with every document between [DOC n] markers, JSON extracts back
+  parallel    - one extraction_prompt call per document, issued concurrently
+  sequential  - one extraction_prompt call per document, one after another
+  cached      - parallel, with the workload repeated against a warm compression cache
+
+Usage: python benchmarks/bench_compression.py [--time-scale 0.1] [--docs 8] [--corrupt-json-every 0]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from data_pipeline.config import RAG_CONFIG
+from rag_system.context_compressor import ContextCompressor
+from fake_llm import FakeChatLLM
+from synthetic_corpus import STATES, CROPS, make_records
+
+MODES = {
+    'batched': ('batched', {'parallel_compression': True, 'enable_compression_cache': False}),
+    'parallel': ('hybrid', {'parallel_compression': True, 'enable_compression_cache': False}),
+    'sequential': ('hybrid', {'parallel_compression': False, 'enable_compression_cache': False}),
+    'cached': ('hybrid', {'parallel_compression': True, 'enable_compression_cache': True}),
+}
+
+
+def make_document(records: list, state: str, crop: str) -> Document:
+    """One prose document per (state, crop) with a sentence per record"""
+    sentences = [
+        f"In {r['crop_year']} the {r['season']} season {r['crop']} crop in {r['district_name']}, "
+        f"{r['state_name']} state covered {r['area_']} hectares and produced {r['production_']} tonnes, "
+        f"a yield of {r['production_'] / r['area_']:.2f} tonnes per hectare."
+        for r in records if r['state_name'] == state and r['crop'] == crop
+    ]
+    return Document(
+        page_content=" ".join(sentences),
+        metadata={'dataset_name': 'Crop Production Data', 'state': state, 'crop': crop}
+    )
+
+
+def make_workload(num_queries: int, num_docs: int, seed: int = 0) -> list:
+    """[(query, documents), ...] with documents about the queried state or crop"""
+    rng = random.Random(seed)
+    records = make_records(seed)['agriculture']
+    pairs = sorted({(r['state_name'], r['crop']) for r in records})
+    
+    workload = []
+    for _ in range(num_queries):
+        state, crop = rng.choice(STATES), rng.choice(CROPS)
+        related = [p for p in pairs if p[0] == state or p[1] == crop]
+        chosen = rng.sample(related, min(num_docs, len(related)))
+        documents = [make_document(records, s, c) for s, c in chosen]
+        workload.append((f"What is the {crop.lower()} production in {state}?", documents))
+    return workload
+
+
+def run_mode(compressor: ContextCompressor, llm: FakeChatLLM, workload: list, method: str, settings: dict) -> dict:
+    RAG_CONFIG.update(settings)
+    if settings['enable_compression_cache']:
+        for query, documents in workload:
+            compressor.compress_documents(query, documents, method=method)
+    llm.reset()
+    
+    start_time = time.time()
+    for query, documents in workload:
+        compressor.compress_documents(query, documents, method=method)
+    elapsed = time.time() - start_time
+    
+    n = len(workload)
+    return {
+        'round_trips': llm.calls / n,
+        'prompt_tokens': llm.prompt_tokens / n,
+        'completion_tokens': llm.completion_tokens / n,
+        'wall_ms': elapsed / n * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='Fraction of the simulated LLM latency to actually sleep')
+    parser.add_argument('--queries', type=int, default=10)
+    parser.add_argument('--docs', type=int, default=RAG_CONFIG["final_context_k"])
+    parser.add_argument('--corrupt-json-every', type=int, default=0,
+                        help='Truncate every n-th JSON response to exercise the fallback path')
+    args = parser.parse_args()
+    
+    llm = FakeChatLLM(time_scale=args.time_scale, corrupt_json_every=args.corrupt_json_every)
+    compressor = ContextCompressor("sk-benchmark")
+    compressor.llm = llm
+    
+    # Deadline scaled with the simulated latency, so no mode is cut short
+    original_settings = {
+        key: RAG_CONFIG[key] for key in ('parallel_compression', 'enable_compression_cache', 'compression_timeout')
+    }
+    RAG_CONFIG["compression_timeout"] = max(RAG_CONFIG["compression_timeout"], 60 * args.time_scale)
+    workload = make_workload(args.queries, args.docs)
+    results = {}
+    
+    try:
+        for mode, (method, settings) in MODES.items():
+            results[mode] = run_mode(compressor, llm, workload, method, settings)
+    finally:
+        RAG_CONFIG.update(original_settings)
+    
+    print(f"\n{len(workload)} queries, {args.docs} documents each, time scale {args.time_scale}\n")
+    print(f"{'mode':<12}{'round trips':>13}{'prompt tok':>12}{'compl. tok':>12}{'wall ms':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['round_trips']:>13.2f}{r['prompt_tokens']:>12.1f}"
+              f"{r['completion_tokens']:>12.1f}{r['wall_ms']:>10.1f}")
+    print("(per query)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark domain entity extraction with a large keyword list.
+
+Compares, for N synthetic keywords (districts/commodities) plus DOMAIN_KEYWORDS:
+  naive     - `keyword in text` for every keyword (the previous approach)
+  matcher   - rag_system.entity_matcher.EntityMatcher (Aho-Corasick, one pass)
+on short queries and on whole-corpus tagging, and checks the matcher against a
+per-keyword word-boundary regex on a sample of texts.
+
+Usage: python benchmarks/bench_entity_matcher.py [--keywords 10000] [--docs 2000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import DOMAIN_KEYWORDS
+from rag_system.entity_matcher import EntityMatcher
+
+SYLLABLES = ["ka", "ra", "pur", "nag", "gan", "ja", "bad", "ti", "mal", "sa", "wa", "ri",
+             "dha", "lo", "kot", "va", "ser", "am", "bi", "hal", "ur", "ne", "chi", "gud"]
+FILLER = ["the", "production", "of", "in", "during", "tonnes", "year", "district", "state",
+          "total", "area", "hectare", "average", "rainfall", "was", "compared", "with", "and"]
+
+
+def make_keywords(n: int, rng: random.Random) -> dict:
+    keywords = {entity_type: list(terms) for entity_type, terms in DOMAIN_KEYWORDS.items()}
+    keywords['districts'] = []
+    keywords['commodities'] = []
+    seen = set(t for terms in keywords.values() for t in terms)
+    
+    while sum(len(v) for v in keywords.values()) < n:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.choice([1, 1, 1, 2]))]
+        term = " ".join(words)
+        if term not in seen:
+            seen.add(term)
+            keywords[rng.choice(['districts', 'commodities'])].append(term)
+    
+    return keywords
+
+
+def make_texts(keywords: dict, count: int, length: int, rng: random.Random) -> list:
+    all_terms = [t for terms in keywords.values() for t in terms]
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(length)]
+        for _ in range(max(1, length // 15)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(all_terms))
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+def naive_extract(keywords: dict, text: str) -> dict:
+    text_lower = text.lower()
+    return {
+        entity_type: [term for term in terms if term in text_lower]
+        for entity_type, terms in keywords.items()
+    }
+
+
+def reference_extract(keywords: dict, text: str) -> dict:
+    """Per-keyword whole-word regex (plural 's' allowed), slow but obviously correct"""
+    text_lower = text.lower()
+    return {
+        entity_type: [term for term in terms
+                      if re.search(r'(?<![0-9a-z])' + re.escape(term) + r's?(?![0-9a-z])', text_lower)]
+        for entity_type, terms in keywords.items()
+    }
+
+
+def time_per_text(fn, texts) -> float:
+    start_time = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return (time.perf_counter() - start_time) / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keywords', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    keywords = make_keywords(args.keywords, rng)
+    queries = make_texts(keywords, args.queries, 10, rng)
+    documents = make_texts(keywords, args.docs, 120, rng)
+    total_keywords = sum(len(v) for v in keywords.values())
+    
+    start_time = time.perf_counter()
+    matcher = EntityMatcher(keywords)
+    compile_ms = (time.perf_counter() - start_time) * 1000
+    
+    # Correctness against the per-keyword regex on a sample
+    mismatches = sum(
+        matcher.extract(text) != reference_extract(keywords, text)
+        for text in queries[:50] + documents[:50]
+    )
+    
+    naive_query = time_per_text(lambda t: naive_extract(keywords, t), queries)
+    matcher_query = time_per_text(matcher.extract, queries)
+    naive_doc = time_per_text(lambda t: naive_extract(keywords, t), documents[:200])
+    matcher_doc = time_per_text(matcher.extract, documents)
+    
+    print(f"\n{total_keywords} keywords, compile {compile_ms:.0f} ms, "
+          f"{len(matcher._goto)} automaton states")
+    print(f"Reference mismatches: {mismatches}/100 sample texts\n")
+    print(f"{'':<22}{'naive':>14}{'matcher':>14}{'speedup':>10}")
+    print(f"{'query (10 words)':<22}{naive_query * 1e6:>11.1f} us{matcher_query * 1e6:>11.1f} us"
+          f"{naive_query / matcher_query:>9.1f}x")
+    print(f"{'document (120 words)':<22}{naive_doc * 1e6:>11.1f} us{matcher_doc * 1e6:>11.1f} us"
+          f"{naive_doc / matcher_doc:>9.1f}x")
+    print(f"\nCorpus tagging: {args.docs} documents in {matcher_doc * args.docs:.2f} s with the matcher "
+          f"(naive estimate {naive_doc * args.docs:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
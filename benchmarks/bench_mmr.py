@@ -0,0 +1,112 @@
+"""
+Microbenchmark MMR selection in AdvancedReranker.
+
+Compares the previous loop (sklearn cosine_similarity per candidate/selected
+pair) against AdvancedReranker.mmr_select for 15-500 candidates, on TF-IDF
+embeddings of synthetic corpus chunks (with duplicates, so ties occur) and
+on random dense vectors, and checks that both pick the same documents in
+the same order.
+
+Usage: python benchmarks/bench_mmr.py [--sizes 15,50,100,200,500] [--trials 6] [--top-k 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from rag_system.reranker import AdvancedReranker
+from synthetic_corpus import build_corpus
+
+
+def legacy_mmr(doc_embeddings, relevance_scores, lambda_param, top_k):
+    """The previous maximal_marginal_relevance selection loop"""
+    max_score = max(relevance_scores) if relevance_scores else 1.0
+    min_score = min(relevance_scores) if relevance_scores else 0.0
+    score_range = max_score - min_score if max_score > min_score else 1.0
+    normalized_scores = [(score - min_score) / score_range for score in relevance_scores]
+    
+    selected_indices = []
+    remaining_indices = list(range(len(relevance_scores)))
+    
+    first_idx = np.argmax(normalized_scores)
+    selected_indices.append(first_idx)
+    remaining_indices.remove(first_idx)
+    
+    while len(selected_indices) < top_k and remaining_indices:
+        mmr_scores = []
+        for idx in remaining_indices:
+            relevance = normalized_scores[idx]
+            similarities = []
+            for selected_idx in selected_indices:
+                sim = cosine_similarity(
+                    doc_embeddings[idx].reshape(1, -1),
+                    doc_embeddings[selected_idx].reshape(1, -1)
+                )[0, 0]
+                similarities.append(sim)
+            max_similarity = max(similarities) if similarities else 0.0
+            mmr_scores.append((idx, lambda_param * relevance - (1 - lambda_param) * max_similarity))
+        
+        best_idx, _ = max(mmr_scores, key=lambda x: x[1])
+        selected_indices.append(best_idx)
+        remaining_indices.remove(best_idx)
+    
+    return [int(idx) for idx in selected_indices]
+
+
+def make_cases(n: int, trials: int, texts: list, reranker, rng: random.Random) -> list:
+    """(embeddings, relevance scores) pairs: half TF-IDF over sampled chunks, half random dense"""
+    cases = []
+    for trial in range(trials):
+        if trial % 2 == 0:
+            sample = [rng.choice(texts) for _ in range(n)]  # with replacement -> duplicate rows
+            embeddings = reranker.compute_document_embeddings([Document(page_content=text) for text in sample])
+        else:
+            embeddings = np.random.default_rng(trial).normal(size=(n, 384))
+        scores = [rng.gauss(0, 3) for _ in range(n)]
+        cases.append((embeddings, scores))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="15,50,100,200,500")
+    parser.add_argument("--trials", type=int, default=6)
+    parser.add_argument("--top-k", type=int, default=RAG_CONFIG["final_context_k"])
+    args = parser.parse_args()
+    
+    # Only the MMR methods are used: skip loading the cross-encoder
+    reranker = AdvancedReranker.__new__(AdvancedReranker)
+    reranker.config = RAG_CONFIG
+    reranker.document_vectors = None
+    
+    _, documents, _ = build_corpus()
+    texts = [doc.page_content for doc in documents]
+    lambda_param = RAG_CONFIG["mmr_lambda"]
+    rng = random.Random(0)
+    
+    print(f"\n{'candidates':>10} {'legacy ms':>10} {'vectorized ms':>14} {'speedup':>8} {'identical':>10}")
+    for n in [int(size) for size in args.sizes.split(",")]:
+        cases = make_cases(n, args.trials, texts, reranker, rng)
+        
+        start = time.perf_counter()
+        legacy = [legacy_mmr(emb, scores, lambda_param, args.top_k) for emb, scores in cases]
+        legacy_ms = (time.perf_counter() - start) * 1000 / len(cases)
+        
+        start = time.perf_counter()
+        vectorized = [reranker.mmr_select(emb, scores, lambda_param, args.top_k) for emb, scores in cases]
+        vectorized_ms = (time.perf_counter() - start) * 1000 / len(cases)
+        
+        identical = sum(a == b for a, b in zip(legacy, vectorized))
+        print(f"{n:>10} {legacy_ms:>10.2f} {vectorized_ms:>14.3f} {legacy_ms / vectorized_ms:>7.1f}x "
+              f"{identical:>5}/{len(cases)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark query enhancement modes against the local fake LLM.
+
+Reports LLM round trips, prompt/completion tokens and wall time per query for:
+  combined    - one JSON call for expansion, decomposition and HyDE
+  parallel    - three separate prompts issued concurrently
+  sequential  - three separate prompts one after another
+
+Usage: python benchmarks/bench_query_enhancement.py [--time-scale 0.1] [--corrupt-json-every 0]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from rag_system.query_enhancement import QueryEnhancer
+from fake_llm import FakeChatLLM
+
+QUERIES = [
+    "What is the rice production in Punjab?",
+    "Compare wheat production in Punjab and Haryana",
+    "Average annual rainfall in Kerala over the last 10 years",
+    "Which state has the highest sugarcane yield?",
+    "Compare the monsoon rainfall in Maharashtra and Gujarat and list the top crops in each state",
+    "Cotton area in Gujarat",
+    "Trend of maize production in Karnataka",
+    "How does temperature affect wheat yield in Uttar Pradesh and Madhya Pradesh?",
+    "Fertilizer imports by port",
+    "Drip irrigation water usage compared to traditional irrigation",
+]
+
+MODES = {
+    'combined': {'combined_query_enhancement': True, 'parallel_query_enhancement': True},
+    'parallel': {'combined_query_enhancement': False, 'parallel_query_enhancement': True},
+    'sequential': {'combined_query_enhancement': False, 'parallel_query_enhancement': False},
+}
+
+# Measure LLM round trips, not enhancement cache hits (and keep fake output off disk)
+CACHE_SETTINGS = {'enable_query_enhancement_cache': False, 'persist_query_enhancement_cache': False}
+
+
+def run_mode(llm: FakeChatLLM, settings: dict) -> dict:
+    RAG_CONFIG.update(settings)
+    enhancer = QueryEnhancer("sk-benchmark", llm=llm)
+    llm.reset()
+    
+    start_time = time.time()
+    search_queries = 0
+    for query in QUERIES:
+        enhanced = enhancer.enhance_query(query)
+        search_queries += len(enhancer.get_search_queries(enhanced))
+    elapsed = time.time() - start_time
+    
+    n = len(QUERIES)
+    return {
+        'round_trips': llm.calls / n,
+        'prompt_tokens': llm.prompt_tokens / n,
+        'completion_tokens': llm.completion_tokens / n,
+        'wall_ms': elapsed / n * 1000,
+        'search_queries': search_queries / n
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='Fraction of the simulated LLM latency to actually sleep')
+    parser.add_argument('--corrupt-json-every', type=int, default=0,
+                        help='Truncate every n-th JSON response to exercise the fallback path')
+    args = parser.parse_args()
+    
+    llm = FakeChatLLM(time_scale=args.time_scale, corrupt_json_every=args.corrupt_json_every)
+    
+    original_settings = {key: RAG_CONFIG[key] for key in list(MODES['combined']) + list(CACHE_SETTINGS)}
+    RAG_CONFIG.update(CACHE_SETTINGS)
+    results = {}
+    
+    try:
+        for mode, settings in MODES.items():
+            results[mode] = run_mode(llm, settings)
+    finally:
+        RAG_CONFIG.update(original_settings)
+    
+    print(f"\n{len(QUERIES)} queries, time scale {args.time_scale}\n")
+    print(f"{'mode':<12}{'round trips':>13}{'prompt tok':>12}{'compl. tok':>12}{'wall ms':>10}{'queries':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['round_trips']:>13.2f}{r['prompt_tokens']:>12.1f}"
+              f"{r['completion_tokens']:>12.1f}{r['wall_ms']:>10.1f}{r['search_queries']:>9.1f}")
+    print("(per query; 'queries' = search queries produced for retrieval)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark redundancy removal in ContextCompressor.
+
+Texts are distinct base texts mixed with near-duplicate variants (words
+dropped, a sentence appended, lines reordered) and short excerpts of base
+texts (mostly contained in a much longer kept text) in shuffled order. Base texts
+are synthetic corpus chunks (few hundred, very similar vocabulary) or, with
+--source random, random sentences over a large vocabulary so the number of
+kept texts grows with the input. Compares:
+  exact    - pairwise word-overlap loop against every kept text (previous behaviour)
+  indexed  - inverted word index candidates verified with the same 0.8 overlap check
+reporting time per call and how many keep/drop decisions differ.
+
+Usage: python benchmarks/bench_redundancy.py [--source corpus|random] [--sizes 8,100,500,1000,2000]
+           [--duplicate-rate 0.3] [--max-exact 2000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from rag_system.context_compressor import ContextCompressor
+from synthetic_corpus import build_corpus
+
+
+def make_variant(text: str, rng: random.Random) -> str:
+    """Near-duplicate of a text: some words dropped, lines reordered, a sentence appended"""
+    lines = text.splitlines()
+    rng.shuffle(lines)
+    words = " ".join(lines).split()
+    drop = rng.uniform(0.0, 0.3)
+    kept = [w for w in words if rng.random() > drop]
+    return " ".join(kept) + " Source figures were revised in the latest release."
+
+
+def make_excerpt(text: str, rng: random.Random) -> str:
+    """Contiguous excerpt of about a tenth of a text's words"""
+    words = text.split()
+    length = max(3, len(words) // 10)
+    start = rng.randint(0, max(0, len(words) - length))
+    return " ".join(words[start:start + length])
+
+
+def make_random_texts(count: int, seed: int = 0) -> list:
+    """Distinct multi-line texts drawn from a 20k-word vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    return [
+        "\n".join(" ".join(rng.choices(vocabulary, k=12)) for _ in range(rng.randint(4, 10)))
+        for _ in range(count)
+    ]
+
+
+def make_texts(base_texts: list, size: int, duplicate_rate: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    num_duplicates = int(size * duplicate_rate)
+    originals = rng.sample(base_texts, min(size - num_duplicates, len(base_texts)))
+    texts = originals + [
+        (make_excerpt if rng.random() < 0.5 else make_variant)(rng.choice(originals), rng)
+        for _ in range(size - len(originals))
+    ]
+    rng.shuffle(texts)
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["corpus", "random"], default="corpus")
+    parser.add_argument("--sizes", default="8,100,500,1000,2000")
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--max-exact", type=int, default=2000, help="skip the pairwise loop above this size")
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(",")]
+    if args.source == "random":
+        base_texts = make_random_texts(max(sizes))
+    else:
+        _, documents, _ = build_corpus(districts_per_state=max(2, max(sizes) // 40))
+        base_texts = [doc.page_content for doc in documents]
+    
+    compressor = ContextCompressor("sk-benchmark")
+    original_method = RAG_CONFIG["redundancy_method"]
+    
+    def run(method: str, texts: list):
+        RAG_CONFIG["redundancy_method"] = method
+        repeats = max(1, 200 // len(texts))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            kept = compressor.remove_redundancy(texts)
+        return kept, (time.perf_counter() - start) * 1000 / repeats
+    
+    print(f"\n{len(base_texts)} distinct chunks, duplicate rate {args.duplicate_rate}\n")
+    print(f"{'texts':>6} {'kept':>6} {'exact ms':>10} {'indexed ms':>11} {'speedup':>8} {'differ':>7}")
+    
+    try:
+        for size in sizes:
+            texts = make_texts(base_texts, size, args.duplicate_rate)
+            indexed_kept, indexed_ms = run("indexed", texts)
+            
+            if size <= args.max_exact:
+                exact_kept, exact_ms = run("exact", texts)
+                differ = len(set(exact_kept) ^ set(indexed_kept))
+                print(f"{size:>6} {len(indexed_kept):>6} {exact_ms:>10.2f} {indexed_ms:>11.2f} "
+                      f"{exact_ms / indexed_ms:>7.1f}x {differ:>7}")
+            else:
+                print(f"{size:>6} {len(indexed_kept):>6} {'-':>10} {indexed_ms:>11.2f} {'-':>8} {'-':>7}")
+    finally:
+        RAG_CONFIG["redundancy_method"] = original_method
+
+
+if __name__ == "__main__":
+    main()
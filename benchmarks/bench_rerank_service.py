@@ -0,0 +1,105 @@
+"""
+Load benchmark for cross-encoder inference under concurrent chat requests.
+
+Each simulated user sends rerank requests (one query against --candidates
+chunks) back to back. Compares:
+  direct   - every request runs its own model call (previous behaviour)
+  batched  - requests go through the shared MicroBatcher (one inference worker)
+at 1-64 concurrent users, reporting request throughput, p50/p99 latency and
+the average batch size the batcher formed.
+
+Usage: python benchmarks/bench_rerank_service.py [--model cross-encoder/ms-marco-MiniLM-L-6-v2]
+           [--users 1,2,4,8,16,32,64] [--requests 4] [--candidates 15]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from bench_reranker import make_workload
+
+
+def run_load(score_fn, workload: list, users: int, requests_per_user: int) -> dict:
+    """Latencies and wall time with `users` threads each sending requests back to back"""
+    latencies = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(users)
+    
+    def user(user_id: int):
+        start_barrier.wait()
+        for i in range(requests_per_user):
+            query, candidates = workload[(user_id * requests_per_user + i) % len(workload)]
+            start = time.perf_counter()
+            score_fn(query, candidates)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+    
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'throughput': len(latencies) / wall,
+        'p50': float(np.percentile(latencies_ms, 50)),
+        'p99': float(np.percentile(latencies_ms, 99))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=RAG_CONFIG["cross_encoder_model"])
+    parser.add_argument("--users", default="1,2,4,8,16,32,64")
+    parser.add_argument("--requests", type=int, default=4, help="requests per user")
+    parser.add_argument("--candidates", type=int, default=RAG_CONFIG["post_rerank_k"])
+    args = parser.parse_args()
+    
+    from langchain_core.documents import Document
+    from rag_system.reranker import AdvancedReranker
+    from rag_system.rerank_service import MicroBatcher
+    
+    RAG_CONFIG["cross_encoder_model"] = args.model
+    RAG_CONFIG["rerank_micro_batching"] = False
+    reranker = AdvancedReranker()
+    
+    workload = [
+        (query, [Document(page_content=text) for text in candidates])
+        for query, candidates in make_workload(64, args.candidates)
+    ]
+    
+    def direct(query, candidates):
+        return reranker.score_requests([(query, candidates)])[0]
+    
+    direct(*workload[0])  # warm-up
+    
+    print(f"\n{args.candidates} candidates per request, {args.requests} requests per user\n")
+    print(f"{'users':>5} | {'direct req/s':>12} {'p50 ms':>8} {'p99 ms':>8} | "
+          f"{'batched req/s':>13} {'p50 ms':>8} {'p99 ms':>8} {'req/batch':>9}")
+    
+    for users in [int(u) for u in args.users.split(",")]:
+        batcher = MicroBatcher(
+            reranker.score_requests,
+            max_batch_pairs=RAG_CONFIG["rerank_batch_max_pairs"],
+            max_wait_ms=RAG_CONFIG["rerank_batch_max_wait_ms"]
+        )
+        
+        plain = run_load(direct, workload, users, args.requests)
+        batched = run_load(batcher.submit, workload, users, args.requests)
+        stats = batcher.stats()
+        
+        print(f"{users:>5} | {plain['throughput']:>12.1f} {plain['p50']:>8.1f} {plain['p99']:>8.1f} | "
+              f"{batched['throughput']:>13.1f} {batched['p50']:>8.1f} {batched['p99']:>8.1f} "
+              f"{stats['avg_requests_per_batch']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
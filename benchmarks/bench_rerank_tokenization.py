@@ -0,0 +1,93 @@
+"""
+Benchmark the tokenizer cost of the rerank stage.
+
+Compares, on the same query/candidate workload:
+  strings  - AdvancedReranker.predict_scores: every (query, chunk) pair is tokenized per request
+  ids      - AdvancedReranker.predict_scores_from_ids: chunk ids come from the DocumentTokenStore
+             built once per index, only the query is tokenized
+and reports the input-preparation time (tokenization / id assembly), the
+whole scoring time, and the largest score difference between the two paths.
+
+Usage: python benchmarks/bench_rerank_tokenization.py [--model cross-encoder/ms-marco-MiniLM-L-6-v2]
+           [--queries 20] [--candidates 50]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from synthetic_corpus import build_corpus
+from bench_reranker import make_workload
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=RAG_CONFIG["cross_encoder_model"])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=50)
+    args = parser.parse_args()
+    
+    from langchain_core.documents import Document
+    from rag_system.reranker import AdvancedReranker
+    from rag_system.token_store import DocumentTokenStore
+    
+    RAG_CONFIG["cross_encoder_model"] = args.model
+    reranker = AdvancedReranker()
+    
+    _, documents, _ = build_corpus()
+    workload = [
+        (query, [Document(page_content=text) for text in candidates])
+        for query, candidates in make_workload(args.queries, args.candidates)
+    ]
+    num_pairs = sum(len(candidates) for _, candidates in workload)
+    
+    # Index-time step, timed separately (not built from disk)
+    store = DocumentTokenStore(reranker.cross_encoder.tokenizer, RAG_CONFIG["cross_encoder_max_length"])
+    start = time.perf_counter()
+    store.build(documents, "bench")
+    build_seconds = time.perf_counter() - start
+    reranker.token_store = store
+    print(f"\nIndex time: tokenized {len(store)} chunks in {build_seconds * 1000:.1f} ms "
+          f"({len(store.ids)} ids, {store.ids.nbytes + store.offsets.nbytes} bytes)")
+    
+    # Input preparation only
+    start = time.perf_counter()
+    for query, candidates in workload:
+        reranker.cross_encoder.preprocess([[query, doc.page_content] for doc in candidates])
+    tokenize_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    for query, candidates in workload:
+        store.pair_inputs(store.tokenize([query])[0], store.document_ids(candidates))
+    assemble_ms = (time.perf_counter() - start) * 1000
+    
+    # Whole scoring step (warm-up first)
+    reranker.predict_scores([[workload[0][0], doc.page_content] for doc in workload[0][1]])
+    reranker.predict_scores_from_ids(*workload[0])
+    
+    start = time.perf_counter()
+    string_scores = [
+        reranker.predict_scores([[query, doc.page_content] for doc in candidates])
+        for query, candidates in workload
+    ]
+    strings_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    id_scores = [reranker.predict_scores_from_ids(query, candidates) for query, candidates in workload]
+    ids_ms = (time.perf_counter() - start) * 1000
+    
+    max_diff = max(float(np.max(np.abs(a - b))) for a, b in zip(string_scores, id_scores))
+    
+    print(f"{len(workload)} queries, {num_pairs} pairs\n")
+    print(f"{'path':<8} {'inputs ms':>10} {'scoring ms':>11} {'pairs/s':>9}")
+    print(f"{'strings':<8} {tokenize_ms:>10.1f} {strings_ms:>11.1f} {num_pairs / strings_ms * 1000:>9.1f}")
+    print(f"{'ids':<8} {assemble_ms:>10.1f} {ids_ms:>11.1f} {num_pairs / ids_ms * 1000:>9.1f}")
+    print(f"\nInput preparation {tokenize_ms / assemble_ms:.1f}x faster; max score difference {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark cross-encoder inference backends for AdvancedReranker.
+
+For each backend (torch, quantized, onnx) scores the same query-document
+pairs from the synthetic corpus and reports pair throughput plus ranking
+agreement with the baseline (the previous torch predict call):
+  kendall_tau  - mean Kendall tau between baseline and backend scores per query
+  top@k        - mean overlap of the top post_rerank_k documents per query
+  top1         - share of queries whose top document is unchanged
+
+Usage: python benchmarks/bench_reranker.py [--model cross-encoder/ms-marco-MiniLM-L-6-v2]
+           [--backends torch,quantized,onnx] [--queries 20] [--candidates 50]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+from scipy.stats import kendalltau
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from synthetic_corpus import STATES, CROPS, YEARS, build_corpus
+
+QUERY_TEMPLATES = [
+    "What was the {crop} production in {state} in {year}?",
+    "Compare {crop} yield in {state} and {other_state}",
+    "How did rainfall affect {crop} in {state}?",
+    "Which districts of {state} grow the most {crop}?",
+    "Trend of {crop} area in {state} since {year}",
+]
+
+
+def make_workload(num_queries: int, num_candidates: int, seed: int = 0) -> list:
+    """[(query, [document text, ...]), ...] with candidates sampled from the corpus"""
+    rng = random.Random(seed)
+    _, documents, _ = build_corpus(seed)
+    texts = [doc.page_content for doc in documents]
+    
+    workload = []
+    for _ in range(num_queries):
+        query = rng.choice(QUERY_TEMPLATES).format(
+            crop=rng.choice(CROPS).lower(),
+            state=rng.choice(STATES),
+            other_state=rng.choice(STATES),
+            year=rng.choice(YEARS)
+        )
+        workload.append((query, rng.sample(texts, min(num_candidates, len(texts)))))
+    return workload
+
+
+def score_workload(score_fn, workload: list) -> tuple:
+    """Per-query score arrays and total seconds"""
+    start = time.perf_counter()
+    scores = [np.asarray(score_fn([[query, text] for text in candidates])) for query, candidates in workload]
+    return scores, time.perf_counter() - start
+
+
+def agreement(baseline: list, scores: list, k: int) -> dict:
+    taus, overlaps, top1 = [], [], []
+    for base, other in zip(baseline, scores):
+        tau, _ = kendalltau(base, other)
+        taus.append(0.0 if np.isnan(tau) else tau)
+        
+        base_top = set(np.argsort(-base)[:k])
+        other_top = set(np.argsort(-other)[:k])
+        overlaps.append(len(base_top & other_top) / len(base_top))
+        top1.append(int(np.argmax(base) == np.argmax(other)))
+    
+    return {
+        'kendall_tau': float(np.mean(taus)),
+        'top_k_overlap': float(np.mean(overlaps)),
+        'top1': float(np.mean(top1))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=RAG_CONFIG["cross_encoder_model"])
+    parser.add_argument("--backends", default="torch,quantized,onnx")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=RAG_CONFIG["cross_encoder_batch_size"])
+    parser.add_argument("--max-length", type=int, default=RAG_CONFIG["cross_encoder_max_length"])
+    args = parser.parse_args()
+    
+    from sentence_transformers import CrossEncoder
+    from rag_system.reranker import AdvancedReranker
+    
+    RAG_CONFIG["cross_encoder_model"] = args.model
+    RAG_CONFIG["cross_encoder_batch_size"] = args.batch_size
+    RAG_CONFIG["cross_encoder_max_length"] = args.max_length
+    k = RAG_CONFIG["post_rerank_k"]
+    
+    workload = make_workload(args.queries, args.candidates)
+    num_pairs = sum(len(candidates) for _, candidates in workload)
+    print(f"{len(workload)} queries x {args.candidates} candidates = {num_pairs} pairs, "
+          f"batch_size={args.batch_size}, max_length={args.max_length}\n")
+    
+    # Baseline: the reranker's previous call (default settings, no length truncation)
+    baseline_model = CrossEncoder(args.model)
+    score_workload(baseline_model.predict, workload[:1])  # warm-up
+    baseline, baseline_seconds = score_workload(
+        lambda pairs: baseline_model.predict(pairs, show_progress_bar=False), workload
+    )
+    
+    print(f"{'backend':<12} {'pairs/s':>10} {'speedup':>8} {'tau':>7} {'top@' + str(k):>7} {'top1':>6}")
+    print(f"{'baseline':<12} {num_pairs / baseline_seconds:>10.1f} {1.0:>7.2f}x {1.0:>7.3f} {1.0:>7.3f} {1.0:>6.2f}")
+    
+    for backend in args.backends.split(","):
+        RAG_CONFIG["cross_encoder_backend"] = backend
+        reranker = AdvancedReranker()
+        if reranker.backend != backend:
+            print(f"{backend:<12} unavailable (loaded {reranker.backend})")
+            continue
+        
+        score_workload(reranker.predict_scores, workload[:1])  # warm-up
+        scores, seconds = score_workload(reranker.predict_scores, workload)
+        stats = agreement(baseline, scores, k)
+        print(f"{backend:<12} {num_pairs / seconds:>10.1f} {baseline_seconds / seconds:>7.2f}x "
+              f"{stats['kendall_tau']:>7.3f} {stats['top_k_overlap']:>7.3f} {stats['top1']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
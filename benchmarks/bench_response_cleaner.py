@@ -0,0 +1,157 @@
+"""
+Benchmark the answer cleaner on long generated answers.
+
+Answers are markdown like the QA prompt produces (headings, bullets with
+figures, "Label: -" structures, source citations, the odd disclaimer and
+"data not available" line), --answer-words words each. Reports throughput of:
+  reference   - every rule applied one after another (the previous clean_response)
+  engine      - response_cleaner.clean_response on the complete answer
+  streaming   - StreamingCleaner fed the answer in LLM-sized chunks, then flushed
+and checks that engine and streaming output match the reference exactly, on
+the answers and on --fuzz random fragment mixes aimed at the rule edge cases.
+
+Usage: python benchmarks/bench_response_cleaner.py [--answers 50] [--answer-words 2000] [--fuzz 20000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_system.response_cleaner import reference_clean, clean_response, StreamingCleaner
+from synthetic_corpus import STATES, CROPS
+
+# Pieces that hit the cleaning rules and the places a streamed chunk can split them
+FUZZ_FRAGMENTS = [
+    "(Source: Source 3)", "(source:\nSource 12)", "(Source: Crop data", ")", "(", "( )", "(\n)",
+    " ", "  ", "\t", "\n", "\n\n\n", " \n", "1. Rainfall Patterns: - ", "2.", "3. ", "Key Takeaway",
+    ":", ": -", ":\n-", "-", " - ", "::", "Label: -\n", "Data not available", "no data here",
+    "(Assumed data based on historical patterns)", "(assumed x)", "based on the provided context",
+    "According to the data", "The dataset does not contain", "no specific data found",
+    "limited data in the context", "İnformation is not present", "(ſource: x)", "K", "abc", "Rice",
+    "**Year 2001**", "production rose 5%.", "•"
+]
+
+
+def make_answer(rng: random.Random, answer_words: int) -> str:
+    """Long markdown answer with the structures the cleaner rewrites"""
+    parts = []
+    words = 0
+    section = 0
+    while words < answer_words:
+        section += 1
+        state, crop = rng.choice(STATES), rng.choice(CROPS)
+        if rng.random() < 0.3:
+            parts.append(f"{section}. {state} {crop} Production: - ")
+        else:
+            parts.append(f"## {state} {crop} Production\n\n")
+        
+        for _ in range(rng.randint(3, 8)):
+            year = rng.randint(1998, 2022)
+            line = (f"• **{year}**: {crop.lower()} output in {state} was **{rng.randint(100, 9000)} tonnes** "
+                    f"from {rng.randint(10, 900)} thousand hectares")
+            roll = rng.random()
+            if roll < 0.3:
+                line += f" (Source: Source {rng.randint(1, 8)})"
+            elif roll < 0.35:
+                line += " (Assumed data based on historical patterns)"
+            elif roll < 0.4:
+                line = f"• **{year}**: Data not available"
+            parts.append(line + ("  \n" if rng.random() < 0.1 else "\n"))
+        
+        if rng.random() < 0.5:
+            parts.append(f"\nTrend Summary: - Based on the provided data, {crop.lower()} production in {state} "
+                         f"changed by {rng.randint(-20, 40)}% over the period.\n")
+        parts.append("\n\n\n" if rng.random() < 0.2 else "\n")
+        words = sum(len(part.split()) for part in parts)
+    
+    parts.append("**Key Takeaway:** Production has grown steadily across the period.")
+    return "".join(parts)
+
+
+def chunked(text: str, rng: random.Random) -> list:
+    """Split text into LLM-stream-sized chunks (one to three words)"""
+    pieces = re.findall(r"\s*\S+|\s+", text)
+    chunks = []
+    i = 0
+    while i < len(pieces):
+        step = rng.randint(1, 3)
+        chunks.append("".join(pieces[i:i + step]))
+        i += step
+    return chunks
+
+
+def stream_clean(chunks: list) -> str:
+    cleaner = StreamingCleaner()
+    output = [cleaner.feed(chunk) for chunk in chunks]
+    output.append(cleaner.flush())
+    return "".join(output)
+
+
+def time_mode(func, inputs: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def fuzz(count: int, seed: int) -> int:
+    """Random fragment mixes fed in random splits; returns the number of mismatches"""
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(count):
+        text = "".join(rng.choice(FUZZ_FRAGMENTS) for _ in range(rng.randint(0, 25)))
+        expected = reference_clean(text)
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 10)))) if len(text) > 1 else []
+        chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        if clean_response(text) != expected or stream_clean(chunks) != expected:
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=50)
+    parser.add_argument('--answer-words', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fuzz', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    answers = [make_answer(rng, args.answer_words) for _ in range(args.answers)]
+    streams = [chunked(answer, rng) for answer in answers]
+    megabytes = sum(len(answer.encode('utf-8')) for answer in answers) / 1e6
+    
+    results = {
+        'reference': time_mode(reference_clean, answers, args.repeat),
+        'engine': time_mode(clean_response, answers, args.repeat),
+        'streaming': time_mode(stream_clean, streams, args.repeat)
+    }
+    
+    expected = [reference_clean(answer) for answer in answers]
+    mismatches = {
+        'reference': 0,
+        'engine': sum(clean_response(answer) != e for answer, e in zip(answers, expected)),
+        'streaming': sum(stream_clean(chunks) != e for chunks, e in zip(streams, expected))
+    }
+    
+    print(f"\n{len(answers)} answers, ~{args.answer_words} words ({megabytes:.2f} MB), "
+          f"{sum(len(s) for s in streams) / len(streams):.0f} chunks per streamed answer\n")
+    print(f"{'mode':<12}{'ms':>10}{'MB/s':>10}{'speedup':>10}{'mismatches':>12}")
+    for mode, elapsed in results.items():
+        print(f"{mode:<12}{elapsed * 1000:>10.1f}{megabytes / elapsed:>10.1f}"
+              f"{results['reference'] / elapsed:>9.2f}x{mismatches[mode]:>12}")
+    
+    if args.fuzz:
+        print(f"\nFuzz: {fuzz(args.fuzz, args.seed)} mismatches in {args.fuzz} edge-case texts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark ContextCompressor.extract_key_sentences with and without the
+index-time SentenceIndex.
+
+Documents are the synthetic corpus chunks plus report-style prose documents
+(one sentence per record). Compares:
+  regex  - extract_key_sentences: split, lowercase and tokenize every chunk per request
+           (previous behaviour)
+  index  - extract_key_sentences_batch: a request's documents scored in one vectorized
+           pass over the precomputed sentences
+reporting the one-off index build time, microseconds per document and
+whether both paths return the same sentences for every (query, document).
+
+Usage: python benchmarks/bench_sentence_extraction.py [--queries 50] [--max-sentences 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_system.context_compressor import ContextCompressor
+from rag_system.sentence_index import SentenceIndex
+from synthetic_corpus import STATES, CROPS, build_corpus, make_records
+from bench_compression import make_document
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--docs-per-query", type=int, default=8)
+    parser.add_argument("--max-sentences", type=int, default=8)
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    _, documents, _ = build_corpus()
+    records = make_records()['agriculture']
+    pairs = sorted({(r['state_name'], r['crop']) for r in records})
+    documents += [make_document(records, state, crop) for state, crop in pairs]
+    
+    workload = [
+        (f"What is the {rng.choice(CROPS).lower()} production in {rng.choice(STATES)} district?",
+         rng.sample(documents, args.docs_per_query))
+        for _ in range(args.queries)
+    ]
+    num_docs = args.queries * args.docs_per_query
+    
+    compressor = ContextCompressor("sk-benchmark")
+    
+    def run(per_request: bool):
+        start = time.perf_counter()
+        results = []
+        for query, docs in workload:
+            if per_request:
+                results.extend(compressor.extract_key_sentences_batch(docs, query, args.max_sentences))
+            else:
+                results.extend(
+                    compressor.extract_key_sentences(doc.page_content, query, max_sentences=args.max_sentences)
+                    for doc in docs
+                )
+        return results, (time.perf_counter() - start) * 1e6 / num_docs
+    
+    regex_results, regex_us = run(per_request=False)
+    
+    index = SentenceIndex()
+    start = time.perf_counter()
+    index.build(documents, "bench")
+    build_ms = (time.perf_counter() - start) * 1000
+    compressor.sentence_index = index
+    index_results, index_us = run(per_request=True)
+    
+    mismatches = sum(a != b for a, b in zip(regex_results, index_results))
+    
+    print(f"\nIndex build: {len(index)} documents, {len(index.spans)} sentences, "
+          f"{len(index.term_hashes)} terms in {build_ms:.1f} ms\n")
+    print(f"{'path':<6} {'us/doc':>8}")
+    print(f"{'regex':<6} {regex_us:>8.1f}")
+    print(f"{'index':<6} {index_us:>8.1f}")
+    print(f"\n{regex_us / index_us:.1f}x faster; {mismatches}/{num_docs} results differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark time to first token of answer generation against the local fake LLM.
+
+The QA prompt is answered with a long markdown answer (--answer-words words)
+so generation time dominates, as it does with gpt-3.5-turbo. Compares:
+  blocking   - QAEngine.answer_with_confidence (qa_chain.invoke, as /api/chat)
+  streaming  - QAEngine.stream_response chunks, then build_answer
+  cleaned    - streaming with the chunks passed through StreamingCleaner (as /api/chat/stream)
+reporting mean time to first token (first answer text the user can see) and
+total time per query. Answer generation only; retrieval stages are not run.
+
+Usage: python benchmarks/bench_streaming.py [--time-scale 0.1] [--queries 10] [--answer-words 250]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from rag_system.qa_engine import QAEngine
+from rag_system.response_cleaner import StreamingCleaner
+from fake_llm import FakeChatLLM, extract_query
+from bench_compression import make_workload
+
+
+def make_responder(answer_words: int):
+    """Responder writing a structured answer of about answer_words words"""
+    def respond(prompt: str) -> str:
+        query = extract_query(prompt)
+        bullets = []
+        while sum(len(line.split()) for line in bullets) < answer_words:
+            n = len(bullets) + 1
+            bullets.append(f"• **Year {2000 + n}**: production for {query.lower()} reached "
+                           f"**{1000 + 37 * n} tonnes**, a change of {n % 7 + 1}.{n % 10}% on the previous year.")
+        return (f"## {query}\n\n" + "\n".join(bullets) +
+                "\n\n**Key Takeaway:** Production has grown steadily across the period.")
+    return respond
+
+
+def run_blocking(engine: QAEngine, workload: list) -> list:
+    timings = []
+    for query, documents in workload:
+        start = time.time()
+        engine.answer_with_confidence(query, documents, [])
+        elapsed = time.time() - start
+        timings.append((elapsed, elapsed))
+    return timings
+
+
+def run_streaming(engine: QAEngine, workload: list, clean: bool = False) -> list:
+    timings = []
+    for query, documents in workload:
+        start = time.time()
+        first_token = None
+        prompt_variables, token_report = engine.prepare_prompt(query, documents, [])
+        cleaner = StreamingCleaner() if clean else None
+        chunks = []
+        for text in engine.stream_response(prompt_variables):
+            chunks.append(text)
+            if cleaner and not cleaner.feed(text):
+                continue
+            if first_token is None:
+                first_token = time.time() - start
+        if cleaner and first_token is None:
+            cleaner.flush()
+            first_token = time.time() - start
+        engine.add_confidence(engine.build_answer("".join(chunks), documents, token_report))
+        timings.append((first_token, time.time() - start))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='Fraction of the simulated LLM latency to actually sleep')
+    parser.add_argument('--queries', type=int, default=10)
+    parser.add_argument('--docs', type=int, default=RAG_CONFIG["final_context_k"])
+    parser.add_argument('--answer-words', type=int, default=250)
+    args = parser.parse_args()
+    
+    llm = FakeChatLLM(make_responder(args.answer_words), time_scale=args.time_scale)
+    engine = QAEngine("sk-benchmark")
+    engine.qa_chain = engine.qa_prompt | llm
+    workload = make_workload(args.queries, args.docs)
+    
+    results = {
+        'blocking': run_blocking(engine, workload),
+        'streaming': run_streaming(engine, workload),
+        'cleaned': run_streaming(engine, workload, clean=True)
+    }
+    
+    print(f"\n{len(workload)} queries, {args.docs} documents, ~{args.answer_words}-word answers, "
+          f"time scale {args.time_scale}\n")
+    print(f"{'mode':<12}{'first token ms':>16}{'total ms':>12}")
+    for mode, timings in results.items():
+        ttft = sum(t for t, _ in timings) / len(timings) * 1000
+        total = sum(t for _, t in timings) / len(timings) * 1000
+        print(f"{mode:<12}{ttft:>16.1f}{total:>12.1f}")
+    print("(mean per query)")
+
+
+if __name__ == '__main__':
+    main()
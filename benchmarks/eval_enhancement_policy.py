@@ -0,0 +1,167 @@
+"""
+Evaluate the adaptive query-enhancement policy: latency saved vs retrieval recall lost.
+
+Runs a labelled query set (relevance from the documents' entity tags) through
+query enhancement + multi-stage retrieval twice: with all LLM stages, and with
+the stages chosen by EnhancementPolicy. Uses the synthetic corpus and the fake
+LLM by default; --live uses ChatOpenAI (needs OPENAI_API_KEY).
+
+Usage: python benchmarks/eval_enhancement_policy.py [--time-scale 0.1] [--k 15] [--live]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from fake_llm import FakeChatLLM
+from synthetic_corpus import build_corpus, STATES, CROPS
+
+TEMPLATES = {
+    'simple': ["{crop} production in {state}", "{crop} area in {state} in {year}"],
+    'compare': ["compare {crop} production in {state} and {state2}"],
+    'vague': ["which crops grow well in {state}", "how is farming doing in {state} recently"],
+    'climate': ["monsoon rainfall in {state}", "how much did it rain in {state} during the monsoon"],
+}
+
+
+def make_queries(n_per_template: int, seed: int):
+    """(query type, query, relevance predicate over a document's entity tags)"""
+    rng = random.Random(seed)
+    queries = []
+    
+    for query_type, templates in TEMPLATES.items():
+        for template in templates:
+            for _ in range(n_per_template):
+                crop, state, state2 = rng.choice(CROPS), *rng.sample(STATES, 2)
+                query = template.format(crop=crop, state=state, state2=state2, year=rng.randint(2005, 2016))
+                crop, state, state2 = crop.lower(), state.lower(), state2.lower()
+                
+                if query_type == 'simple':
+                    relevant = lambda tags, c=crop, s=state: c in tags and s in tags
+                elif query_type == 'compare':
+                    relevant = lambda tags, c=crop, s=state, s2=state2: c in tags and (s in tags or s2 in tags)
+                elif query_type == 'vague':
+                    relevant = lambda tags, s=state, cat='agriculture': s in tags and cat in tags
+                else:
+                    relevant = lambda tags, s=state, cat='climate': s in tags and cat in tags
+                
+                queries.append((query_type, query, relevant))
+    
+    return queries
+
+
+def document_tags(doc) -> set:
+    tags = {kw for kws in doc.metadata.get('entities', {}).values() for kw in kws}
+    tags.add(doc.metadata.get('category'))
+    return tags
+
+
+def run(retriever, enhancer, llm, policy, query, relevant_ids, k):
+    """Enhance + retrieve one query; returns (enhancement seconds, llm calls, recall@k, decision)"""
+    decision = policy.decide(query) if policy else None
+    
+    calls_before = llm.calls if llm else 0
+    start_time = time.perf_counter()
+    enhanced = enhancer.enhance_query(query, stages=decision['stages'] if decision else None)
+    enhancement_seconds = time.perf_counter() - start_time
+    calls = (llm.calls - calls_before) if llm else None
+    
+    docs = retriever.multi_stage_retrieval(
+        enhancer.get_search_queries(enhanced),
+        enhanced['entities']
+    )
+    retrieved = {id(doc) for doc in docs[:k]}
+    recall = len(retrieved & relevant_ids) / min(len(relevant_ids), k) if relevant_ids else 1.0
+    
+    if decision:
+        policy.record(decision, retriever.score_margin(query))
+    
+    return enhancement_seconds, calls, recall, decision
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--time-scale', type=float, default=0.1)
+    parser.add_argument('--k', type=int, default=15)
+    parser.add_argument('--per-template', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--live', action='store_true', help='Use ChatOpenAI instead of the fake LLM')
+    args = parser.parse_args()
+    
+    RAG_CONFIG['persist_query_embedding_cache'] = False
+    # Both arms must make their LLM calls; cached enhancements would hide them
+    RAG_CONFIG['enable_query_enhancement_cache'] = False
+    RAG_CONFIG['persist_query_enhancement_cache'] = False
+    
+    from rag_system.advanced_retriever import AdvancedRetriever
+    from rag_system.query_enhancement import QueryEnhancer
+    from rag_system.enhancement_policy import EnhancementPolicy
+    
+    _, documents, vector_store = build_corpus()
+    retriever = AdvancedRetriever(vector_store, documents)
+    
+    # Documents returned by FAISS are docstore copies: map both to the same ids
+    relevant_docs = {}
+    for doc in list(vector_store.docstore._dict.values()) + documents:
+        relevant_docs.setdefault(doc.page_content, []).append(doc)
+    
+    if args.live:
+        enhancer = QueryEnhancer(os.environ['OPENAI_API_KEY'])
+        llm = None
+    else:
+        llm = FakeChatLLM(time_scale=args.time_scale)
+        enhancer = QueryEnhancer("sk-benchmark", llm=llm)
+    policy = EnhancementPolicy()
+    
+    stats = defaultdict(lambda: defaultdict(list))
+    stdout = sys.stdout
+    
+    # 'skipped' = share of queries routed without expansion/HyDE
+    for query_type, query, relevant in make_queries(args.per_template, args.seed):
+        relevant_ids = {
+            id(doc)
+            for content, docs in relevant_docs.items() if relevant(document_tags(docs[0]))
+            for doc in docs
+        }
+        
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            full = run(retriever, enhancer, llm, None, query, relevant_ids, args.k)
+            adaptive = run(retriever, enhancer, llm, policy, query, relevant_ids, args.k)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        
+        for bucket in (query_type, 'all'):
+            stats[bucket]['full_ms'].append(full[0] * 1000)
+            stats[bucket]['adaptive_ms'].append(adaptive[0] * 1000)
+            stats[bucket]['full_recall'].append(full[2])
+            stats[bucket]['adaptive_recall'].append(adaptive[2])
+            stats[bucket]['reduced'].append('expansion' not in adaptive[3]['stages'])
+            if llm:
+                stats[bucket]['full_calls'].append(full[1])
+                stats[bucket]['adaptive_calls'].append(adaptive[1])
+    
+    mean = lambda values: sum(values) / len(values) if values else 0.0
+    
+    print(f"\nrecall@{args.k}, enhancement latency per query "
+          f"({'live LLM' if args.live else f'fake LLM, time scale {args.time_scale}'})\n")
+    print(f"{'type':<9}{'n':>4}{'skipped':>9}{'full ms':>10}{'adapt ms':>10}{'saved':>8}"
+          f"{'calls':>12}{'full rec':>10}{'adapt rec':>11}{'lost':>8}")
+    for bucket in list(TEMPLATES) + ['all']:
+        s = stats[bucket]
+        full_ms, adaptive_ms = mean(s['full_ms']), mean(s['adaptive_ms'])
+        calls = f"{mean(s['full_calls']):.1f}->{mean(s['adaptive_calls']):.1f}" if llm else "-"
+        print(f"{bucket:<9}{len(s['full_ms']):>4}{mean(s['reduced']):>9.0%}{full_ms:>10.1f}{adaptive_ms:>10.1f}"
+              f"{(1 - adaptive_ms / full_ms) if full_ms else 0:>8.0%}{calls:>12}"
+              f"{mean(s['full_recall']):>10.3f}{mean(s['adaptive_recall']):>11.3f}"
+              f"{mean(s['full_recall']) - mean(s['adaptive_recall']):>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Evaluate the rerank cascade: cross-encoder latency saved against nDCG change.
+
+Candidates come from AdvancedRetriever.multi_stage_retrieval over the
+synthetic corpus (with their fusion scores). The reference is full
+cross-encoder reranking: each candidate's graded relevance is its
+cross-encoder score, min-max normalized per query. Entity-tag labels would
+reward the metadata relevance that is part of the fusion score itself, so
+they can't measure what skipping the cross-encoder costs. For each setting
+the ranking is cut at final_context_k and reported as nDCG against those
+grades and the share of the full top-k it keeps:
+  full       - every candidate scored by the cross-encoder (previous behaviour)
+  cascade    - AdvancedReranker.cascade_rerank at several margin settings
+  fusion     - fusion-score order only, no cross-encoder
+and recommends the margins saving the most latency within --max-ndcg-drop.
+
+Usage: python benchmarks/eval_rerank_cascade.py [--model cross-encoder/ms-marco-MiniLM-L-6-v2]
+           [--queries 40] [--candidates 30] [--max-ndcg-drop 0.01]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_pipeline.config import RAG_CONFIG
+from synthetic_corpus import STATES, CROPS, YEARS, build_corpus
+from bench_reranker import QUERY_TEMPLATES
+
+# (accept margin, reject margin): smaller margins prune more aggressively
+SETTINGS = [
+    ("conservative", 0.7, 1.0),
+    ("default", RAG_CONFIG["cascade_accept_margin"], RAG_CONFIG["cascade_reject_margin"]),
+    ("moderate", 0.3, 0.5),
+    ("aggressive", 0.15, 0.25),
+    ("very aggressive", 0.05, 0.1),
+]
+
+
+def make_queries(num_queries: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUERY_TEMPLATES).format(
+            crop=rng.choice(CROPS).lower(), state=rng.choice(STATES),
+            other_state=rng.choice(STATES), year=rng.choice(YEARS)
+        )
+        for _ in range(num_queries)
+    ]
+
+
+def grades(scores: np.ndarray) -> list:
+    """Cross-encoder scores min-max normalized to [0, 1] relevance grades"""
+    scores = np.asarray(scores, dtype=float)
+    score_range = scores.max() - scores.min()
+    return list((scores - scores.min()) / score_range if score_range > 0 else np.ones_like(scores))
+
+
+def ndcg(ranked_gains: list, all_gains: list, k: int) -> float:
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float(np.sum(np.asarray(ranked_gains[:k], dtype=float) * discounts[:len(ranked_gains[:k])]))
+    ideal = sorted(all_gains, reverse=True)[:k]
+    idcg = float(np.sum(np.asarray(ideal, dtype=float) * discounts[:len(ideal)]))
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=RAG_CONFIG["cross_encoder_model"])
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--max-ndcg-drop", type=float, default=0.01)
+    args = parser.parse_args()
+    
+    from rag_system.reranker import AdvancedReranker
+    from rag_system.advanced_retriever import AdvancedRetriever
+    from rag_system.entity_matcher import get_domain_matcher
+    
+    RAG_CONFIG["cross_encoder_model"] = args.model
+    RAG_CONFIG["post_rerank_k"] = args.candidates
+    RAG_CONFIG["post_fusion_k"] = max(RAG_CONFIG["post_fusion_k"], args.candidates)
+    RAG_CONFIG["enable_rerank_score_cache"] = False  # time real inference on every run
+    RAG_CONFIG["persist_query_embedding_cache"] = False
+    k = RAG_CONFIG["final_context_k"]
+    
+    _, documents, vector_store = build_corpus()
+    retriever = AdvancedRetriever(vector_store, documents)
+    reranker = AdvancedReranker()
+    matcher = get_domain_matcher()
+    
+    workload = []
+    for query in make_queries(args.queries):
+        candidates = retriever.multi_stage_retrieval([query], matcher.extract(query), return_scores=True)
+        docs = [doc for doc, _ in candidates]
+        gains = grades(reranker.score_documents(query, docs))
+        workload.append((query, docs, [score for _, score in candidates], gains))
+    
+    def evaluate(rank_fn):
+        ndcgs, kept, seconds, scored = [], [], 0.0, 0
+        for query, docs, cheap_scores, gains in workload:
+            pairs_before = reranker.pairs_scored
+            start = time.perf_counter()
+            ranked = rank_fn(query, docs, cheap_scores)
+            seconds += time.perf_counter() - start
+            scored += reranker.pairs_scored - pairs_before
+            
+            position = {id(doc): i for i, doc in enumerate(docs)}
+            ndcgs.append(ndcg([gains[position[id(doc)]] for doc, _ in ranked], gains, k))
+            
+            full_top = set(np.argsort(-np.asarray(gains), kind="stable")[:k])
+            kept.append(len(full_top & {position[id(doc)] for doc, _ in ranked[:k]}) / min(k, len(docs)))
+        return float(np.mean(ndcgs)), float(np.mean(kept)), seconds * 1000 / len(workload), scored / len(workload)
+    
+    # Count pairs that reach the model
+    reranker.pairs_scored = 0
+    score_pairs = reranker._score_pairs
+    
+    def counting_score_pairs(query, docs):
+        reranker.pairs_scored += len(docs)
+        return score_pairs(query, docs)
+    
+    reranker._score_pairs = counting_score_pairs
+    
+    evaluate(lambda q, d, s: reranker.cross_encoder_rerank(q, d))  # warm-up
+    full_ndcg, full_kept, full_ms, full_pairs = evaluate(lambda q, d, s: reranker.cross_encoder_rerank(q, d))
+    
+    print(f"\n{len(workload)} queries, {sum(len(w[1]) for w in workload) / len(workload):.1f} candidates/query, "
+          f"nDCG@{k} against full cross-encoder grades\n")
+    print(f"{'setting':<16} {'accept':>7} {'reject':>7} {'pairs':>6} {'ms/query':>9} {'saved':>7} "
+          f"{'nDCG':>7} {'delta':>7} {'top-k kept':>11}")
+    print(f"{'full':<16} {'-':>7} {'-':>7} {full_pairs:>6.1f} {full_ms:>9.2f} {0:>6.0%} "
+          f"{full_ndcg:>7.4f} {0:>+7.4f} {full_kept:>10.0%}")
+    
+    best = None
+    for name, accept, reject in SETTINGS:
+        RAG_CONFIG["cascade_accept_margin"] = accept
+        RAG_CONFIG["cascade_reject_margin"] = reject
+        value, kept, ms, pairs = evaluate(lambda q, d, s: reranker.cascade_rerank(q, d, s))
+        if full_ndcg - value <= args.max_ndcg_drop and (best is None or ms < best[3]):
+            best = (name, accept, reject, ms)
+        print(f"{name:<16} {accept:>7.2f} {reject:>7.2f} {pairs:>6.1f} {ms:>9.2f} "
+              f"{1 - ms / full_ms:>6.0%} {value:>7.4f} {value - full_ndcg:>+7.4f} {kept:>10.0%}")
+    
+    value, kept, ms, _ = evaluate(lambda q, d, s: sorted(zip(d, s), key=lambda x: x[1], reverse=True))
+    print(f"{'fusion':<16} {'-':>7} {'-':>7} {0:>6.1f} {ms:>9.2f} {1 - ms / full_ms:>6.0%} "
+          f"{value:>7.4f} {value - full_ndcg:>+7.4f} {kept:>10.0%}")
+    
+    if best:
+        print(f"\nRecommended (nDCG drop <= {args.max_ndcg_drop}): {best[0]} - "
+              f"cascade_accept_margin={best[1]}, cascade_reject_margin={best[2]}")
+    else:
+        print(f"\nNo cascade setting keeps the nDCG drop within {args.max_ndcg_drop}")
+
+
+if __name__ == "__main__":
+    main()
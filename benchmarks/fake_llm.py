@@ -0,0 +1,155 @@
+"""
+Local stand-in for ChatOpenAI used by the benchmarks.
+Returns canned responses for the pipeline's prompts, counts round trips and
+tokens, and simulates network + generation latency (also when streamed).
+"""
+import re
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from langchain_core.runnables import Runnable
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when available, otherwise a word/punctuation approximation"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def extract_query(prompt: str) -> str:
+    """Pull the user query out of one of the pipeline prompts"""
+    match = re.search(r"^(?:Original Query|Query|Question):\s*(.+)$", prompt, re.MULTILINE)
+    return match.group(1).strip() if match else prompt.strip().splitlines()[-1]
+
+
+def extract_lines(text: str, max_lines: int = 2) -> str:
+    """Compression stand-in: the first few non-empty lines"""
+    return "\n".join([line.strip() for line in text.strip().splitlines() if line.strip()][:max_lines])
+
+
+def default_responder(prompt: str) -> str:
+    """Plausible responses for the query enhancement, compression and QA prompts"""
+    query = extract_query(prompt)
+    
+    parts = [part.strip() for part in re.split(r"\band\b", query) if part.strip()]
+    passage = (f"According to the dataset, {query} was 1,234 tonnes in 2014, "
+               f"up 5.2% from 1,173 tonnes in 2013 across the major producing states.")
+    
+    if '"hypothetical_passage"' in prompt:
+        return json.dumps({
+            "variations": [f"{query} statistics", f"data on {query}"],
+            "sub_questions": [] if "empty list" in prompt else parts,
+            "hypothetical_passage": passage
+        })
+    
+    if "alternative phrasings" in prompt:
+        return f"1. {query} statistics\n2. data on {query}"
+    
+    if "Break down this complex query" in prompt:
+        return "\n".join(f"{i}. {part}" for i, part in enumerate(parts, 1))
+    
+    if "hypothetical passage" in prompt:
+        return passage
+    
+    if "[DOC 1]" in prompt:
+        documents = re.findall(r"\[DOC (\d+)\]\n(.*?)\n\[/DOC \1\]", prompt, re.DOTALL)
+        return json.dumps({number: extract_lines(text) for number, text in documents})
+    
+    if "Relevant extracted information" in prompt:
+        return extract_lines(prompt.split("Context:", 1)[-1].rsplit("Relevant extracted", 1)[0])
+    
+    return f"Based on the available data, {query} was 1,234 tonnes in 2014 (Source: Source 1)."
+
+
+class FakeChatLLM(Runnable):
+    """
+    Runnable that can replace ChatOpenAI in `prompt | llm` chains.
+    Latency per call = latency_per_call + latency_per_output_token * completion tokens,
+    multiplied by time_scale when sleeping (0 disables sleeping). When streamed,
+    latency_per_call passes before the first chunk and each chunk then takes
+    its share of the per-token latency.
+    """
+    
+    def __init__(
+        self,
+        responder: Callable[[str], str] = default_responder,
+        latency_per_call: float = 0.35,
+        latency_per_output_token: float = 0.012,
+        time_scale: float = 1.0,
+        corrupt_json_every: int = 0
+    ):
+        self.responder = responder
+        self.latency_per_call = latency_per_call
+        self.latency_per_output_token = latency_per_output_token
+        self.time_scale = time_scale
+        self.corrupt_json_every = corrupt_json_every
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Zero the call and token counters"""
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.simulated_seconds = 0.0
+            self._json_responses = 0
+    
+    def _respond(self, input: Any) -> Tuple[str, float]:
+        """Response text and simulated latency for one call (counted)"""
+        prompt = input.to_string() if hasattr(input, 'to_string') else str(input)
+        response = self.responder(prompt)
+        
+        with self._lock:
+            # Truncate every n-th JSON response to exercise parse fallbacks
+            if response.startswith("{") and self.corrupt_json_every:
+                self._json_responses += 1
+                if self._json_responses % self.corrupt_json_every == 0:
+                    response = response[:len(response) // 2]
+            
+            completion_tokens = count_tokens(response)
+            latency = self.latency_per_call + self.latency_per_output_token * completion_tokens
+            
+            self.calls += 1
+            self.prompt_tokens += count_tokens(prompt)
+            self.completion_tokens += completion_tokens
+            self.simulated_seconds += latency
+        
+        return response, latency
+    
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs) -> AIMessage:
+        response, latency = self._respond(input)
+        
+        if self.time_scale > 0:
+            time.sleep(latency * self.time_scale)
+        
+        return AIMessage(content=response)
+    
+    def stream(self, input: Any, config: Optional[Dict] = None, **kwargs) -> Iterator[AIMessageChunk]:
+        response, _ = self._respond(input)
+        
+        if self.time_scale > 0:
+            time.sleep(self.latency_per_call * self.time_scale)
+        
+        # Word-sized chunks, like the deltas of a streamed completion
+        for text in re.findall(r"\s*\S+|\s+", response):
+            if self.time_scale > 0:
+                time.sleep(self.latency_per_output_token * count_tokens(text) * self.time_scale)
+            yield AIMessageChunk(content=text)
+    
+    def stats(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'simulated_seconds': round(self.simulated_seconds, 3)
+        }
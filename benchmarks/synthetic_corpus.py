@@ -0,0 +1,103 @@
+"""
+Synthetic data.gov.in-shaped corpus for the benchmarks.
+Builds crop production and subdivision rainfall records, chunks them with the
+pipeline's own document preparation and indexes them in FAISS with a local
+hashing embedding (no API calls).
+"""
+import os
+import sys
+import random
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+STATES = ["Punjab", "Haryana", "Bihar", "Kerala", "Gujarat", "Maharashtra",
+          "Karnataka", "Tamil Nadu", "Uttar Pradesh", "West Bengal"]
+CROPS = ["Rice", "Wheat", "Maize", "Cotton", "Sugarcane", "Groundnut", "Bajra", "Jowar"]
+SEASONS = ["Kharif", "Rabi", "Whole Year"]
+YEARS = list(range(2005, 2017))
+
+CROP_DATASET = ("35be999b-0208-4354-b557-f6ca9a5355de", "Crop Production Data")
+RAINFALL_DATASET = ("440dbca7-86ce-4bf6-b1af-83af2855757e", "Subdivision Rainfall Data")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic character n-gram hashing embedding (L2-normalized)"""
+    
+    def __init__(self, n_features: int = 1024):
+        self.vectorizer = HashingVectorizer(
+            analyzer='char_wb',
+            ngram_range=(3, 4),
+            n_features=n_features,
+            alternate_sign=False,
+            norm='l2'
+        )
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        matrix = self.vectorizer.transform(texts).toarray().astype(np.float32)
+        return matrix.tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def make_records(seed: int = 0, districts_per_state: int = 2) -> Dict[str, List[Dict]]:
+    """Crop production (state, district, crop, year, season) and subdivision rainfall records"""
+    rng = random.Random(seed)
+    agriculture = []
+    climate = []
+    
+    for state in STATES:
+        for d in range(districts_per_state):
+            district = f"{state.split()[0]} District {d + 1}"
+            for crop in rng.sample(CROPS, 4):
+                for year in YEARS:
+                    area = round(rng.uniform(1, 500), 1)
+                    agriculture.append({
+                        'state_name': state,
+                        'district_name': district,
+                        'crop_year': str(year),
+                        'season': rng.choice(SEASONS),
+                        'crop': crop,
+                        'area_': area,
+                        'production_': round(area * rng.uniform(1.5, 4.0), 1),
+                        '_dataset_id': CROP_DATASET[0],
+                        '_dataset_name': CROP_DATASET[1],
+                        '_dataset_category': 'agriculture'
+                    })
+        
+        for year in YEARS:
+            monsoon = round(rng.uniform(400, 2500), 1)
+            climate.append({
+                'subdivision': state.upper(),
+                'year': year,
+                'jun_sep': monsoon,
+                'annual': round(monsoon * rng.uniform(1.1, 1.5), 1),
+                '_dataset_id': RAINFALL_DATASET[0],
+                '_dataset_name': RAINFALL_DATASET[1],
+                '_dataset_category': 'climate'
+            })
+    
+    return {'agriculture': agriculture, 'climate': climate}
+
+
+def build_corpus(seed: int = 0, districts_per_state: int = 2) -> Tuple[Dict, List[Document], FAISS]:
+    """Records, prepared (chunked + entity-tagged) documents and a FAISS store over them"""
+    from rag_system.embeddings import EmbeddingManager
+    from rag_system.advanced_chunking import AdvancedChunker
+    
+    data = make_records(seed, districts_per_state)
+    
+    # Only document preparation is used: skip __init__ (OpenAI client, store directory)
+    manager = EmbeddingManager.__new__(EmbeddingManager)
+    manager.chunker = AdvancedChunker()
+    documents = manager.prepare_documents(data, use_advanced_chunking=True)
+    
+    vector_store = FAISS.from_documents(documents, HashingEmbeddings())
+    return data, documents, vector_store
@@ -87,6 +87,13 @@ RAG_CONFIG = {
     "post_rerank_k": 15,
     "final_context_k": 8,
     
+    # Query planner (dedupe search queries, per-leg k under a total budget)
+    "enable_query_planner": True,
+    "planner_dedupe_similarity": 0.92,  # Cosine similarity above which a query is a near-duplicate
+    "planner_max_legs": 6,
+    "planner_total_k": 150,  # Sum of k over all legs (each leg runs dense + sparse)
+    "planner_min_k": 15,
+    
     # Scoring weights
     "dense_weight": 0.5,
     "sparse_weight": 0.3,
@@ -96,14 +103,79 @@ RAG_CONFIG = {
     "enable_query_expansion": True,
     "enable_hyde": True,
     "max_query_variations": 3,
+    "combined_query_enhancement": True,  # One JSON call for expansion/decomposition/HyDE
+    "parallel_query_enhancement": True,  # Issue expansion/decomposition/HyDE concurrently
+    "query_enhancement_timeout": 8.0,  # Shared per-request deadline in seconds
+    "query_enhancement_workers": 6,
+    "enable_query_enhancement_cache": True,
+    "query_enhancement_cache_mb": 16,
+    "query_enhancement_cache_ttl": 86400,  # Seconds; None = no expiry
+    "persist_query_enhancement_cache": True,
+    
+    # Adaptive enhancement policy (skip LLM stages for well-specified queries)
+    "adaptive_query_enhancement": True,
+    "policy_min_entity_coverage": 0.6,  # Share of content words that are known entities
+    "policy_max_simple_tokens": 8,
+    "policy_min_score_margin": 0.02,  # Below this past dense margin, run all stages
+    "policy_margin_ewma_alpha": 0.3,
     
     # Reranking
     "cross_encoder_model": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    "cross_encoder_backend": "torch",  # torch | quantized (dynamic int8) | onnx (needs optimum[onnxruntime])
+    "cross_encoder_batch_size": 32,
+    "cross_encoder_max_length": 256,  # Tokens per query-document pair; longer pairs are truncated
+    "precompute_document_tokens": True,  # Tokenize chunks once per index; rerank only tokenizes the query
+    "rerank_micro_batching": True,  # One inference worker batching pairs from concurrent requests
+    "rerank_batch_max_pairs": 256,
+    "rerank_batch_max_wait_ms": 5,  # Longest a request waits for others to join its batch
+    "enable_rerank_score_cache": True,  # Reuse scores of (query, document) pairs seen before
+    "rerank_score_cache_mb": 8,
+    "rerank_score_cache_ttl": 86400,  # Seconds; None = no expiry
     "mmr_lambda": 0.7,  # Balance between relevance and diversity
+    "rerank_cascade": True,  # Only cross-encode candidates the fusion score can't separate
+    "cascade_accept_margin": 0.5,  # Normalized fusion-score lead over the cutoff that skips the cross-encoder
+    "cascade_reject_margin": 0.8,  # Normalized deficit below the cutoff that drops a candidate unscored
+    "mmr_use_stored_vectors": True,  # MMR similarity from FAISS-stored vectors instead of per-query TF-IDF
     
     # Context compression
     "enable_compression": True,
+    "compression_method": "hybrid",  # sentences | llm | hybrid | batched (one LLM call for all documents: fewer round trips and prompt tokens, but slower than parallel hybrid)
     "compression_ratio": 0.6,  # Keep 60% of content
+    "parallel_compression": True,  # Compress documents with concurrent LLM calls
+    "compression_workers": 8,  # Max LLM compression calls in flight (one per final context document); documents beyond the free workers keep their sentence extract
+    "compression_timeout": 6.0,  # Seconds; documents still compressing keep their sentence extract
+    "redundancy_method": "indexed",  # indexed (inverted word index candidates, same overlap check) | exact (pairwise)
+    "precompute_sentence_index": True,  # Segment chunk sentences once per index for extract_key_sentences
+    "enable_compression_cache": True,  # Reuse compressed extracts of (query, document) pairs seen before
+    "compression_cache_mb": 16,
+    "compression_cache_ttl": 86400,  # Seconds; None = no expiry
+    
+    # Token-budgeted QA prompt (counted with the model's tiktoken encoding)
+    "enable_context_packing": True,
+    "prompt_token_budget": 4000,  # Instructions + chat history + question + context
+    "history_token_budget": 500,  # Most recent chat history lines within this share of the budget
+    "min_trimmed_document_tokens": 80,  # Drop instead of trimming a document into less room than this
+    "token_count_cache_entries": 20000,
+    "clean_streamed_tokens": True,  # Stream cleaned answer text (held back only while a later chunk could change it) instead of raw tokens
+    
+    # Query embedding cache
+    "query_embedding_cache_mb": 32,
+    "query_embedding_cache_ttl": None,  # Seconds; None = no expiry
+    "persist_query_embedding_cache": True,
+    
+    # Structured analytical queries over cached datasets
+    "enable_structured_query": True,
+    "structured_query_bypass_llm": False,  # Answer exact results without the LLM
+    
+    # Pre-aggregated rollups injected as a synthetic context document
+    "enable_rollups": True,
+    "rollup_max_rows": 30,
+    
+    # Semantic answer cache for near-duplicate, history-independent questions
+    "enable_answer_cache": True,
+    "answer_cache_similarity": 0.95,  # Cosine similarity between question embeddings naming the same entities and years
+    "answer_cache_max_entries": 500,
+    "answer_cache_ttl": 3600,  # Seconds; None = no expiry
 }
 
 # Domain-specific keywords for agricultural data
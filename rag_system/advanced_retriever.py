@@ -1,24 +1,81 @@
-from typing import List, Dict, Tuple, Optional
+import os
+import hashlib
+from typing import List, Dict, Tuple, Optional, Union
 from collections import defaultdict
 import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from rank_bm25 import BM25Okapi
-from data_pipeline.config import RAG_CONFIG, DOMAIN_KEYWORDS
+from data_pipeline.config import RAG_CONFIG, VECTOR_STORE_DIR
+from rag_system.cache import LRUCache, normalize_query, document_fingerprint
+from rag_system.rollup_cube import RollupCube
+from rag_system.structured_query import extract_year_range
+from rag_system.entity_matcher import get_domain_matcher
 
 class AdvancedRetriever:
     """
     Multi-stage retrieval with BM25, dense retrieval, and Reciprocal Rank Fusion
     """
     
-    def __init__(self, vector_store: FAISS, all_documents: List[Document]):
+    def __init__(
+        self,
+        vector_store: FAISS,
+        all_documents: List[Document],
+        rollup_cube: Optional[RollupCube] = None
+    ):
         self.vector_store = vector_store
         self.all_documents = all_documents
+        self.rollup_cube = rollup_cube
         self.config = RAG_CONFIG
         
         # Build BM25 index
         self.bm25_index = self._build_bm25_index()
         print(f"BM25 index built with {len(all_documents)} documents")
+        
+        # Fingerprint of the indexed corpus; caches keyed on it are dropped on rebuild
+        self.index_version = self._compute_index_version()
+        
+        # Entity tags (normally added at index time; tag older stores here)
+        self.entity_matcher = get_domain_matcher()
+        untagged = [doc for doc in all_documents if 'entities' not in doc.metadata]
+        if untagged:
+            self.entity_matcher.tag_documents(untagged)
+            print(f"Tagged {len(untagged)} documents with domain entities")
+        
+        # Document fingerprint -> row in the FAISS index, to reuse stored vectors
+        self.vector_positions = self._build_vector_positions()
+        
+        # Cache of (embedding model, dimension, normalized query text) -> embedding vector
+        self.embedding_model = self._embedding_model_name()
+        self.embedding_dim = self.vector_store.index.d
+        persist_path = None
+        if self.config["persist_query_embedding_cache"]:
+            persist_path = os.path.join(VECTOR_STORE_DIR, "query_embedding_cache.pkl")
+        
+        self.embedding_cache = LRUCache(
+            max_bytes=self.config["query_embedding_cache_mb"] * 1024 * 1024,
+            ttl_seconds=self.config["query_embedding_cache_ttl"],
+            persist_path=persist_path
+        )
+        
+        # Persisted vectors from another model, dimension or key format can't be reused
+        stale = self.embedding_cache.prune(
+            lambda key, vector: (
+                not isinstance(key, tuple)
+                or key[:2] != (self.embedding_model, self.embedding_dim)
+                or np.shape(vector) != (self.embedding_dim,)
+            )
+        )
+        if stale:
+            print(f"Dropped {stale} cached query embeddings from another embedding model")
+    
+    def _embedding_model_name(self) -> str:
+        """Identifier of the query embedder (class and model name)"""
+        embedder = self.vector_store.embedding_function
+        model = getattr(embedder, 'model', None) or getattr(embedder, 'model_name', None)
+        if model is None:
+            model = getattr(embedder, '__qualname__', '')
+        return f"{type(embedder).__name__}:{model}"
     
     def _build_bm25_index(self) -> BM25Okapi:
         """Build BM25 sparse retrieval index"""
@@ -28,9 +85,97 @@ class AdvancedRetriever:
         ]
         return BM25Okapi(tokenized_corpus)
     
+    def _compute_index_version(self) -> str:
+        """Hash of all document contents"""
+        digest = hashlib.md5()
+        for doc in self.all_documents:
+            digest.update(doc.page_content.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()[:16]
+    
+    def _build_vector_positions(self) -> Dict[str, int]:
+        """Map each indexed document's content fingerprint to its FAISS row"""
+        positions = {}
+        docstore = self.vector_store.docstore
+        
+        for position, doc_id in self.vector_store.index_to_docstore_id.items():
+            doc = docstore.search(doc_id)
+            if isinstance(doc, Document):
+                positions.setdefault(document_fingerprint(doc.page_content), position)
+        
+        return positions
+    
+    def get_document_vectors(self, documents: List[Document]) -> np.ndarray:
+        """
+        Dense vectors of documents as stored at index time (reconstructed from the
+        FAISS index by row); documents not in the index are embedded on the fly
+        """
+        index = self.vector_store.index
+        vectors = np.zeros((len(documents), index.d), dtype=np.float32)
+        
+        positions = [
+            self.vector_positions.get(document_fingerprint(doc.page_content))
+            for doc in documents
+        ]
+        found = [i for i, position in enumerate(positions) if position is not None]
+        
+        if found:
+            try:
+                vectors[found] = index.reconstruct_batch(
+                    np.array([positions[i] for i in found], dtype=np.int64)
+                )
+            except RuntimeError as e:
+                # Some index types (e.g. IVF without a direct map) can't reconstruct
+                print(f"Could not reconstruct stored vectors: {e}")
+                found = []
+        
+        missing = sorted(set(range(len(documents))) - set(found))
+        if missing:
+            embedder = self.vector_store.embedding_function
+            texts = [documents[i].page_content for i in missing]
+            if hasattr(embedder, 'embed_documents'):
+                vectors[missing] = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+            else:
+                vectors[missing] = np.asarray([embedder(text) for text in texts], dtype=np.float32)
+        
+        return vectors
+    
+    def document_entities(self, doc: Document) -> set:
+        """Set of domain keywords tagged on a document (tagging it on first use)"""
+        if 'entities' not in doc.metadata:
+            self.entity_matcher.tag_documents([doc])
+        return {
+            keyword
+            for keywords in doc.metadata['entities'].values()
+            for keyword in keywords
+        }
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed query text, serving repeats from the LRU embedding cache"""
+        cache_key = (self.embedding_model, self.embedding_dim, normalize_query(query))
+        
+        embedding = self.embedding_cache.get(cache_key)
+        if embedding is not None:
+            return embedding
+        
+        embedder = self.vector_store.embedding_function
+        if hasattr(embedder, 'embed_query'):
+            vector = embedder.embed_query(query)
+        else:
+            vector = embedder(query)
+        
+        embedding = np.asarray(vector, dtype=np.float32)
+        if embedding.shape == (self.embedding_dim,):
+            self.embedding_cache.set(cache_key, embedding)
+        
+        return embedding
+    
     def dense_retrieval(self, query: str, k: int = 50) -> List[Tuple[Document, float]]:
         """Dense retrieval using vector similarity"""
-        results = self.vector_store.similarity_search_with_score(query, k=k)
+        results = self.vector_store.similarity_search_with_score_by_vector(
+            self.embed_query(query).tolist(),
+            k=k
+        )
         
         # FAISS returns (doc, distance), convert distance to similarity
         # Lower distance = higher similarity
@@ -40,6 +185,13 @@ class AdvancedRetriever:
         
         return results_with_similarity
     
+    def score_margin(self, query: str, k: int = 10) -> float:
+        """Gap between the best and k-th dense similarity; small gaps mean ambiguous retrieval"""
+        results = self.dense_retrieval(query, k=k)
+        if len(results) < 2:
+            return 0.0
+        return float(results[0][1] - results[-1][1])
+    
     def sparse_retrieval(self, query: str, k: int = 50) -> List[Tuple[Document, float]]:
         """Sparse retrieval using BM25"""
         tokenized_query = query.lower().split()
@@ -69,32 +221,22 @@ class AdvancedRetriever:
         filtered = []
         
         for doc in documents:
-            content_lower = doc.page_content.lower()
-            metadata_str = str(doc.metadata).lower()
+            doc_entities = self.document_entities(doc)
             
             # Check for entity matches
             matches = 0
             
             # Crop matches
-            if entities.get('crops'):
-                for crop in entities['crops']:
-                    if crop in content_lower or crop in metadata_str:
-                        matches += 1
-                        break
+            if any(crop in doc_entities for crop in entities.get('crops', [])):
+                matches += 1
             
             # State matches
-            if entities.get('states'):
-                for state in entities['states']:
-                    if state in content_lower or state in metadata_str:
-                        matches += 1
-                        break
+            if any(state in doc_entities for state in entities.get('states', [])):
+                matches += 1
             
             # Metric matches
-            if entities.get('metrics'):
-                for metric in entities['metrics']:
-                    if metric in content_lower:
-                        matches += 1
-                        break
+            if any(metric in doc_entities for metric in entities.get('metrics', [])):
+                matches += 1
             
             # Include document if it has any entity matches or if no specific entities
             if matches > 0 or not (entities['crops'] or entities['states']):
@@ -146,14 +288,13 @@ class AdvancedRetriever:
         """Compute relevance score based on metadata matches"""
         
         score = 0.0
-        content_lower = doc.page_content.lower()
-        metadata_str = str(doc.metadata).lower()
+        doc_entities = self.document_entities(doc)
         
         # Crop relevance
         if entities.get('crops'):
             crop_matches = sum(
                 1 for crop in entities['crops'] 
-                if crop in content_lower or crop in metadata_str
+                if crop in doc_entities
             )
             score += crop_matches * 0.3
         
@@ -161,7 +302,7 @@ class AdvancedRetriever:
         if entities.get('states'):
             state_matches = sum(
                 1 for state in entities['states']
-                if state in content_lower or state in metadata_str
+                if state in doc_entities
             )
             score += state_matches * 0.3
         
@@ -169,7 +310,7 @@ class AdvancedRetriever:
         if entities.get('metrics'):
             metric_matches = sum(
                 1 for metric in entities['metrics']
-                if metric in content_lower
+                if metric in doc_entities
             )
             score += metric_matches * 0.2
         
@@ -182,38 +323,62 @@ class AdvancedRetriever:
         
         return min(score, 1.0)  # Cap at 1.0
     
+    def rollup_document(
+        self,
+        query: str,
+        entities: Dict[str, List[str]],
+        category: Optional[str] = None
+    ) -> Optional[Document]:
+        """Synthetic document with the pre-aggregated rollup rows matching the entities"""
+        if not self.config["enable_rollups"] or self.rollup_cube is None:
+            return None
+        
+        rows, total_rows = self.rollup_cube.lookup(entities, year_range=extract_year_range(query.lower()))
+        rollup_doc = self.rollup_cube.to_document(rows, total_rows)
+        
+        if rollup_doc is None:
+            return None
+        if category and rollup_doc.metadata['category'] not in (category, 'mixed'):
+            return None
+        
+        return rollup_doc
+    
     def multi_stage_retrieval(
         self,
         queries: List[str],
         entities: Dict[str, List[str]],
-        category: Optional[str] = None
-    ) -> List[Document]:
+        category: Optional[str] = None,
+        query_plan: Optional[List[Dict]] = None,
+        return_scores: bool = False
+    ) -> Union[List[Document], List[Tuple[Document, float]]]:
         """
         Main retrieval method with multiple stages:
-        1. Broad retrieval (dense + sparse for each query)
+        1. Broad retrieval (dense + sparse for each query, or each leg of the query plan)
         2. Fusion with RRF
         3. Metadata filtering
-        4. Return top-k documents
+        4. Return top-k documents (rollup document pinned first),
+           with their combined fusion scores if return_scores
         """
         
-        print(f"Stage 1: Broad retrieval for {len(queries)} query variations")
+        if query_plan:
+            legs = [(leg['query'], leg['k']) for leg in query_plan]
+            print(f"Stage 1: Broad retrieval for {len(legs)} planned legs "
+                  f"(k={', '.join(str(k) for _, k in legs)})")
+        else:
+            # Limit to top 3 queries to avoid over-retrieval
+            legs = [(query, self.config["initial_retrieval_k"]) for query in queries[:3]]
+            print(f"Stage 1: Broad retrieval for {len(queries)} query variations")
         
         # Stage 1: Retrieve with each query using both dense and sparse
         all_ranked_lists = []
         
-        for query in queries[:3]:  # Limit to top 3 queries to avoid over-retrieval
+        for query, k in legs:
             # Dense retrieval
-            dense_results = self.dense_retrieval(
-                query, 
-                k=self.config["initial_retrieval_k"]
-            )
+            dense_results = self.dense_retrieval(query, k=k)
             all_ranked_lists.append(dense_results)
             
             # Sparse retrieval
-            sparse_results = self.sparse_retrieval(
-                query,
-                k=self.config["initial_retrieval_k"]
-            )
+            sparse_results = self.sparse_retrieval(query, k=k)
             all_ranked_lists.append(sparse_results)
         
         print(f"Stage 2: Fusion - combining {len(all_ranked_lists)} ranked lists")
@@ -262,10 +427,18 @@ class AdvancedRetriever:
         scored_docs.sort(key=lambda x: x[1], reverse=True)
         
         # Return top documents (before reranking stage)
-        top_docs = [doc for doc, _ in scored_docs[:self.config["post_rerank_k"]]]
-        
-        print(f"Retrieved {len(top_docs)} documents for reranking")
-        return top_docs
+        top_scored = scored_docs[:self.config["post_rerank_k"]]
+        
+        # Exact rollups for the queried dimensions take priority over raw chunks
+        rollup_doc = self.rollup_document(queries[0] if queries else "", entities, category)
+        if rollup_doc is not None:
+            top_scored.insert(0, (rollup_doc, float('inf')))
+            print("Injected pre-aggregated rollup document")
+        
+        print(f"Retrieved {len(top_scored)} documents for reranking")
+        if return_scores:
+            return top_scored
+        return [doc for doc, _ in top_scored]
     
     def retrieve(
         self,
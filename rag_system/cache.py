@@ -0,0 +1,394 @@
+import os
+import sys
+import time
+import atexit
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+
+# Absolute persist path -> the LRUCache currently persisting to it
+_PERSISTING: Dict[str, "LRUCache"] = {}
+_PERSISTING_LOCK = threading.Lock()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different phrasings share a cache key"""
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+def query_fingerprint(query: str) -> str:
+    """Stable short hash of the normalized query text"""
+    return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()[:16]
+
+
+def document_fingerprint(page_content: str) -> str:
+    """Stable short hash of document content, used as a document id across stores"""
+    return hashlib.sha1(page_content.encode('utf-8')).hexdigest()[:16]
+
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a cached value in bytes"""
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes + 112  # numpy array header
+    
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by memory, with optional TTL and disk persistence
+    """
+    
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: Optional[float] = None,
+        persist_path: Optional[str] = None,
+        persist_every: int = 100,
+        sizeof: Callable[[Any], int] = estimate_size
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or None
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+        self.sizeof = sizeof
+        
+        # key -> (value, size, stored_at)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved_writes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if self.persist_path:
+            self._claim_persist_path()
+            self.load()
+            atexit.register(self.save)
+    
+    def _claim_persist_path(self):
+        """
+        Make this the only cache persisting to its path: an earlier one (e.g. of a
+        pipeline replaced by an index rebuild) saves once more and detaches, so
+        its exit handler can't overwrite the file with a stale snapshot
+        """
+        path = os.path.abspath(self.persist_path)
+        with _PERSISTING_LOCK:
+            previous = _PERSISTING.get(path)
+            _PERSISTING[path] = self
+        
+        if previous is not None:
+            previous.detach()
+    
+    def detach(self):
+        """Save a last time and stop persisting (removes the exit handler)"""
+        if not self.persist_path:
+            return
+        
+        self.save()
+        atexit.unregister(self.save)
+        with self._save_lock:
+            self.persist_path = None
+    
+    def _is_expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+    
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value (refreshing its recency) or default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, _, stored_at = entry
+            if self._is_expired(stored_at, time.time()):
+                self._remove(key)
+                self.misses += 1
+                return default
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Insert value, evicting least recently used entries to stay within budget"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (value, size, time.time())
+            self._current_bytes += size
+            
+            while self._current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+            
+            self._unsaved_writes += 1
+            should_save = (
+                self.persist_path is not None and
+                self._unsaved_writes >= self.persist_every
+            )
+        
+        if should_save:
+            self.save()
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+    
+    def prune(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop entries for which predicate(key, value) is true; returns how many"""
+        with self._lock:
+            stale = [key for key, (value, _, _) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._is_expired(entry[2], time.time())
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and memory usage"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+    
+    def save(self):
+        """Persist entries to disk (atomic replace; saves are serialized, newest snapshot last)"""
+        with self._save_lock:
+            path = self.persist_path
+            if not path or (not self._entries and not os.path.exists(path)):
+                return
+            
+            with self._lock:
+                snapshot = [
+                    (key, value, stored_at)
+                    for key, (value, _, stored_at) in self._entries.items()
+                ]
+                self._unsaved_writes = 0
+            
+            tmp_path = None
+            try:
+                directory = os.path.dirname(path) or '.'
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(snapshot, f)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error saving cache to {path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    
+    def load(self):
+        """Load persisted entries, skipping expired ones"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        
+        try:
+            with open(self.persist_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"Error loading cache from {self.persist_path}: {e}")
+            return
+        
+        now = time.time()
+        with self._lock:
+            for key, value, stored_at in snapshot:
+                if self._is_expired(stored_at, now):
+                    continue
+                size = self.sizeof(value)
+                self._entries[key] = (value, size, stored_at)
+                self._current_bytes += size
+            
+            while self._current_bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+        
+        print(f"Loaded {len(self._entries)} cached entries from {self.persist_path}")
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by question embedding + scope (e.g. category).
+    Recent questions are kept in a small normalized embedding matrix; a lookup
+    hits when the best cosine similarity within the same scope clears the threshold.
+    Entries expire after a TTL, the least recently used are evicted beyond max_entries,
+    and everything is dropped when the index version changes.
+    """
+    
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 500,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None
+        self.index_version: Optional[str] = None
+        
+        self._vectors: Optional[np.ndarray] = None  # (entries x dim), unit rows
+        self._entries: List[Dict] = []
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _check_version(self, index_version: str):
+        """Drop all entries if the underlying index was rebuilt"""
+        if index_version != self.index_version:
+            if self._entries:
+                print(f"Answer cache invalidated ({len(self._entries)} entries, index changed)")
+            self._vectors = None
+            self._entries = []
+            self.index_version = index_version
+    
+    def _drop(self, positions: List[int]):
+        keep = np.setdiff1d(np.arange(len(self._entries)), positions)
+        self._vectors = self._vectors[keep] if len(keep) else None
+        self._entries = [self._entries[i] for i in keep]
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def lookup(
+        self,
+        embedding: np.ndarray,
+        scope: Hashable,
+        index_version: str
+    ) -> Optional[Tuple[Any, float, str]]:
+        """Return (value, similarity, cached question) for the closest match, or None"""
+        vector = self._normalize(embedding)
+        now = time.time()
+        
+        with self._lock:
+            self._check_version(index_version)
+            
+            if self.ttl_seconds is not None and self._entries:
+                expired = [
+                    i for i, entry in enumerate(self._entries)
+                    if now - entry['stored_at'] > self.ttl_seconds
+                ]
+                if expired:
+                    self._drop(expired)
+            
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self.misses += 1
+                return None
+            
+            in_scope = np.array([entry['scope'] == scope for entry in self._entries])
+            similarities = np.where(in_scope, self._vectors @ vector, -1.0)
+            
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            
+            if similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+            
+            entry = self._entries[best]
+            entry['last_used'] = now
+            self.hits += 1
+            return entry['value'], similarity, entry['question']
+    
+    def store(
+        self,
+        embedding: np.ndarray,
+        scope: Hashable,
+        index_version: str,
+        question: str,
+        value: Any
+    ):
+        """Cache a value, evicting the least recently used entry when full"""
+        vector = self._normalize(embedding)
+        now = time.time()
+        
+        with self._lock:
+            self._check_version(index_version)
+            
+            # Embedding model changed: vectors are no longer comparable
+            if self._vectors is not None and self._vectors.shape[1] != len(vector):
+                self._vectors = None
+                self._entries = []
+            
+            if len(self._entries) >= self.max_entries:
+                oldest = int(np.argmin([entry['last_used'] for entry in self._entries]))
+                self._drop([oldest])
+                self.evictions += 1
+            
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._entries.append({
+                'scope': scope,
+                'question': question,
+                'value': value,
+                'stored_at': now,
+                'last_used': now
+            })
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._vectors = None
+            self._entries = []
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and size"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -1,9 +1,22 @@
+import os
 import re
-from typing import List, Dict
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from data_pipeline.config import RAG_CONFIG
+from data_pipeline.config import RAG_CONFIG, VECTOR_STORE_DIR
+from rag_system.cache import LRUCache, query_fingerprint, document_fingerprint
+from rag_system.sentence_index import SentenceIndex, SENTENCE_INDEX_FORMAT
+from rag_system.near_duplicates import near_duplicate_mask
+from rag_system.context_packer import get_token_counter
+
+# Methods whose per-document output is memoized in the extract cache
+CACHED_METHODS = ("llm", "hybrid", "batched")
 
 class ContextCompressor:
     """
@@ -18,6 +31,20 @@ class ContextCompressor:
             api_key=openai_api_key
         )
         
+        # Bounded pool for compressing several documents concurrently
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config["compression_workers"],
+            thread_name_prefix="context-compression"
+        )
+        
+        # Calls still running past their deadline (cancel() can't stop them);
+        # each holds a worker until it returns, so new requests skip those workers
+        self.abandoned_calls = 0
+        self._abandoned_lock = threading.Lock()
+        
+        # Chunk sentences segmented once per index (see prepare_sentence_index)
+        self.sentence_index: Optional[SentenceIndex] = None
+        
         # Extraction prompt
         self.extraction_prompt = PromptTemplate(
             input_variables=["query", "context"],
@@ -30,6 +57,68 @@ Context:
 
 Relevant extracted information (be concise but preserve key data):"""
         )
+        
+        # Batched extraction prompt: every document in one call, marked [DOC n] ... [/DOC n]
+        self.batched_extraction_prompt = PromptTemplate(
+            input_variables=["query", "documents"],
+            template="""Extract ONLY the information from each document below that is directly relevant to answering the query. Keep specific numbers, dates, locations, and key facts. Remove redundant or irrelevant information.
+
+Return ONLY a JSON object mapping each document number to its extract, for example {{"1": "...", "2": "..."}}. Include every document number.
+
+Query: {query}
+
+{documents}
+
+JSON:"""
+        )
+        
+        # Compressed extracts: (query fingerprint, document fingerprint, method, prompt version) -> text
+        self.extract_cache = LRUCache(
+            max_bytes=self.config["compression_cache_mb"] * 1024 * 1024,
+            ttl_seconds=self.config["compression_cache_ttl"]
+        )
+        self.extract_cache_index_version = None
+    
+    @property
+    def prompt_version(self) -> str:
+        """
+        Hash of everything that shapes the compressed extracts, computed from
+        the current llm so a replaced model never reads or writes its entries
+        """
+        parts = [
+            self.extraction_prompt.template,
+            self.batched_extraction_prompt.template,
+            type(self.llm).__name__,
+            getattr(self.llm, 'model_name', ''),
+            str(getattr(self.llm, 'temperature', '')),
+            SENTENCE_INDEX_FORMAT
+        ]
+        return hashlib.sha1("\0".join(parts).encode('utf-8')).hexdigest()[:12]
+    
+    def prepare_sentence_index(self, documents: List[Document], index_version: str):
+        """
+        Segment the indexed documents into sentences once (loaded
+        from disk when already built for this index)
+        """
+        if not self.config["precompute_sentence_index"] or not documents:
+            return
+        
+        index = SentenceIndex()
+        path = os.path.join(VECTOR_STORE_DIR, "sentence_index.npz")
+        version = f"{index_version}:{SENTENCE_INDEX_FORMAT}"
+        
+        if index.load(path, version):
+            print(f"Loaded sentence index for {len(index)} documents")
+        else:
+            index.build(documents, version)
+            print(f"Segmented {len(index)} documents into {len(index.spans)} sentences")
+            try:
+                os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+                index.save(path)
+            except Exception as e:
+                print(f"Could not save sentence index: {e}")
+        
+        self.sentence_index = index
     
     def extract_key_sentences(
         self, 
@@ -74,11 +163,37 @@ Relevant extracted information (be concise but preserve key data):"""
         
         return [sent for sent, _ in scored_sentences[:max_sentences]]
     
+    def extract_key_sentences_batch(
+        self,
+        documents: List[Document],
+        query: str,
+        max_sentences: int = 5
+    ) -> List[List[str]]:
+        """
+        extract_key_sentences for several documents; indexed ones are scored
+        together in one pass over the sentence index
+        """
+        texts = [doc.page_content for doc in documents]
+        
+        if self.sentence_index is not None:
+            results = self.sentence_index.key_sentences_batch(texts, query, max_sentences)
+        else:
+            results = [None] * len(texts)
+        
+        return [
+            key_sentences if key_sentences is not None else self.extract_key_sentences(text, query, max_sentences)
+            for text, key_sentences in zip(texts, results)
+        ]
+    
     def remove_redundancy(self, texts: List[str]) -> List[str]:
         """
         Remove duplicate or highly similar content
         """
         
+        if self.config["redundancy_method"] == "indexed":
+            keep = near_duplicate_mask(texts, threshold=0.8)
+            return [text for text, kept in zip(texts, keep) if kept]
+        
         unique_texts = []
         seen_content = set()
         
@@ -137,11 +252,178 @@ Relevant extracted information (be concise but preserve key data):"""
             print(f"Error in LLM compression: {e}")
             return context
     
+    def free_workers(self) -> int:
+        """Compression workers not held by calls abandoned at an earlier deadline"""
+        with self._abandoned_lock:
+            return self.config["compression_workers"] - self.abandoned_calls
+    
+    def _abandon(self, future):
+        """Cancel a call that missed its deadline; a running one is counted until it returns"""
+        if future.cancel():
+            return
+        
+        with self._abandoned_lock:
+            self.abandoned_calls += 1
+        future.add_done_callback(self._release_abandoned)
+    
+    def _release_abandoned(self, future):
+        with self._abandoned_lock:
+            self.abandoned_calls -= 1
+    
+    def _compress_concurrently(self, query: str, texts: Dict[int, str]) -> Dict[int, str]:
+        """
+        LLM-compress several texts in parallel (at most compression_workers in
+        flight) under one deadline. Only as many texts as there are free workers
+        are submitted, so none queue behind calls abandoned at an earlier
+        deadline (those run on and hold their worker until they return); the
+        rest, and texts still compressing at the deadline, keep their
+        sentence-extracted version.
+        """
+        free = self.free_workers()
+        if free <= 0:
+            print("All compression workers busy with calls past their deadline, using sentence extracts")
+            return dict(texts)
+        
+        start_time = time.time()
+        results = dict(texts)
+        
+        futures = {
+            i: self.executor.submit(self.compress_with_llm, query, texts[i])
+            for i in list(texts)[:free]
+        }
+        done, _ = wait(futures.values(), timeout=self.config["compression_timeout"])
+        
+        for i, future in futures.items():
+            if future in done:
+                results[i] = future.result()
+            else:
+                self._abandon(future)
+                results[i] = texts[i]
+        
+        print(f"LLM compression finished in {time.time() - start_time:.2f}s "
+              f"({len(done)}/{len(texts)} completed, {len(texts) - len(done)} used sentence extracts)")
+        
+        return results
+    
+    def format_batched_documents(self, texts: Dict[int, str]) -> str:
+        """Documents with stable markers, numbered from 1 in document order"""
+        return "\n\n".join(
+            f"[DOC {n}]\n{texts[i]}\n[/DOC {n}]"
+            for n, i in enumerate(sorted(texts), 1)
+        )
+    
+    def parse_batched_response(self, response_text: str, num_documents: int) -> Optional[Dict[int, str]]:
+        """Document number -> extract for the valid, non-empty entries; None if the response isn't a JSON object"""
+        match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if not match:
+            return None
+        
+        try:
+            parsed = json.loads(match.group(0))
+        except ValueError:
+            return None
+        
+        if not isinstance(parsed, dict):
+            return None
+        
+        extracts = {}
+        for key, value in parsed.items():
+            number = re.sub(r'\D', '', str(key))
+            if not number or not isinstance(value, str) or not value.strip():
+                continue
+            if 1 <= int(number) <= num_documents:
+                extracts[int(number)] = value.strip()
+        
+        return extracts
+    
+    def _compress_batched(self, query: str, texts: Dict[int, str]) -> Dict[int, str]:
+        """
+        LLM-compress several texts with one call under the compression deadline.
+        Texts missing from the response (or all of them on a timeout, error or
+        invalid JSON) keep their sentence-extracted version.
+        """
+        if not self.config["enable_compression"]:
+            return dict(texts)
+        
+        start_time = time.time()
+        order = sorted(texts)
+        results = dict(texts)
+        
+        if self.free_workers() <= 0:
+            print("All compression workers busy with calls past their deadline, using sentence extracts")
+            return results
+        
+        try:
+            chain = self.batched_extraction_prompt | self.llm
+            future = self.executor.submit(chain.invoke, {
+                "query": query,
+                "documents": self.format_batched_documents(texts)
+            })
+            response = future.result(timeout=self.config["compression_timeout"])
+            
+            response_text = response.content if hasattr(response, 'content') else str(response)
+        
+        except FutureTimeoutError:
+            self._abandon(future)
+            print("Batched compression missed the deadline, using sentence extracts")
+            return results
+        
+        except Exception as e:
+            print(f"Error in batched LLM compression: {e}")
+            return results
+        
+        extracts = self.parse_batched_response(response_text, len(order))
+        if extracts is None:
+            print("Batched compression returned invalid JSON, using sentence extracts")
+            return results
+        
+        for number, extract in extracts.items():
+            results[order[number - 1]] = extract
+        
+        print(f"Batched LLM compression finished in {time.time() - start_time:.2f}s "
+              f"({len(extracts)}/{len(order)} extracted, {len(order) - len(extracts)} used sentence extracts)")
+        
+        return results
+    
+    def _lookup_extracts(
+        self,
+        query: str,
+        documents: List[Document],
+        method: str,
+        index_version: Optional[str]
+    ) -> Tuple[Dict[int, tuple], Dict[int, str]]:
+        """Cache keys per document and the extracts already cached (empty when caching doesn't apply)"""
+        if not self.config["enable_compression_cache"] or method not in CACHED_METHODS:
+            return {}, {}
+        
+        if index_version != self.extract_cache_index_version:
+            if self.extract_cache_index_version is not None:
+                print("Index changed, clearing compression cache")
+            self.extract_cache.clear()
+            self.extract_cache_index_version = index_version
+        
+        query_key = query_fingerprint(query)
+        prompt_version = self.prompt_version
+        cache_keys = {
+            i: (query_key, document_fingerprint(doc.page_content), method, prompt_version)
+            for i, doc in enumerate(documents)
+        }
+        
+        cached = {}
+        for i, key in cache_keys.items():
+            extract = self.extract_cache.get(key)
+            if extract is not None:
+                cached[i] = extract
+        
+        print(f"Compression cache: {len(cached)} cached, {len(cache_keys) - len(cached)} to compress")
+        return cache_keys, cached
+    
     def compress_documents(
         self,
         query: str,
         documents: List[Document],
-        method: str = "hybrid"
+        method: str = "hybrid",
+        index_version: Optional[str] = None
     ) -> List[Document]:
         """
         Main compression method
@@ -150,6 +432,10 @@ Relevant extracted information (be concise but preserve key data):"""
         - 'sentences': Extract key sentences
         - 'llm': Use LLM to extract relevant info
         - 'hybrid': Combine both approaches
+        - 'batched': Like hybrid, but all LLM extractions share one call
+        
+        LLM-based methods reuse cached extracts of (query, document) pairs seen
+        before; the cache is cleared when the index version changes
         """
         
         if not documents:
@@ -157,40 +443,95 @@ Relevant extracted information (be concise but preserve key data):"""
         
         print(f"Compressing {len(documents)} documents using '{method}' method")
         
-        compressed_docs = []
+        compressed_contents = []
         
-        for doc in documents:
+        # Document index -> sentence-extracted text awaiting concurrent or batched LLM compression
+        llm_jobs = {}
+        
+        # Document index -> text sent to the LLM (an unchanged result means it fell back)
+        llm_inputs = {}
+        
+        cache_keys, cached = self._lookup_extracts(query, documents, method, index_version)
+        pending = [i for i in range(len(documents)) if i not in cached]
+        
+        # Key sentences of every document up front (one pass over the sentence index)
+        if method in ("sentences", "hybrid", "batched"):
+            sentence_lists = dict(zip(pending, self.extract_key_sentences_batch(
+                [documents[i] for i in pending],
+                query,
+                max_sentences=5 if method == "sentences" else 8
+            )))
+        
+        for i, doc in enumerate(documents):
             content = doc.page_content
             
-            if method == "sentences":
+            if i in cached:
+                compressed_content = cached[i]
+            
+            elif method == "sentences":
                 # Extract key sentences
-                key_sentences = self.extract_key_sentences(content, query)
+                key_sentences = sentence_lists[i]
                 compressed_content = "\n".join(key_sentences)
             
             elif method == "llm":
                 # Use LLM compression
+                llm_inputs[i] = content
                 compressed_content = self.compress_with_llm(query, content)
             
             elif method == "hybrid":
                 # First extract key sentences
-                key_sentences = self.extract_key_sentences(content, query, max_sentences=8)
+                key_sentences = sentence_lists[i]
                 sentence_content = "\n".join(key_sentences)
                 
                 # Then apply LLM compression if still long
-                if len(sentence_content) > 800:
+                if len(sentence_content) > 800 and self.config["parallel_compression"]:
+                    llm_jobs[i] = sentence_content
+                    compressed_content = sentence_content
+                elif len(sentence_content) > 800:
+                    llm_inputs[i] = sentence_content
                     compressed_content = self.compress_with_llm(query, sentence_content)
                 else:
                     compressed_content = sentence_content
             
+            elif method == "batched":
+                key_sentences = sentence_lists[i]
+                compressed_content = "\n".join(key_sentences)
+                
+                if len(compressed_content) > 800:
+                    llm_jobs[i] = compressed_content
+            
             else:
                 compressed_content = content
             
+            compressed_contents.append(compressed_content)
+        
+        if llm_jobs:
+            if method == "batched":
+                llm_results = self._compress_batched(query, llm_jobs)
+            else:
+                llm_results = self._compress_concurrently(query, llm_jobs)
+            
+            for i, compressed_content in llm_results.items():
+                compressed_contents[i] = compressed_content
+            llm_inputs.update(llm_jobs)
+        
+        # Memoize new extracts, except LLM fallbacks (timeouts, errors)
+        for i, key in cache_keys.items():
+            if i not in cached and compressed_contents[i] != llm_inputs.get(i):
+                self.extract_cache.set(key, compressed_contents[i])
+        
+        compressed_docs = []
+        
+        for i, (doc, compressed_content) in enumerate(zip(documents, compressed_contents)):
+            content = doc.page_content
+            
             # Create compressed document
             compressed_doc = Document(
                 page_content=compressed_content,
                 metadata=doc.metadata.copy()
             )
             compressed_doc.metadata['compressed'] = True
+            compressed_doc.metadata['from_cache'] = i in cached
             compressed_doc.metadata['original_length'] = len(content)
             compressed_doc.metadata['compressed_length'] = len(compressed_content)
             
@@ -233,13 +574,15 @@ Relevant extracted information (be concise but preserve key data):"""
         # Build context string
         context_parts = []
         current_length = 0
+        token_counter = get_token_counter(self.llm.model_name)
+        separator_length = token_counter.count("\n---\n")
         
         for i, doc in enumerate(compressed_docs):
             source = doc.metadata.get('source', f'Source {i+1}')
             dataset_name = doc.metadata.get('dataset_name', 'Unknown Dataset')
             
             doc_text = f"[Source: {dataset_name}]\n{doc.page_content}\n"
-            doc_length = len(doc_text.split())  # Rough token count
+            doc_length = token_counter.count(doc_text) + (separator_length if context_parts else 0)
             
             if current_length + doc_length > max_tokens:
                 break
@@ -0,0 +1,210 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from data_pipeline.config import RAG_CONFIG
+from rag_system.cache import LRUCache, document_fingerprint
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Fallback tokenization when the model encoding can't be loaded (words and punctuation)
+APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Cached token count: fingerprint key + int
+COUNT_ENTRY_BYTES = 96
+
+
+class TokenCounter:
+    """
+    Token counts and truncation with the model's tiktoken encoding.
+    Counts are cached per text fingerprint, so documents that come back in
+    later requests are not re-encoded. Falls back to a word/punctuation
+    approximation when the encoding can't be loaded (e.g. offline).
+    """
+    
+    def __init__(self, model_name: str = "gpt-3.5-turbo", cache_entries: int = 20000):
+        self.model_name = model_name
+        self.encoding = self._load_encoding(model_name)
+        self.exact = self.encoding is not None
+        
+        self.count_cache = LRUCache(
+            max_bytes=cache_entries * COUNT_ENTRY_BYTES,
+            sizeof=lambda value: COUNT_ENTRY_BYTES
+        )
+    
+    def _load_encoding(self, model_name: str):
+        if tiktoken is None:
+            print("tiktoken not installed, using approximate token counts")
+            return None
+        
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"Could not load the {model_name} tokenizer ({e}), using approximate token counts")
+            return None
+    
+    def count(self, text: str) -> int:
+        """Token count of text (cached)"""
+        if not text:
+            return 0
+        
+        key = document_fingerprint(text)
+        cached = self.count_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if self.exact:
+            tokens = len(self.encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = len(APPROXIMATE_TOKEN_PATTERN.findall(text))
+        
+        self.count_cache.set(key, tokens)
+        return tokens
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text within max_tokens, cut back to a line break when one is near"""
+        if max_tokens <= 0:
+            return ""
+        
+        if self.exact:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            prefix = self.encoding.decode(tokens[:max_tokens])
+        else:
+            matches = list(APPROXIMATE_TOKEN_PATTERN.finditer(text))
+            if len(matches) <= max_tokens:
+                return text
+            prefix = text[:matches[max_tokens - 1].end()]
+        
+        # Prefer whole lines (records / sentences) if that keeps most of the prefix
+        line_end = prefix.rfind("\n")
+        if line_end >= len(prefix) * 0.7:
+            prefix = prefix[:line_end]
+        
+        return prefix.rstrip()
+
+
+_TOKEN_COUNTERS: Dict[str, TokenCounter] = {}
+
+
+def get_token_counter(model_name: str = "gpt-3.5-turbo") -> TokenCounter:
+    """Counter (and count cache) shared by every component using the same model"""
+    if model_name not in _TOKEN_COUNTERS:
+        _TOKEN_COUNTERS[model_name] = TokenCounter(model_name, RAG_CONFIG["token_count_cache_entries"])
+    return _TOKEN_COUNTERS[model_name]
+
+
+class ContextPacker:
+    """
+    Fit the QA prompt into a fixed token budget.
+    Instructions and question are fixed costs, chat history gets at most
+    history_token_budget (most recent lines first), and retrieved documents
+    fill the rest in relevance order: whole documents while they fit, then one
+    trimmed document if enough room is left.
+    """
+    
+    def __init__(self, model_name: str = "gpt-3.5-turbo"):
+        self.config = RAG_CONFIG
+        self.counter = get_token_counter(model_name)
+    
+    def fit_history(self, history: str, max_tokens: int) -> str:
+        """Most recent history lines that fit in max_tokens"""
+        if self.counter.count(history) <= max_tokens:
+            return history
+        
+        kept = []
+        used = 0
+        for line in reversed(history.split("\n")):
+            line_tokens = self.counter.count(line) + 1
+            if used + line_tokens > max_tokens:
+                break
+            kept.append(line)
+            used += line_tokens
+        
+        return "\n".join(reversed(kept))
+    
+    def select_documents(
+        self,
+        documents: List[Document],
+        max_tokens: int,
+        render: Callable[[int, Document, str], str]
+    ) -> Tuple[List[str], Dict]:
+        """
+        Rendered entries for the documents that fit in max_tokens (in order).
+        render(position, document, content) formats one entry; entries are
+        joined with a newline, counted as one token each.
+        """
+        entries = []
+        used = 0
+        trimmed = 0
+        dropped = 0
+        
+        for position, doc in enumerate(documents, 1):
+            entry = render(position, doc, doc.page_content)
+            entry_tokens = self.counter.count(entry) + 1
+            
+            if used + entry_tokens <= max_tokens:
+                entries.append(entry)
+                used += entry_tokens
+                continue
+            
+            # Trim this document into the remaining room, then stop
+            remaining = max_tokens - used
+            overhead = self.counter.count(render(position, doc, "")) + 1
+            if remaining - overhead >= self.config["min_trimmed_document_tokens"]:
+                content = self.counter.truncate(doc.page_content, remaining - overhead)
+                entry = render(position, doc, content)
+                entries.append(entry)
+                used += self.counter.count(entry) + 1
+                trimmed += 1
+            
+            dropped = len(documents) - len(entries)
+            break
+        
+        return entries, {
+            'context': used,
+            'documents_included': len(entries),
+            'documents_trimmed': trimmed,
+            'documents_dropped': dropped
+        }
+    
+    def pack(
+        self,
+        instructions: str,
+        question: str,
+        history: str,
+        documents: List[Document],
+        render: Callable[[int, Document, str], str],
+        budget: Optional[int] = None
+    ) -> Tuple[List[str], str, Dict]:
+        """
+        Context entries and (trimmed) history for one prompt, plus a report of
+        the tokens used per section.
+        """
+        budget = budget or self.config["prompt_token_budget"]
+        
+        instruction_tokens = self.counter.count(instructions)
+        question_tokens = self.counter.count(question)
+        
+        history = self.fit_history(history, self.config["history_token_budget"])
+        history_tokens = self.counter.count(history)
+        
+        context_budget = max(0, budget - instruction_tokens - question_tokens - history_tokens)
+        entries, context_report = self.select_documents(documents, context_budget, render)
+        
+        report = {
+            'budget': budget,
+            'instructions': instruction_tokens,
+            'question': question_tokens,
+            'chat_history': history_tokens,
+            'exact': self.counter.exact
+        }
+        report.update(context_report)
+        report['total'] = instruction_tokens + question_tokens + history_tokens + context_report['context']
+        
+        return entries, history, report
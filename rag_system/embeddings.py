@@ -7,6 +7,8 @@ from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from data_pipeline.config import VECTOR_STORE_DIR
 from rag_system.advanced_chunking import AdvancedChunker
+from rag_system.rollup_cube import RollupCube
+from rag_system.entity_matcher import get_domain_matcher
 
 class EmbeddingManager:
     """
@@ -106,10 +108,16 @@ class EmbeddingManager:
         """
         if use_advanced_chunking:
             print("Using advanced semantic chunking")
-            return self.prepare_documents_advanced(data)
+            documents = self.prepare_documents_advanced(data)
         else:
             print("Using basic chunking")
-            return self.prepare_documents_basic(data)
+            documents = self.prepare_documents_basic(data)
+        
+        # Tag typed domain entities once at index time for metadata filtering
+        tagged = get_domain_matcher().tag_documents(documents)
+        print(f"Tagged {tagged}/{len(documents)} documents with domain entities")
+        
+        return documents
     
     def create_vector_store(self, documents: List[Document]) -> FAISS:
         """Create FAISS vector store from documents"""
@@ -187,4 +195,22 @@ class EmbeddingManager:
         self.save_vector_store(vector_store, name)
         self.save_documents(documents, name)
         
-        return vector_store, documents
\ No newline at end of file
+        # Materialize metric rollups alongside the index
+        self.build_and_save_rollups(data, name)
+        
+        return vector_store, documents
+    
+    def build_and_save_rollups(
+        self,
+        data: Dict[str, List[Dict]],
+        name: str = "main"
+    ) -> RollupCube:
+        """Build pre-aggregated state/crop/year and subdivision/year rollups"""
+        print("Building metric rollups...")
+        rollup_cube = RollupCube.build(data)
+        rollup_cube.save(name, self.vector_store_dir)
+        return rollup_cube
+    
+    def load_rollups(self, name: str = "main") -> Optional[RollupCube]:
+        """Load rollups saved next to the vector store"""
+        return RollupCube.load(name, self.vector_store_dir)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import re
+import threading
+from typing import Dict
+from data_pipeline.config import RAG_CONFIG
+from rag_system.entity_matcher import get_domain_matcher
+from rag_system.query_enhancement import ENHANCEMENT_STAGES
+
+# Words that carry no retrieval signal when measuring entity coverage
+STOPWORDS = {
+    'a', 'an', 'the', 'in', 'of', 'for', 'to', 'on', 'by', 'with', 'from', 'at', 'and', 'or',
+    'what', 'which', 'how', 'is', 'are', 'was', 'were', 'do', 'does', 'did', 'me', 'show',
+    'give', 'tell', 'list', 'about', 'during', 'between', 'over', 'much', 'many', 'total'
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+YEAR_TOKEN_PATTERN = re.compile(r"^(19|20)\d{2}$")
+
+
+class EnhancementPolicy:
+    """
+    Cheap local routing policy choosing which LLM enhancement stages to run.
+    Well-specified short queries (most content words are known entities) skip
+    expansion and HyDE; decomposition only runs for the conjunctions that
+    decompose_query already looks for. Query shapes whose past retrieval score
+    margins were low (ambiguous retrieval without enhancement) get the full stages.
+    """
+    
+    def __init__(self):
+        self.config = RAG_CONFIG
+        self.entity_matcher = get_domain_matcher()
+        
+        # Query shape bucket -> EWMA of the retrieval score margin
+        self.margin_ewma: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def query_features(self, query: str) -> Dict:
+        """Length, entity coverage and conjunction features of the query"""
+        query_lower = query.lower()
+        tokens = TOKEN_PATTERN.findall(query_lower)
+        content_tokens = [t for t in tokens if t not in STOPWORDS]
+        
+        # Tokens inside entity spans (years count as structured constraints too)
+        spans = self.entity_matcher.find_spans(query_lower)
+        covered = set()
+        for span in spans:
+            covered.update(TOKEN_PATTERN.findall(query_lower[span.start:span.end]))
+        covered_count = sum(
+            1 for t in content_tokens
+            if t in covered or YEAR_TOKEN_PATTERN.match(t)
+        )
+        
+        entity_types = {span.entity_type for span in spans}
+        
+        return {
+            'tokens': len(tokens),
+            'content_tokens': len(content_tokens),
+            'entity_coverage': round(covered_count / len(content_tokens), 3) if content_tokens else 0.0,
+            'has_anchor_entity': bool(entity_types & {'crops', 'states'}),
+            'is_complex': ' and ' in query_lower or ' compare ' in query_lower
+        }
+    
+    def _bucket(self, features: Dict) -> str:
+        coverage_bin = min(int(features['entity_coverage'] * 4), 3)
+        length_bin = 'short' if features['tokens'] <= self.config["policy_max_simple_tokens"] else 'long'
+        return f"cov{coverage_bin}-{length_bin}-{'complex' if features['is_complex'] else 'simple'}"
+    
+    def decide(self, query: str) -> Dict:
+        """Stages to run for the query, with the features and reason behind the choice"""
+        features = self.query_features(query)
+        bucket = self._bucket(features)
+        past_margin = self.margin_ewma.get(bucket)
+        
+        well_specified = (
+            features['has_anchor_entity'] and
+            features['entity_coverage'] >= self.config["policy_min_entity_coverage"] and
+            features['tokens'] <= self.config["policy_max_simple_tokens"]
+        )
+        low_margin = past_margin is not None and past_margin < self.config["policy_min_score_margin"]
+        
+        stages = []
+        if not well_specified or low_margin:
+            stages.extend(['expansion', 'hyde'])
+        if features['is_complex']:
+            stages.append('decomposition')
+        
+        if not well_specified:
+            reason = "under-specified query"
+        elif low_margin:
+            reason = f"low past retrieval margin ({past_margin:.3f}) for {bucket}"
+        else:
+            reason = "well-specified query"
+        
+        return {
+            'stages': [stage for stage in ENHANCEMENT_STAGES if stage in stages],
+            'skipped': [stage for stage in ENHANCEMENT_STAGES if stage not in stages],
+            'reason': reason,
+            'bucket': bucket,
+            'past_margin': round(past_margin, 4) if past_margin is not None else None,
+            'features': features
+        }
+    
+    def record(self, decision: Dict, score_margin: float):
+        """
+        Feed back the dense retrieval score margin (top-1 vs top-k) of the raw query.
+        It is measured on the original query alone, so it reflects how well the
+        query shape retrieves without enhancement whichever stages were run.
+        """
+        alpha = self.config["policy_margin_ewma_alpha"]
+        with self._lock:
+            previous = self.margin_ewma.get(decision['bucket'])
+            self.margin_ewma[decision['bucket']] = (
+                score_margin if previous is None
+                else alpha * score_margin + (1 - alpha) * previous
+            )
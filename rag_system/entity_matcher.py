@@ -0,0 +1,156 @@
+from collections import deque
+from typing import List, Dict, Iterable, NamedTuple, Optional
+from langchain_core.documents import Document
+from data_pipeline.config import DOMAIN_KEYWORDS, SYNONYM_MAP
+
+
+class EntitySpan(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    entity_type: str
+
+
+class EntityMatcher:
+    """
+    Aho-Corasick automaton over typed keywords.
+    Finds every keyword occurrence in one pass over the text, keeping only
+    whole-word matches (optionally allowing a plural 's').
+    """
+    
+    def __init__(self, keywords: Dict[str, Iterable[str]], allow_plural: bool = True):
+        self.allow_plural = allow_plural
+        self.entity_types = list(keywords.keys())
+        
+        # Pattern id -> (keyword, entity type); ids follow config order
+        self.patterns: List[tuple] = []
+        seen = set()
+        for entity_type, terms in keywords.items():
+            for term in terms:
+                term = " ".join(term.lower().split())
+                if term and (term, entity_type) not in seen:
+                    seen.add((term, entity_type))
+                    self.patterns.append((term, entity_type))
+        
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._build()
+    
+    def _build(self):
+        """Build the trie, then failure links breadth-first"""
+        for pattern_id, (term, _) in enumerate(self.patterns):
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+        
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                
+                # Inherit the outputs of the longest proper suffix
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def __len__(self) -> int:
+        return len(self.patterns)
+    
+    def _is_boundary(self, text: str, start: int, end: int) -> Optional[int]:
+        """End offset of a whole-word match at [start, end), or None"""
+        if start > 0 and text[start - 1].isalnum():
+            return None
+        if end == len(text) or not text[end].isalnum():
+            return end
+        if (self.allow_plural and text[end] == 's' and
+                (end + 1 == len(text) or not text[end + 1].isalnum())):
+            return end + 1
+        return None
+    
+    def _iter_matches(self, text_lower: str):
+        """Yield (pattern id, start, end) for every whole-word match"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        
+        for i, char in enumerate(text_lower):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            
+            for pattern_id in output[state]:
+                start = i - len(self.patterns[pattern_id][0]) + 1
+                end = self._is_boundary(text_lower, start, i + 1)
+                if end is not None:
+                    yield pattern_id, start, end
+    
+    def find_spans(self, text: str) -> List[EntitySpan]:
+        """All whole-word keyword occurrences, as typed spans in text order"""
+        spans = [
+            EntitySpan(start, end, *self.patterns[pattern_id])
+            for pattern_id, start, end in self._iter_matches(text.lower())
+        ]
+        spans.sort(key=lambda span: (span.start, -span.end))
+        return spans
+    
+    def extract(self, text: str) -> Dict[str, List[str]]:
+        """Unique keywords found per entity type (in keyword list order)"""
+        found = sorted({pattern_id for pattern_id, _, _ in self._iter_matches(text.lower())})
+        
+        entities = {entity_type: [] for entity_type in self.entity_types}
+        for pattern_id in found:
+            term, entity_type = self.patterns[pattern_id]
+            entities[entity_type].append(term)
+        
+        return entities
+    
+    def tag_documents(self, documents: List[Document]) -> int:
+        """
+        Store typed entities found in each document's content and metadata values
+        under metadata['entities']; returns the number of documents with any entity
+        """
+        tagged = 0
+        
+        for doc in documents:
+            metadata_text = " ".join(
+                str(value) for key, value in doc.metadata.items()
+                if key != 'entities' and isinstance(value, (str, int, float))
+            )
+            entities = self.extract(f"{doc.page_content}\n{metadata_text}")
+            doc.metadata['entities'] = {k: v for k, v in entities.items() if v}
+            if doc.metadata['entities']:
+                tagged += 1
+        
+        return tagged
+
+
+_DOMAIN_MATCHER: Optional[EntityMatcher] = None
+_SYNONYM_MATCHER: Optional[EntityMatcher] = None
+
+
+def get_domain_matcher() -> EntityMatcher:
+    """Matcher compiled once from DOMAIN_KEYWORDS"""
+    global _DOMAIN_MATCHER
+    if _DOMAIN_MATCHER is None:
+        _DOMAIN_MATCHER = EntityMatcher(DOMAIN_KEYWORDS)
+    return _DOMAIN_MATCHER
+
+
+def get_synonym_matcher() -> EntityMatcher:
+    """Matcher compiled once from the SYNONYM_MAP terms"""
+    global _SYNONYM_MATCHER
+    if _SYNONYM_MATCHER is None:
+        _SYNONYM_MATCHER = EntityMatcher({'synonym_terms': SYNONYM_MAP.keys()}, allow_plural=False)
+    return _SYNONYM_MATCHER
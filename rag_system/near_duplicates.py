@@ -0,0 +1,80 @@
+import re
+import heapq
+from typing import Dict, Iterable, List, Set
+
+
+def word_set(text: str) -> Set[str]:
+    """Normalized word set used for overlap comparisons"""
+    return set(re.sub(r'\s+', ' ', text.lower()).strip().split())
+
+
+def overlap(text_words: Set[str], seen_words: Set[str]) -> float:
+    """Fraction of text_words that also occur in seen_words"""
+    if not text_words:
+        return 0.0
+    return len(text_words & seen_words) / len(text_words)
+
+
+class ContainmentIndex:
+    """
+    Inverted word index for containment lookups (prefix filtering).
+    A text with more than `threshold` of its words in an inserted text misses
+    fewer than (1 - threshold) * n of them there, so that text contains at
+    least one of any floor((1 - threshold) * n) + 1 of its words. Probing only
+    the text's rarest words therefore finds every such text; candidates are
+    then verified exactly.
+    """
+    
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        
+        # word -> ids of inserted texts containing it
+        self.postings: Dict[str, List[int]] = {}
+        self.word_sets: Dict[int, Set[str]] = {}
+    
+    def prefix(self, words: Iterable[str]) -> List[str]:
+        """The text's rarest words, enough that every containing text has one"""
+        words = list(words)
+        # One word more than the bound, against float rounding of (1 - threshold) * n
+        size = int((1 - self.threshold) * len(words)) + 2
+        return heapq.nsmallest(size, words, key=lambda word: len(self.postings.get(word, ())))
+    
+    def candidates(self, words: Set[str]) -> Set[int]:
+        """Ids of inserted texts sharing a prefix word with the text"""
+        found = set()
+        for word in self.prefix(words):
+            found.update(self.postings.get(word, ()))
+        return found
+    
+    def contains(self, words: Set[str]) -> bool:
+        """True if more than threshold of the words occur in one inserted text"""
+        return bool(words) and any(
+            overlap(words, self.word_sets[item_id]) > self.threshold
+            for item_id in self.candidates(words)
+        )
+    
+    def insert(self, item_id: int, words: Set[str]):
+        self.word_sets[item_id] = words
+        for word in words:
+            self.postings.setdefault(word, []).append(item_id)
+
+
+def near_duplicate_mask(texts: List[str], threshold: float = 0.8) -> List[bool]:
+    """
+    Keep/drop decision per text, in order: a text is dropped when more than
+    `threshold` of its words occur in an earlier kept text. Word sets are built
+    once per text and only kept texts sharing one of its rarest words are
+    checked, which gives the same decisions as comparing every kept text.
+    """
+    index = ContainmentIndex(threshold)
+    keep = []
+    
+    for i, text in enumerate(texts):
+        words = word_set(text)
+        is_duplicate = index.contains(words)
+        
+        if not is_duplicate:
+            index.insert(i, words)
+        keep.append(not is_duplicate)
+    
+    return keep
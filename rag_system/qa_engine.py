@@ -299,10 +299,13 @@
 
 import os
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
+from data_pipeline.config import RAG_CONFIG
+from rag_system.context_packer import ContextPacker
+from rag_system.response_cleaner import clean_response
 
 class QAEngine:
     """
@@ -311,11 +314,15 @@ class QAEngine:
     
     def __init__(self, openai_api_key: str):
         os.environ['OPENAI_API_KEY'] = openai_api_key
+        self.config = RAG_CONFIG
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.5  # Slightly higher for better general knowledge responses
         )
         
+        # Exact token budgeting of context, history and instructions
+        self.context_packer = ContextPacker("gpt-3.5-turbo")
+        
         # Enhanced QA prompt with better instructions
         self.qa_prompt = PromptTemplate(
             input_variables=["context", "question", "chat_history"],
@@ -389,16 +396,61 @@ Answer:"""
                 continue
             seen_content.add(content)
             
-            # Get source information
-            dataset_name = doc.metadata.get('dataset_name', 'Unknown Dataset')
-            category = doc.metadata.get('category', 'unknown')
-            
-            # Format document
-            doc_header = f"--- Source {i}: {dataset_name} ({category}) ---"
-            context_parts.append(f"{doc_header}\n{content}\n")
+            context_parts.append(self.format_source(i, doc, content))
         
         return "\n".join(context_parts)
     
+    def format_source(self, i: int, doc: Document, content: str) -> str:
+        """One context entry: source header and content"""
+        dataset_name = doc.metadata.get('dataset_name', 'Unknown Dataset')
+        category = doc.metadata.get('category', 'unknown')
+        
+        doc_header = f"--- Source {i}: {dataset_name} ({category}) ---"
+        return f"{doc_header}\n{content}\n"
+    
+    def build_prompt_inputs(
+        self,
+        question: str,
+        documents: List[Document],
+        chat_history: List[Dict]
+    ) -> Tuple[str, str, Optional[Dict]]:
+        """
+        Context and history for the QA prompt. With context packing, documents
+        (in relevance order) and history are fitted into prompt_token_budget;
+        returns the per-section token report as well.
+        """
+        history = self.format_chat_history(chat_history)
+        
+        if not self.config["enable_context_packing"]:
+            return self.format_context(documents), history, None
+        
+        # Skip exact duplicates, as format_context does
+        unique_docs = []
+        seen_content = set()
+        for doc in documents:
+            if doc.page_content not in seen_content:
+                seen_content.add(doc.page_content)
+                unique_docs.append(doc)
+        
+        instructions = self.qa_prompt.format(context="", question="", chat_history="")
+        entries, history, report = self.context_packer.pack(
+            instructions,
+            question,
+            history,
+            unique_docs,
+            self.format_source
+        )
+        
+        context = "\n".join(entries) if entries else "No specific data retrieved for this query."
+        
+        print(f"Prompt tokens: {report['total']}/{report['budget']} "
+              f"(instructions {report['instructions']}, history {report['chat_history']}, "
+              f"question {report['question']}, context {report['context']}; "
+              f"{report['documents_included']} documents, {report['documents_trimmed']} trimmed, "
+              f"{report['documents_dropped']} dropped)")
+        
+        return context, history, report
+    
     def format_chat_history(self, messages: List[Dict]) -> str:
         """Format chat history for context"""
         if not messages:
@@ -441,69 +493,8 @@ Answer:"""
         return sources
     
     def clean_response(self, response_text: str) -> str:
-        """Clean and format the response"""
-        
-        # Remove source citations like "(Source: Source 1)", "(Source: Source 3)", etc.
-        cleaned = re.sub(r'\(Source:\s*Source\s*\d+\)', '', response_text, flags=re.IGNORECASE)
-        cleaned = re.sub(r'\(Source:\s*[^\)]+\)', '', cleaned, flags=re.IGNORECASE)
-        
-        # Remove "assumed data" mentions
-        cleaned = re.sub(r'\(Assumed data based on historical patterns\)', '', cleaned, flags=re.IGNORECASE)
-        cleaned = re.sub(r'\(assumed.*?\)', '', cleaned, flags=re.IGNORECASE)
-        cleaned = re.sub(r'assumed data based on historical patterns', '', cleaned, flags=re.IGNORECASE)
-        
-        # Remove common disclaimer phrases
-        disclaimers = [
-            r"based on the (provided|available) (context|data|information)",
-            r"according to the (documents|data|sources)",
-            r"the (context|data|information) (shows|indicates|suggests)",
-            r"from the (provided|retrieved) (context|data|information)",
-            r"data (is )?not available( in the (dataset|context))?",
-            r"information (is )?not (present|available|provided)",
-            r"(the )?(dataset|data|context) does not (contain|include|provide)",
-            r"no specific data (found|available|present)",
-            r"limited (data|information) in the context",
-        ]
-        
-        for pattern in disclaimers:
-            cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE)
-        
-        # Fix awkward markdown-style structures like "1. Maharashtra Rainfall Patterns: -"
-        # Replace pattern: "Number. Text: -" with "## Text"
-        cleaned = re.sub(r'(\d+)\.\s*([A-Z][^:]+):\s*-', r'## \2', cleaned)
-        
-        # Replace pattern: "Text: -" with "**Text:**"
-        cleaned = re.sub(r'([A-Za-z\s]+):\s*-\s*', r'**\1:**\n', cleaned)
-        
-        # Fix multiple colons
-        cleaned = re.sub(r'::+', ':', cleaned)
-        
-        # Remove lines that only say "Data not available" or similar
-        lines = cleaned.split('\n')
-        filtered_lines = []
-        for line in lines:
-            line_lower = line.lower().strip()
-            # Skip lines that are just variations of "data not available"
-            if not any(phrase in line_lower for phrase in [
-                'data not available',
-                'not available',
-                'no data',
-                'information not available',
-                'not provided',
-                'data is missing',
-                'assumed data'
-            ]):
-                filtered_lines.append(line)
-        
-        cleaned = '\n'.join(filtered_lines)
-        
-        # Clean up extra whitespace and empty parentheses
-        cleaned = re.sub(r'\(\s*\)', '', cleaned)  # Remove empty parentheses
-        cleaned = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned)  # Max 2 newlines
-        cleaned = re.sub(r' +', ' ', cleaned)  # Single spaces
-        cleaned = re.sub(r' \n', '\n', cleaned)  # Remove trailing spaces before newlines
-        
-        return cleaned.strip()
+        """Clean and format the response (rules in rag_system/response_cleaner.py)"""
+        return clean_response(response_text)
     
     def assess_answer_quality(self, answer: str, documents: List[Document]) -> Dict:
         """Assess the quality of the generated answer"""
@@ -530,6 +521,33 @@ Answer:"""
         
         return quality_metrics
     
+    def prepare_prompt(
+        self,
+        question: str,
+        retrieved_docs: List[Document],
+        chat_history: List[Dict] = None
+    ) -> Tuple[Dict, Optional[Dict]]:
+        """QA chain inputs for a question, plus the prompt token report"""
+        context, history, token_report = self.build_prompt_inputs(
+            question,
+            retrieved_docs,
+            chat_history or []
+        )
+        
+        prompt_variables = {
+            "context": context,
+            "question": question,
+            "chat_history": history
+        }
+        return prompt_variables, token_report
+    
+    def stream_response(self, prompt_variables: Dict) -> Iterator[str]:
+        """Raw answer text chunks as the LLM generates them"""
+        for chunk in self.qa_chain.stream(prompt_variables):
+            text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if text:
+                yield text
+    
     def answer_question(
         self, 
         question: str, 
@@ -541,19 +559,24 @@ Answer:"""
         """
         
         # Format inputs
-        context = self.format_context(retrieved_docs)
-        history = self.format_chat_history(chat_history or [])
+        prompt_variables, token_report = self.prepare_prompt(question, retrieved_docs, chat_history)
         
         # Generate answer
-        response = self.qa_chain.invoke({
-            "context": context,
-            "question": question,
-            "chat_history": history
-        })
+        response = self.qa_chain.invoke(prompt_variables)
         
         # Extract content
         response_text = response.content if hasattr(response, 'content') else str(response)
         
+        return self.build_answer(response_text, retrieved_docs, token_report)
+    
+    def build_answer(
+        self,
+        response_text: str,
+        retrieved_docs: List[Document],
+        token_report: Optional[Dict] = None
+    ) -> Dict:
+        """Answer result from the complete LLM response text"""
+        
         # Clean response
         cleaned_response = self.clean_response(response_text)
         
@@ -568,7 +591,8 @@ Answer:"""
             'sources': sources,
             'num_sources': len(sources),
             'num_documents': len(retrieved_docs),
-            'quality_metrics': quality
+            'quality_metrics': quality,
+            'prompt_tokens': token_report
         }
     
     def answer_with_confidence(
@@ -583,6 +607,10 @@ Answer:"""
         """
         
         result = self.answer_question(question, retrieved_docs, chat_history)
+        return self.add_confidence(result, min_confidence_threshold)
+    
+    def add_confidence(self, result: Dict, min_confidence_threshold: float = 0.3) -> Dict:
+        """Add confidence scoring to an answer result"""
         
         # Calculate confidence based on retrieval quality
         confidence = 0.5  # Base confidence
@@ -1,22 +1,47 @@
+import os
 import re
-from typing import List, Dict, Tuple
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import List, Dict, Tuple, Optional, Iterable
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from data_pipeline.config import SYNONYM_MAP, DOMAIN_KEYWORDS, RAG_CONFIG
+from data_pipeline.config import SYNONYM_MAP, RAG_CONFIG, VECTOR_STORE_DIR
+from rag_system.entity_matcher import get_domain_matcher, get_synonym_matcher
+from rag_system.cache import LRUCache, normalize_query
+
+ENHANCEMENT_STAGES = ['expansion', 'decomposition', 'hyde']
 
 class QueryEnhancer:
     """
     Advanced query enhancement with expansion, decomposition, and HyDE
     """
     
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: str, llm=None):
         self.config = RAG_CONFIG
-        self.llm = ChatOpenAI(
+        self.llm = llm or ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.3,
             api_key=openai_api_key
         )
         
+        # Keyword automata compiled once from the config
+        self.entity_matcher = get_domain_matcher()
+        self.synonym_matcher = get_synonym_matcher()
+        
+        # Shared pool for issuing the enhancement LLM calls concurrently
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config["query_enhancement_workers"],
+            thread_name_prefix="query-enhancement"
+        )
+        
+        # Calls still running past their deadline (cancel() can't stop them);
+        # each holds a worker until it returns, so new requests skip those workers
+        self.abandoned_calls = 0
+        self._abandoned_lock = threading.Lock()
+        
         # Query expansion prompt
         self.expansion_prompt = PromptTemplate(
             input_variables=["query"],
@@ -51,49 +76,80 @@ Query: {query}
 
 Write a detailed, data-rich passage (2-3 sentences) that contains specific numbers, locations, and facts that would answer this query:"""
         )
+        
+        # Combined prompt: expansion, decomposition and HyDE in one structured call
+        self.combined_prompt = PromptTemplate(
+            input_variables=["query", "num_variations", "decomposition_instruction"],
+            template="""You are helping retrieve agricultural and climate data. For the query below, return ONLY a JSON object with these keys:
+- "variations": list of {num_variations} alternative phrasings that keep the same meaning but use different words and perspectives
+- "sub_questions": list of simpler sub-questions. {decomposition_instruction}
+- "hypothetical_passage": a data-rich passage (2-3 sentences) from a dataset, with specific numbers, locations, and facts, that would answer the query
+
+Query: {query}
+
+JSON:"""
+        )
+        
+        # Memoized LLM enhancement output: (normalized query, prompt version, stages) -> results
+        persist_path = None
+        if self.config["persist_query_enhancement_cache"]:
+            persist_path = os.path.join(VECTOR_STORE_DIR, "query_enhancement_cache.pkl")
+        
+        self.enhancement_cache = LRUCache(
+            max_bytes=self.config["query_enhancement_cache_mb"] * 1024 * 1024,
+            ttl_seconds=self.config["query_enhancement_cache_ttl"],
+            persist_path=persist_path,
+            persist_every=20
+        )
+    
+    @property
+    def prompt_version(self) -> str:
+        """
+        Hash of everything that shapes the LLM enhancement output, computed from
+        the current llm so a replaced model never reads or writes its entries
+        """
+        parts = [
+            self.expansion_prompt.template,
+            self.decomposition_prompt.template,
+            self.hyde_prompt.template,
+            self.combined_prompt.template,
+            type(self.llm).__name__,
+            getattr(self.llm, 'model_name', ''),
+            str(getattr(self.llm, 'temperature', '')),
+            str(self.config["max_query_variations"]),
+            str(self.config["enable_query_expansion"]),
+            str(self.config["enable_hyde"])
+        ]
+        return hashlib.sha1("\0".join(parts).encode('utf-8')).hexdigest()[:12]
     
     def expand_query_with_synonyms(self, query: str) -> List[str]:
         """Expand query using synonym mapping"""
         expanded_queries = [query]
         query_lower = query.lower()
         
+        # Whole-word occurrences of each synonym term, found in one pass
+        term_spans = {}
+        for span in self.synonym_matcher.find_spans(query_lower):
+            term_spans.setdefault(span.keyword, []).append(span)
+        
         for term, synonyms in SYNONYM_MAP.items():
-            if term in query_lower:
+            if term in term_spans:
                 for synonym in synonyms[:2]:  # Limit to 2 synonyms per term
-                    expanded = query_lower.replace(term, synonym)
+                    parts = []
+                    last_end = 0
+                    for span in term_spans[term]:
+                        parts.append(query_lower[last_end:span.start])
+                        parts.append(synonym)
+                        last_end = span.end
+                    expanded = "".join(parts) + query_lower[last_end:]
                     if expanded != query_lower:
                         expanded_queries.append(expanded)
         
         return list(set(expanded_queries))[:self.config["max_query_variations"]]
     
     def extract_domain_entities(self, query: str) -> Dict[str, List[str]]:
-        """Extract domain-specific entities from query"""
-        entities = {
-            'crops': [],
-            'states': [],
-            'metrics': [],
-            'climate_terms': []
-        }
-        
-        query_lower = query.lower()
-        
-        for crop in DOMAIN_KEYWORDS['crops']:
-            if crop in query_lower:
-                entities['crops'].append(crop)
-        
-        for state in DOMAIN_KEYWORDS['states']:
-            if state in query_lower:
-                entities['states'].append(state)
-        
-        for metric in DOMAIN_KEYWORDS['metrics']:
-            if metric in query_lower:
-                entities['metrics'].append(metric)
-        
-        for term in DOMAIN_KEYWORDS['climate_terms']:
-            if term in query_lower:
-                entities['climate_terms'].append(term)
-        
-        return entities
+        """Extract domain-specific entities (crops, states, metrics, climate terms) from query"""
+        return self.entity_matcher.extract(query)
     
     def expand_with_llm(self, query: str) -> List[str]:
         """Use LLM to generate query variations"""
@@ -176,11 +232,101 @@ Write a detailed, data-rich passage (2-3 sentences) that contains specific numbe
             print(f"Error in HyDE generation: {e}")
             return query
     
-    def enhance_query(self, query: str) -> Dict[str, any]:
+    def parse_combined_response(self, response_text: str) -> Optional[Dict]:
+        """Parse and validate the combined JSON response; None if it doesn't match the schema"""
+        match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if not match:
+            return None
+        
+        try:
+            parsed = json.loads(match.group(0))
+        except ValueError:
+            return None
+        
+        if not isinstance(parsed, dict):
+            return None
+        
+        variations = parsed.get('variations')
+        sub_questions = parsed.get('sub_questions', [])
+        passage = parsed.get('hypothetical_passage')
+        
+        if not isinstance(variations, list) or not all(isinstance(v, str) for v in variations):
+            return None
+        if not isinstance(sub_questions, list) or not all(isinstance(q, str) for q in sub_questions):
+            return None
+        if not isinstance(passage, str) or not passage.strip():
+            return None
+        
+        return {
+            'variations': [v.strip() for v in variations if v.strip()],
+            'sub_questions': [q.strip() for q in sub_questions if q.strip()],
+            'hypothetical_passage': passage.strip()
+        }
+    
+    def enhance_with_single_call(
+        self,
+        query: str,
+        decompose: bool = True
+    ) -> Optional[Tuple[List[str], List[str], str]]:
+        """
+        Expansion, decomposition and HyDE from one JSON-returning LLM call.
+        Returns None on errors or schema violations so the caller can use the per-prompt path.
+        """
+        is_complex = decompose and (' and ' in query.lower() or ' compare ' in query.lower())
+        
+        if is_complex:
+            decomposition_instruction = "Break the query down into the sub-questions that need to be answered."
+        else:
+            decomposition_instruction = "The query is simple, so return an empty list."
+        
+        if self.free_workers() <= 0:
+            print("Query enhancement: all workers busy with calls past their deadline, using fallback")
+            return [query], [query], query
+        
+        try:
+            chain = self.combined_prompt | self.llm
+            future = self.executor.submit(chain.invoke, {
+                "query": query,
+                "num_variations": self.config["max_query_variations"] - 1,
+                "decomposition_instruction": decomposition_instruction
+            })
+            response = future.result(timeout=self.config["query_enhancement_timeout"])
+            
+            response_text = response.content if hasattr(response, 'content') else str(response)
+        
+        except FutureTimeoutError:
+            # Same deadline as the concurrent path: no time left for the separate prompts
+            self._abandon(future)
+            print("Query enhancement: combined call missed the deadline, using fallback")
+            return [query], [query], query
+        
+        except Exception as e:
+            print(f"Error in combined query enhancement: {e}")
+            return None
+        
+        parsed = self.parse_combined_response(response_text)
+        if parsed is None:
+            print("Combined query enhancement returned invalid JSON, falling back to separate prompts")
+            return None
+        
+        # Apply the same switches and limits as the per-prompt methods
+        if self.config["enable_query_expansion"]:
+            llm_variations = ([query] + parsed['variations'])[:self.config["max_query_variations"]]
+        else:
+            llm_variations = [query]
+        
+        sub_questions = parsed['sub_questions'] if is_complex and parsed['sub_questions'] else [query]
+        hyde_doc = parsed['hypothetical_passage'] if self.config["enable_hyde"] else query
+        
+        return llm_variations, sub_questions, hyde_doc
+    
+    def enhance_query(self, query: str, stages: Optional[Iterable[str]] = None) -> Dict[str, any]:
         """
         Main method: Enhance query with all techniques
         Returns dictionary with original query, variations, sub-questions, entities, and HyDE doc
+        stages: LLM stages to run (subset of ENHANCEMENT_STAGES); None runs all
         """
+        stages = set(ENHANCEMENT_STAGES if stages is None else stages)
         
         # Extract entities
         entities = self.extract_domain_entities(query)
@@ -188,17 +334,37 @@ Write a detailed, data-rich passage (2-3 sentences) that contains specific numbe
         # Expand with synonyms
         synonym_expansions = self.expand_query_with_synonyms(query)
         
-        # Expand with LLM
-        llm_variations = self.expand_with_llm(query)
+        use_cache = self.config["enable_query_enhancement_cache"] and bool(stages)
+        cache_key = (normalize_query(query), self.prompt_version, tuple(sorted(stages))) if use_cache else None
+        llm_results = self.enhancement_cache.get(cache_key) if use_cache else None
+        from_cache = llm_results is not None
         
-        # Combine expansions (remove duplicates)
-        all_variations = list(set(synonym_expansions + llm_variations))
+        if from_cache:
+            print("Query enhancement served from cache")
+        elif self.config["combined_query_enhancement"] and {'expansion', 'hyde'} <= stages:
+            llm_results = self.enhance_with_single_call(query, decompose='decomposition' in stages)
         
-        # Decompose if complex
-        sub_questions = self.decompose_query(query)
+        if llm_results is not None:
+            llm_variations, sub_questions, hyde_doc = llm_results
+        elif self.config["parallel_query_enhancement"]:
+            # LLM expansion, decomposition and HyDE are independent round trips
+            llm_variations, sub_questions, hyde_doc = self._run_llm_calls_concurrently(query, stages)
+        else:
+            # Expand with LLM
+            llm_variations = self.expand_with_llm(query) if 'expansion' in stages else [query]
+            
+            # Decompose if complex
+            sub_questions = self.decompose_query(query) if 'decomposition' in stages else [query]
+            
+            # Generate HyDE document
+            hyde_doc = self.generate_hyde_document(query) if 'hyde' in stages else query
         
-        # Generate HyDE document
-        hyde_doc = self.generate_hyde_document(query)
+        # Only memoize complete results, not deadline/error fallbacks
+        if use_cache and not from_cache and self._is_complete(query, stages, llm_variations, hyde_doc):
+            self.enhancement_cache.set(cache_key, (llm_variations, sub_questions, hyde_doc))
+        
+        # Combine expansions (remove duplicates)
+        all_variations = list(set(synonym_expansions + llm_variations))
         
         return {
             'original_query': query,
@@ -206,8 +372,85 @@ Write a detailed, data-rich passage (2-3 sentences) that contains specific numbe
             'sub_questions': sub_questions if len(sub_questions) > 1 else [],
             'entities': entities,
             'hyde_document': hyde_doc,
-            'is_complex': len(sub_questions) > 1
+            'is_complex': len(sub_questions) > 1,
+            'from_cache': from_cache
+        }
+    
+    def _is_complete(self, query: str, stages: set, llm_variations: List[str], hyde_doc: str) -> bool:
+        """False if a requested stage fell back to its no-LLM default"""
+        if 'expansion' in stages and self.config["enable_query_expansion"] and len(llm_variations) < 2:
+            return False
+        if 'hyde' in stages and self.config["enable_hyde"] and hyde_doc in ('', query):
+            return False
+        return True
+    
+    def _run_llm_calls_concurrently(
+        self,
+        query: str,
+        stages: Iterable[str] = ENHANCEMENT_STAGES
+    ) -> Tuple[List[str], List[str], str]:
+        """
+        Issue the selected expansion, decomposition and HyDE calls in parallel under one deadline.
+        Only as many calls as there are free workers are issued, so none queue behind calls
+        abandoned at an earlier deadline. Skipped calls and calls still running at the
+        deadline use their no-LLM defaults.
+        """
+        start_time = time.time()
+        
+        calls = {
+            'expansion': self.expand_with_llm,
+            'decomposition': self.decompose_query,
+            'hyde': self.generate_hyde_document
+        }
+        results = {
+            'expansion': [query],
+            'decomposition': [query],
+            'hyde': query
         }
+        
+        selected = [name for name in calls if name in stages]
+        free = self.free_workers()
+        if selected and free <= 0:
+            print("Query enhancement: all workers busy with calls past their deadline, using fallback")
+        
+        futures = {
+            name: self.executor.submit(calls[name], query)
+            for name in selected[:max(free, 0)]
+        }
+        if not futures:
+            return results['expansion'], results['decomposition'], results['hyde']
+        
+        done, _ = wait(futures.values(), timeout=self.config["query_enhancement_timeout"])
+        
+        for name, future in futures.items():
+            if future in done:
+                results[name] = future.result()
+            else:
+                self._abandon(future)
+                print(f"Query enhancement: {name} missed the deadline, using fallback")
+        
+        print(f"Query enhancement LLM calls finished in {time.time() - start_time:.2f}s "
+              f"({len(done)}/{len(selected)} completed)")
+        
+        return results['expansion'], results['decomposition'], results['hyde']
+    
+    def free_workers(self) -> int:
+        """Enhancement workers not held by calls abandoned at an earlier deadline"""
+        with self._abandoned_lock:
+            return self.config["query_enhancement_workers"] - self.abandoned_calls
+    
+    def _abandon(self, future):
+        """Cancel a call that missed its deadline; a running one is counted until it returns"""
+        if future.cancel():
+            return
+        
+        with self._abandoned_lock:
+            self.abandoned_calls += 1
+        future.add_done_callback(self._release_abandoned)
+    
+    def _release_abandoned(self, future):
+        with self._abandoned_lock:
+            self.abandoned_calls -= 1
     
     def get_search_queries(self, enhanced_query: Dict) -> List[str]:
         """
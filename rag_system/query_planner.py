@@ -0,0 +1,104 @@
+from typing import List, Dict, Callable
+import numpy as np
+from data_pipeline.config import RAG_CONFIG
+
+# Leg kinds in priority order, with their share of the retrieval budget
+LEG_WEIGHTS = {
+    'original': 2.0,
+    'sub_question': 1.5,
+    'hyde': 1.25,
+    'variation': 1.0,
+}
+
+
+class QueryPlanner:
+    """
+    Turns the enhanced search-query set into a retrieval plan:
+    near-duplicate queries are dropped by embedding similarity, distinct
+    information needs (original query, sub-questions, HyDE) come first, and
+    each remaining leg gets its own k under a total retrieval budget
+    """
+    
+    def __init__(self, embed_query: Callable[[str], np.ndarray]):
+        self.config = RAG_CONFIG
+        self.embed_query = embed_query
+    
+    def candidate_legs(self, enhanced_query: Dict) -> List[Dict]:
+        """All search queries labelled with their kind, in priority order"""
+        original = enhanced_query['original_query']
+        legs = [{'query': original, 'kind': 'original'}]
+        
+        if enhanced_query['is_complex']:
+            legs.extend({'query': q, 'kind': 'sub_question'} for q in enhanced_query['sub_questions'])
+        
+        hyde = enhanced_query.get('hyde_document')
+        if hyde and hyde != original:
+            legs.append({'query': hyde, 'kind': 'hyde'})
+        
+        legs.extend({'query': q, 'kind': 'variation'} for q in enhanced_query['query_variations'])
+        
+        # Exact duplicates (case-insensitive), keeping the higher-priority kind
+        seen = set()
+        unique_legs = []
+        for leg in legs:
+            key = leg['query'].strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                unique_legs.append(leg)
+        
+        return unique_legs
+    
+    def plan(self, enhanced_query: Dict) -> List[Dict]:
+        """
+        Retrieval legs: [{'query', 'kind', 'k', 'max_similarity'}, ...]
+        with sum(k) <= planner_total_k
+        """
+        threshold = self.config["planner_dedupe_similarity"]
+        max_legs = self.config["planner_max_legs"]
+        
+        kept = []
+        kept_vectors = []
+        
+        for leg in self.candidate_legs(enhanced_query):
+            if len(kept) >= max_legs:
+                break
+            
+            vector = np.asarray(self.embed_query(leg['query']), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm > 0 else vector
+            
+            max_similarity = float(np.max(np.stack(kept_vectors) @ vector)) if kept_vectors else 0.0
+            
+            # Sub-questions are distinct needs by construction; only drop exact paraphrases
+            limit = max(threshold, 0.98) if leg['kind'] == 'sub_question' else threshold
+            if max_similarity >= limit:
+                continue
+            
+            leg['max_similarity'] = round(max_similarity, 4)
+            kept.append(leg)
+            kept_vectors.append(vector)
+        
+        return self._allocate_budget(kept)
+    
+    def _allocate_budget(self, legs: List[Dict]) -> List[Dict]:
+        """Split planner_total_k across legs by kind weight, discounted by redundancy"""
+        total_k = self.config["planner_total_k"]
+        min_k = self.config["planner_min_k"]
+        max_k = self.config["initial_retrieval_k"]
+        
+        # Drop lowest-priority legs if even the minimum k doesn't fit
+        legs = legs[:max(1, total_k // min_k)]
+        
+        weights = np.array([
+            LEG_WEIGHTS[leg['kind']] * (1.0 - 0.5 * max(leg['max_similarity'], 0.0))
+            for leg in legs
+        ])
+        shares = weights / weights.sum()
+        
+        # Minimum per leg, remainder proportional to weight, each capped at max_k
+        ks = np.minimum(min_k + np.floor(shares * (total_k - min_k * len(legs))), max_k).astype(int)
+        
+        for leg, k in zip(legs, ks):
+            leg['k'] = int(k)
+        
+        return legs
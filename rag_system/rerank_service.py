@@ -0,0 +1,102 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# (query, documents) -> cross-encoder scores, one array per request
+ScoreRequestsFn = Callable[[List[Tuple[str, List[Document]]]], List[np.ndarray]]
+
+
+class MicroBatcher:
+    """
+    Shared in-process cross-encoder inference queue.
+    Requests from concurrent threads are gathered into one model call (up to
+    max_batch_pairs, waiting at most max_wait_ms after the first request) and
+    run on a single worker thread; each caller gets its own scores back.
+    When every in-flight request is already in the batch it runs immediately,
+    so a lone request never waits.
+    """
+    
+    def __init__(self, score_requests: ScoreRequestsFn, max_batch_pairs: int = 256, max_wait_ms: float = 5.0):
+        self.score_requests = score_requests
+        self.max_batch_pairs = max_batch_pairs
+        self.max_wait = max_wait_ms / 1000.0
+        
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        
+        self.batches = 0
+        self.requests = 0
+        self.pairs = 0
+        
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+    
+    def submit(self, query: str, documents: List[Document]) -> np.ndarray:
+        """Scores for the documents against the query (blocks until its batch has run)"""
+        if not documents:
+            return np.array([], dtype=np.float32)
+        
+        future: Future = Future()
+        with self._lock:
+            self._in_flight += 1
+        self._queue.put((query, documents, future))
+        
+        return future.result()
+    
+    def _gather(self) -> List[tuple]:
+        """First queued request plus whatever arrives before the batch is full or the wait ends"""
+        batch = [self._queue.get()]
+        pairs = len(batch[0][1])
+        deadline = time.monotonic() + self.max_wait
+        
+        while pairs < self.max_batch_pairs:
+            with self._lock:
+                everyone_here = len(batch) >= self._in_flight
+            if everyone_here:
+                break
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            pairs += len(item[1])
+        
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._gather()
+            
+            try:
+                results = self.score_requests([(query, documents) for query, documents, _ in batch])
+                for (_, _, future), scores in zip(batch, results):
+                    future.set_result(scores)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            
+            with self._lock:
+                self._in_flight -= len(batch)
+                self.batches += 1
+                self.requests += len(batch)
+                self.pairs += sum(len(documents) for _, documents, _ in batch)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'pairs': self.pairs,
+                'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+                'avg_pairs_per_batch': round(self.pairs / self.batches, 1) if self.batches else 0.0
+            }
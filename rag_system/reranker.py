@@ -1,28 +1,254 @@
-from typing import List, Tuple
+import os
+from typing import List, Tuple, Callable, Optional
 import numpy as np
 from sentence_transformers import CrossEncoder
 from langchain_core.documents import Document
 from sklearn.metrics.pairwise import cosine_similarity
-from data_pipeline.config import RAG_CONFIG
+from data_pipeline.config import RAG_CONFIG, VECTOR_STORE_DIR
+from rag_system.cache import LRUCache, query_fingerprint, document_fingerprint
+from rag_system.token_store import DocumentTokenStore
+from rag_system.rerank_service import MicroBatcher
+
+# Approximate bytes per score cache entry: key tuple of three short hashes plus a float
+SCORE_ENTRY_BYTES = 256
 
 class AdvancedReranker:
     """
     Reranking with Cross-Encoder and MMR for diversity
     """
     
-    def __init__(self):
+    def __init__(self, document_vectors: Optional[Callable[[List[Document]], np.ndarray]] = None):
         self.config = RAG_CONFIG
         
+        # Lookup of stored dense vectors for MMR diversity (TF-IDF when unset)
+        self.document_vectors = document_vectors
+        
         # Load cross-encoder model
         print(f"Loading cross-encoder: {self.config['cross_encoder_model']}")
-        self.cross_encoder = CrossEncoder(self.config['cross_encoder_model'])
-        print("Cross-encoder loaded successfully")
+        self.cross_encoder, self.backend = self.load_cross_encoder(
+            self.config['cross_encoder_model'],
+            self.config["cross_encoder_backend"]
+        )
+        print(f"Cross-encoder loaded successfully (backend: {self.backend})")
+        
+        # (query fingerprint, document fingerprint, model version) -> cross-encoder score
+        self.model_version = (
+            f"{self.config['cross_encoder_model']}:{self.backend}:{self.config['cross_encoder_max_length']}"
+        )
+        self.score_cache = LRUCache(
+            max_bytes=self.config["rerank_score_cache_mb"] * 1024 * 1024,
+            ttl_seconds=self.config["rerank_score_cache_ttl"],
+            sizeof=lambda score: SCORE_ENTRY_BYTES
+        )
+        self.score_cache_index_version = None
+        
+        # Document token ids prepared once per index (see prepare_document_tokens)
+        self.token_store: Optional[DocumentTokenStore] = None
+        
+        # Shared inference queue batching pairs across concurrent requests
+        self.batcher = None
+        if self.config["rerank_micro_batching"]:
+            self.batcher = MicroBatcher(
+                self.score_requests,
+                max_batch_pairs=self.config["rerank_batch_max_pairs"],
+                max_wait_ms=self.config["rerank_batch_max_wait_ms"]
+            )
+    
+    def load_cross_encoder(self, model_name: str, backend: str = "torch") -> Tuple[CrossEncoder, str]:
+        """
+        Load the cross-encoder on a CPU inference backend:
+        torch (fp32), quantized (dynamic int8 Linear layers) or onnx (ONNX Runtime).
+        Returns the model and the backend actually used
+        """
+        max_length = self.config["cross_encoder_max_length"]
+        
+        if backend == "onnx":
+            try:
+                # Exported to ONNX on first load; needs optimum[onnxruntime]
+                return CrossEncoder(model_name, backend="onnx", max_length=max_length), "onnx"
+            except Exception as e:
+                print(f"ONNX backend unavailable, falling back to torch: {e}")
+                backend = "torch"
+        
+        cross_encoder = CrossEncoder(model_name, max_length=max_length)
+        cross_encoder.eval()
+        
+        if backend == "quantized":
+            try:
+                import torch
+                
+                # int8 weights, activations quantized on the fly per batch
+                torch.ao.quantization.quantize_dynamic(
+                    cross_encoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                )
+            except Exception as e:
+                print(f"Dynamic quantization failed, using torch: {e}")
+                backend = "torch"
+        
+        return cross_encoder, backend
+    
+    def predict_scores(self, pairs: List[List[str]]) -> np.ndarray:
+        """
+        Cross-encoder scores for query-document pairs, in input order.
+        Pairs are sorted by length so each batch pads to similar lengths,
+        and truncated to cross_encoder_max_length tokens
+        """
+        if not pairs:
+            return np.array([], dtype=np.float32)
+        
+        # Character length is a cheap proxy for token length
+        order = np.argsort([-(len(query) + len(text)) for query, text in pairs], kind="stable")
+        
+        sorted_scores = self.cross_encoder.predict(
+            [pairs[i] for i in order],
+            batch_size=self.config["cross_encoder_batch_size"],
+            show_progress_bar=False
+        )
+        
+        scores = np.empty(len(pairs), dtype=np.float32)
+        scores[order] = sorted_scores
+        return scores
+    
+    def prepare_document_tokens(self, documents: List[Document], index_version: str):
+        """
+        Tokenize the indexed documents once (loaded from disk when already built
+        for this index and model) so rerank requests only tokenize the query
+        """
+        if not self.config["precompute_document_tokens"] or not documents:
+            return
+        
+        tokenizer = getattr(self.cross_encoder, 'tokenizer', None)
+        if tokenizer is None or tokenizer.cls_token_id is None or tokenizer.sep_token_id is None:
+            print("Cross-encoder tokenizer has no [CLS]/[SEP] pair template, tokenizing per request")
+            return
+        
+        store = DocumentTokenStore(tokenizer, self.config["cross_encoder_max_length"])
+        path = os.path.join(VECTOR_STORE_DIR, "cross_encoder_tokens.npz")
+        version = f"{index_version}:{self.model_version}"
+        
+        if store.load(path, version):
+            print(f"Loaded document token ids for {len(store)} documents")
+        else:
+            store.build(documents, version)
+            print(f"Tokenized {len(store)} documents for the cross-encoder ({len(store.ids)} tokens)")
+            try:
+                os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+                store.save(path)
+            except Exception as e:
+                print(f"Could not save document token ids: {e}")
+        
+        if not store.matches_tokenizer("sample query", documents[0].page_content):
+            print("Assembled pair inputs differ from the tokenizer's, tokenizing per request")
+            return
+        
+        self.token_store = store
+    
+    def predict_scores_from_ids(self, query: str, documents: List[Document]) -> np.ndarray:
+        """
+        Cross-encoder scores using stored document token ids: only the query is
+        tokenized. Length-bucketed like predict_scores, returned in input order
+        """
+        return self.score_requests_from_ids([(query, documents)])[0]
+    
+    def score_requests_from_ids(self, requests: List[Tuple[str, List[Document]]]) -> List[np.ndarray]:
+        """Scores for several (query, documents) requests, batched together from stored token ids"""
+        import torch
+        
+        rows = []
+        for query, documents in requests:
+            query_ids = np.asarray(self.token_store.tokenize([query])[0], dtype=np.int64)
+            rows.extend((query_ids, ids) for ids in self.token_store.document_ids(documents))
+        
+        order = np.argsort([-(len(query_ids) + len(ids)) for query_ids, ids in rows], kind="stable")
+        batch_size = self.config["cross_encoder_batch_size"]
+        activation_fn = self.cross_encoder.activation_fn
+        
+        scores = np.empty(len(rows), dtype=np.float32)
+        with torch.no_grad():
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                features = {
+                    name: torch.from_numpy(values)
+                    for name, values in self.token_store.batch_inputs([rows[i] for i in batch]).items()
+                }
+                
+                batch_scores = self.cross_encoder(features)["scores"].float()
+                if activation_fn is not None:
+                    batch_scores = activation_fn(batch_scores)
+                scores[batch] = batch_scores.reshape(len(batch), -1)[:, 0].cpu().numpy()
+        
+        return np.split(scores, np.cumsum([len(documents) for _, documents in requests])[:-1])
+    
+    def score_requests(self, requests: List[Tuple[str, List[Document]]]) -> List[np.ndarray]:
+        """Model scores for several (query, documents) requests in one inference pass"""
+        if self.token_store is not None:
+            try:
+                return self.score_requests_from_ids(requests)
+            except Exception as e:
+                print(f"Scoring from token ids failed, tokenizing per request: {e}")
+                self.token_store = None
+        
+        pairs = [[query, doc.page_content] for query, documents in requests for doc in documents]
+        scores = self.predict_scores(pairs)
+        return np.split(scores, np.cumsum([len(documents) for _, documents in requests])[:-1])
+    
+    def _score_pairs(self, query: str, documents: List[Document]) -> np.ndarray:
+        """Model scores, through the shared micro-batcher when enabled"""
+        if self.batcher is not None:
+            return self.batcher.submit(query, documents)
+        return self.score_requests([(query, documents)])[0]
+    
+    def score_documents(
+        self,
+        query: str,
+        documents: List[Document],
+        index_version: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Cross-encoder scores for the documents against the query. Cached
+        scores are reused and only uncached pairs go to the model; the cache
+        is cleared when the index version changes
+        """
+        if not self.config["enable_rerank_score_cache"]:
+            return self._score_pairs(query, documents)
+        
+        if index_version != self.score_cache_index_version:
+            if self.score_cache_index_version is not None:
+                print("Index changed, clearing cross-encoder score cache")
+            self.score_cache.clear()
+            self.score_cache_index_version = index_version
+        
+        query_key = query_fingerprint(query)
+        keys = [
+            (query_key, document_fingerprint(doc.page_content), self.model_version)
+            for doc in documents
+        ]
+        
+        scores = np.empty(len(documents), dtype=np.float32)
+        uncached = []
+        for i, key in enumerate(keys):
+            score = self.score_cache.get(key)
+            if score is None:
+                uncached.append(i)
+            else:
+                scores[i] = score
+        
+        # Partial batch: only the uncached pairs are scored
+        if uncached:
+            new_scores = self._score_pairs(query, [documents[i] for i in uncached])
+            scores[uncached] = new_scores
+            for i, score in zip(uncached, new_scores):
+                self.score_cache.set(keys[i], float(score))
+        
+        print(f"Cross-encoder scores: {len(documents) - len(uncached)} cached, {len(uncached)} computed")
+        return scores
     
     def cross_encoder_rerank(
         self, 
         query: str, 
         documents: List[Document], 
-        top_k: int = None
+        top_k: int = None,
+        index_version: Optional[str] = None
     ) -> List[Tuple[Document, float]]:
         """
         Rerank documents using cross-encoder
@@ -34,11 +260,8 @@ class AdvancedReranker:
         
         top_k = top_k or self.config["post_rerank_k"]
         
-        # Prepare query-document pairs
-        pairs = [[query, doc.page_content] for doc in documents]
-        
-        # Get relevance scores
-        scores = self.cross_encoder.predict(pairs)
+        # Get relevance scores (cached pairs are not rescored)
+        scores = self.score_documents(query, documents, index_version)
         
         # Sort by score
         doc_score_pairs = list(zip(documents, scores))
@@ -46,14 +269,87 @@ class AdvancedReranker:
         
         return doc_score_pairs[:top_k]
     
+    def cascade_rerank(
+        self,
+        query: str,
+        documents: List[Document],
+        cheap_scores: List[float],
+        top_k: int = None,
+        index_version: Optional[str] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Rerank cascade: the fusion score from retrieval settles clear winners and
+        clear losers, and only the ambiguous band around the final-context cutoff
+        is scored by the cross-encoder. Margins are in units of the min-max
+        normalized fusion score, measured from the first candidate below the cutoff
+        """
+        top_k = top_k or self.config["post_rerank_k"]
+        cutoff_rank = self.config["final_context_k"]
+        
+        if len(documents) <= cutoff_rank:
+            return self.cross_encoder_rerank(query, documents, top_k=top_k, index_version=index_version)
+        
+        scores = np.asarray(cheap_scores, dtype=np.float64)
+        score_range = scores.max() - scores.min()
+        normalized = (scores - scores.min()) / score_range if score_range > 0 else np.zeros_like(scores)
+        boundary = np.sort(normalized)[::-1][cutoff_rank]
+        
+        accept_above = boundary + self.config["cascade_accept_margin"]
+        reject_below = boundary - self.config["cascade_reject_margin"]
+        
+        accepted = [i for i in np.argsort(-normalized, kind="stable") if normalized[i] >= accept_above]
+        ambiguous = [i for i in range(len(documents)) if reject_below < normalized[i] < accept_above]
+        pruned = len(documents) - len(accepted) - len(ambiguous)
+        print(f"Cascade: {len(accepted)} accepted, {len(ambiguous)} to cross-encoder, {pruned} pruned")
+        
+        ambiguous_docs = [documents[i] for i in ambiguous]
+        ambiguous_scores = self.score_documents(query, ambiguous_docs, index_version) if ambiguous_docs else []
+        
+        # Accepted candidates rank above the scored band; their fusion scores are
+        # mapped onto the cross-encoder scale so MMR still sees their relevance spread
+        if len(ambiguous_scores):
+            slope = self._calibration_slope(
+                normalized[ambiguous], ambiguous_scores, accept_above - reject_below
+            )
+            accepted_scores = float(np.max(ambiguous_scores)) + slope * (normalized[accepted] - accept_above)
+        else:
+            accepted_scores = normalized[accepted]
+        doc_score_pairs = [(documents[i], float(score)) for i, score in zip(accepted, accepted_scores)]
+        
+        scored = list(zip(ambiguous_docs, ambiguous_scores))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        doc_score_pairs.extend(scored)
+        
+        return doc_score_pairs[:top_k]
+    
+    @staticmethod
+    def _calibration_slope(fusion: np.ndarray, cross: List[float], band_width: float) -> float:
+        """
+        Cross-encoder score per unit of normalized fusion score, fitted on the
+        cascade's scored band (falls back to the band's score spread)
+        """
+        cross = np.asarray(cross, dtype=np.float64)
+        if len(cross) >= 2 and fusion.max() > fusion.min():
+            slope = float(np.polyfit(fusion, cross, 1)[0])
+            if slope > 0:
+                return slope
+        spread = float(cross.max() - cross.min())
+        return spread / band_width if spread > 0 else 1.0
+    
     def compute_document_embeddings(
         self, 
         documents: List[Document]
     ) -> np.ndarray:
         """
-        Compute simple embeddings for MMR
-        Using TF-IDF style approach for efficiency
+        Embeddings for MMR: the dense vectors stored in the vector index when
+        available, otherwise TF-IDF over the candidate texts
         """
+        if self.document_vectors is not None and self.config["mmr_use_stored_vectors"]:
+            try:
+                return self.document_vectors(documents)
+            except Exception as e:
+                print(f"Stored document vectors unavailable, using TF-IDF: {e}")
+        
         from sklearn.feature_extraction.text import TfidfVectorizer
         
         texts = [doc.page_content for doc in documents]
@@ -62,9 +358,9 @@ class AdvancedReranker:
         try:
             embeddings = vectorizer.fit_transform(texts).toarray()
             return embeddings
-        except:
-            # Fallback: return random embeddings if TF-IDF fails
-            return np.random.rand(len(documents), 100)
+        except ValueError:
+            # Empty vocabulary: zero vectors, so MMR falls back to pure relevance order
+            return np.zeros((len(documents), 1))
     
     def maximal_marginal_relevance(
         self,
@@ -88,65 +384,69 @@ class AdvancedReranker:
         # Compute document embeddings for diversity calculation
         doc_embeddings = self.compute_document_embeddings(documents)
         
+        selected_indices = self.mmr_select(doc_embeddings, relevance_scores, lambda_param, top_k)
+        
+        # Return selected documents in order of selection
+        return [documents[idx] for idx in selected_indices]
+    
+    def mmr_select(
+        self,
+        doc_embeddings: np.ndarray,
+        relevance_scores: List[float],
+        lambda_param: float,
+        top_k: int
+    ) -> List[int]:
+        """
+        Indices chosen by MMR, in order of selection.
+        One similarity matrix over the normalized embeddings, and a running
+        max-similarity-to-selected vector updated after each pick
+        """
+        n = len(relevance_scores)
+        if n == 0:
+            return []
+        
         # Normalize relevance scores to [0, 1]
-        max_score = max(relevance_scores) if relevance_scores else 1.0
-        min_score = min(relevance_scores) if relevance_scores else 0.0
+        scores = np.asarray(relevance_scores, dtype=np.float64)
+        max_score, min_score = scores.max(), scores.min()
         score_range = max_score - min_score if max_score > min_score else 1.0
+        normalized_scores = (scores - min_score) / score_range
         
-        normalized_scores = [
-            (score - min_score) / score_range 
-            for score in relevance_scores
-        ]
-        
-        # Initialize
-        selected_indices = []
-        remaining_indices = list(range(len(documents)))
+        # Cosine similarity matrix (zero vectors have similarity 0, as in sklearn)
+        similarity = cosine_similarity(np.asarray(doc_embeddings, dtype=np.float64))
         
         # Select first document (highest relevance)
-        first_idx = np.argmax(normalized_scores)
-        selected_indices.append(first_idx)
-        remaining_indices.remove(first_idx)
+        first_idx = int(np.argmax(normalized_scores))
+        selected_indices = [first_idx]
+        
+        remaining = np.ones(n, dtype=bool)
+        remaining[first_idx] = False
+        max_similarity = similarity[first_idx].copy()
         
         # Iteratively select documents
-        while len(selected_indices) < top_k and remaining_indices:
-            mmr_scores = []
+        while len(selected_indices) < top_k and remaining.any():
+            mmr_scores = lambda_param * normalized_scores - (1 - lambda_param) * max_similarity
+            mmr_scores[~remaining] = -np.inf
             
-            for idx in remaining_indices:
-                # Relevance score
-                relevance = normalized_scores[idx]
-                
-                # Max similarity to already selected documents
-                similarities = []
-                for selected_idx in selected_indices:
-                    sim = cosine_similarity(
-                        doc_embeddings[idx].reshape(1, -1),
-                        doc_embeddings[selected_idx].reshape(1, -1)
-                    )[0, 0]
-                    similarities.append(sim)
-                
-                max_similarity = max(similarities) if similarities else 0.0
-                
-                # MMR score
-                mmr_score = lambda_param * relevance - (1 - lambda_param) * max_similarity
-                mmr_scores.append((idx, mmr_score))
-            
-            # Select document with highest MMR score
-            best_idx, _ = max(mmr_scores, key=lambda x: x[1])
+            # Ties go to the lowest index
+            best_idx = int(np.argmax(mmr_scores))
             selected_indices.append(best_idx)
-            remaining_indices.remove(best_idx)
+            remaining[best_idx] = False
+            np.maximum(max_similarity, similarity[best_idx], out=max_similarity)
         
-        # Return selected documents in order of selection
-        return [documents[idx] for idx in selected_indices]
+        return selected_indices
     
     def rerank_and_diversify(
         self,
         query: str,
         documents: List[Document],
-        apply_mmr: bool = True
+        apply_mmr: bool = True,
+        index_version: Optional[str] = None,
+        cheap_scores: Optional[List[float]] = None
     ) -> List[Document]:
         """
         Main reranking method:
-        1. Cross-encoder reranking for relevance
+        1. Cross-encoder reranking for relevance (cascade over the retrieval
+           scores when cheap_scores are given)
         2. MMR for diversity (optional)
         """
         
@@ -156,11 +456,21 @@ class AdvancedReranker:
         print(f"Reranking {len(documents)} documents with cross-encoder")
         
         # Stage 1: Cross-encoder reranking
-        reranked_with_scores = self.cross_encoder_rerank(
-            query, 
-            documents,
-            top_k=self.config["post_rerank_k"]
-        )
+        if cheap_scores is not None and self.config["rerank_cascade"]:
+            reranked_with_scores = self.cascade_rerank(
+                query,
+                documents,
+                cheap_scores,
+                top_k=self.config["post_rerank_k"],
+                index_version=index_version
+            )
+        else:
+            reranked_with_scores = self.cross_encoder_rerank(
+                query, 
+                documents,
+                top_k=self.config["post_rerank_k"],
+                index_version=index_version
+            )
         
         reranked_docs = [doc for doc, _ in reranked_with_scores]
         scores = [score for _, score in reranked_with_scores]
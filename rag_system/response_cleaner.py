@@ -0,0 +1,347 @@
+import re
+from typing import List, Optional, Tuple
+
+# Rules of the answer cleaner, in the order they are applied.
+# Phrase removals (case-insensitive), each with the lowercase literals one of
+# which any match must contain (a rule whose literals don't occur can't match
+# and is skipped) and whether every match starts with one of them.
+SOURCE_CITATION = re.compile(r'\(Source:\s*Source\s*\d+\)', re.IGNORECASE)
+PHRASE_RULES = [
+    (SOURCE_CITATION, ('(source:',), True),
+    (re.compile(r'\(Source:\s*[^\)]+\)', re.IGNORECASE), ('(source:',), True),
+    (re.compile(r'\(Assumed data based on historical patterns\)', re.IGNORECASE), ('(assumed data based on historical patterns)',), True),
+    (re.compile(r'\(assumed.*?\)', re.IGNORECASE), ('(assumed',), True),
+    (re.compile(r'assumed data based on historical patterns', re.IGNORECASE), ('assumed data based on historical patterns',), True),
+    # Disclaimers
+    (re.compile(r"based on the (provided|available) (context|data|information)", re.IGNORECASE), ('based on the ',), True),
+    (re.compile(r"according to the (documents|data|sources)", re.IGNORECASE), ('according to the ',), True),
+    (re.compile(r"the (context|data|information) (shows|indicates|suggests)", re.IGNORECASE), ('the context ', 'the data ', 'the information '), True),
+    (re.compile(r"from the (provided|retrieved) (context|data|information)", re.IGNORECASE), ('from the provided ', 'from the retrieved '), True),
+    (re.compile(r"data (is )?not available( in the (dataset|context))?", re.IGNORECASE), ('data not available', 'data is not available'), True),
+    (re.compile(r"information (is )?not (present|available|provided)", re.IGNORECASE), ('information not ', 'information is not '), True),
+    (re.compile(r"(the )?(dataset|data|context) does not (contain|include|provide)", re.IGNORECASE), ('does not contain', 'does not include', 'does not provide'), False),
+    (re.compile(r"no specific data (found|available|present)", re.IGNORECASE), ('no specific data ',), True),
+    (re.compile(r"limited (data|information) in the context", re.IGNORECASE), ('limited data in the context', 'limited information in the context'), True),
+]
+# Any literal of any rule: text without one is left as it is
+PHRASE_TRIGGER = re.compile('|'.join(re.escape(literal) for _, literals, _ in PHRASE_RULES for literal in literals))
+
+# "1. Maharashtra Rainfall Patterns: -" -> "## Maharashtra Rainfall Patterns"
+NUMBERED_HEADING = re.compile(r'(\d+)\.\s*([A-Z][^:]+):\s*-')
+# "Text: -" -> "**Text:**" and a line break
+DASHED_LABEL = re.compile(r'([A-Za-z\s]+):\s*-\s*')
+REPEATED_COLONS = re.compile(r'::+')
+
+# Lines mentioning missing data are dropped ('data not available' and
+# 'information not available' are covered by 'not available')
+DROPPED_LINE_PHRASES = ['data not available', 'not available', 'no data', 'information not available',
+                        'not provided', 'data is missing', 'assumed data']
+DROPPED_LINE_CHECKS = ('not available', 'no data', 'not provided', 'data is missing', 'assumed data')
+
+EMPTY_PARENS = re.compile(r'\(\s*\)')
+EXTRA_NEWLINES = re.compile(r'\n\s*\n\s*\n')
+REPEATED_SPACES = re.compile(r' +')
+SPACE_BEFORE_NEWLINE = re.compile(r' \n')
+
+# Helpers for the fast path
+LABEL_SITE = re.compile(r':\s*-\s*')
+HEADING_SITE = re.compile(r':\s*-')
+HEADING_START = re.compile(r'\d+\.\s*[A-Z]')
+OPEN_HEADING = re.compile(r'\d\.\s*(?:[A-Z]|\Z)')
+LABEL_RUN = re.compile(r'[A-Za-z\s]*')
+# Whitespace runs the whitespace rules can change (single characters never are)
+WHITESPACE_RUN = re.compile(r'\s\s+')
+
+# Non-ASCII characters IGNORECASE matches to ASCII letters that lower() doesn't
+# map to them (dotted capital I, dotless i, long s; the Kelvin sign lowercases to 'k')
+ASCII_CASE_FOLDS = [('\u0130', 'i'), ('\u0131', 'i'), ('\u017f', 's')]
+
+
+def reference_clean(response_text: str) -> str:
+    """The cleaning rules applied one after another to the whole text (reference behaviour)"""
+    cleaned = response_text
+    for pattern, _, _ in PHRASE_RULES:
+        cleaned = pattern.sub('', cleaned)
+    
+    cleaned = NUMBERED_HEADING.sub(r'## \2', cleaned)
+    cleaned = DASHED_LABEL.sub(r'**\1:**\n', cleaned)
+    cleaned = REPEATED_COLONS.sub(':', cleaned)
+    
+    filtered_lines = []
+    for line in cleaned.split('\n'):
+        line_lower = line.lower().strip()
+        if not any(phrase in line_lower for phrase in DROPPED_LINE_PHRASES):
+            filtered_lines.append(line)
+    cleaned = '\n'.join(filtered_lines)
+    
+    cleaned = EMPTY_PARENS.sub('', cleaned)
+    cleaned = EXTRA_NEWLINES.sub('\n\n', cleaned)
+    cleaned = REPEATED_SPACES.sub(' ', cleaned)
+    cleaned = SPACE_BEFORE_NEWLINE.sub('\n', cleaned)
+    
+    return cleaned.strip()
+
+
+def fold_case(text: str) -> str:
+    """Lowercase text of the same length in which case-insensitive ASCII matches are plain substrings"""
+    if not text.isascii():
+        for char, ascii_char in ASCII_CASE_FOLDS:
+            if char in text:
+                text = text.replace(char, ascii_char)
+    return text.lower()
+
+
+def phrase_spans(pattern: re.Pattern, literals: Tuple[str, ...], anchored: bool, text: str, folded: str) -> List[Tuple[int, int]]:
+    """Spans pattern.sub('', text) removes; for an anchored rule only the literal positions are tried"""
+    if not anchored:
+        return [match.span() for match in pattern.finditer(text)]
+    
+    starts = set()
+    for literal in literals:
+        start = folded.find(literal)
+        while start >= 0:
+            starts.add(start)
+            start = folded.find(literal, start + 1)
+    
+    spans = []
+    pos = 0
+    for start in sorted(starts):
+        if start < pos:
+            continue
+        match = pattern.match(text, start)
+        if match:
+            spans.append(match.span())
+            pos = match.end()
+    return spans
+
+
+def cut_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    parts = []
+    pos = 0
+    for start, end in spans:
+        parts.append(text[pos:start])
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def remove_phrases(text: str) -> str:
+    """Citation, 'assumed data' and disclaimer removals (rules without their literal are skipped)"""
+    folded = fold_case(text)
+    if not PHRASE_TRIGGER.search(folded):
+        return text
+    
+    for pattern, literals, anchored in PHRASE_RULES:
+        if not any(literal in folded for literal in literals):
+            continue
+        spans = phrase_spans(pattern, literals, anchored, text, folded)
+        if spans:
+            # fold_case keeps positions, so the folded text is cut the same way
+            text = cut_spans(text, spans)
+            folded = cut_spans(folded, spans)
+    return text
+
+
+def format_headings(text: str) -> str:
+    """NUMBERED_HEADING substitution, only looking at the ': -' sites"""
+    parts = []
+    pos = 0
+    for site in HEADING_SITE.finditer(text):
+        colon = site.start()
+        # The heading text can't contain a colon
+        start = HEADING_START.search(text, max(pos, text.rfind(':', 0, colon) + 1), colon)
+        if start is None or start.end() >= colon:
+            continue
+        parts.append(text[pos:start.start()])
+        parts.append('## ' + text[start.end() - 1:colon])
+        pos = site.end()
+    
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def format_labels(text: str) -> str:
+    """DASHED_LABEL substitution, only looking at the ': -' sites (the label is the letter run before the colon)"""
+    parts = []
+    pos = 0
+    reversed_text = None
+    for site in LABEL_SITE.finditer(text):
+        colon = site.start()
+        if reversed_text is None:
+            reversed_text = text[::-1]
+        offset = len(text) - colon
+        start = max(pos, colon - (LABEL_RUN.match(reversed_text, offset).end() - offset))
+        if start >= colon:
+            continue
+        parts.append(text[pos:start])
+        parts.append('**' + text[start:colon] + ':**\n')
+        pos = site.end()
+    
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def drop_lines(text: str) -> str:
+    """Remove the lines that mention missing data"""
+    lowered = text.lower()
+    if not any(phrase in lowered for phrase in DROPPED_LINE_CHECKS):
+        return text
+    
+    return '\n'.join(
+        line for line, line_lower in zip(text.split('\n'), lowered.split('\n'))
+        if not any(phrase in line_lower for phrase in DROPPED_LINE_CHECKS)
+    )
+
+
+def normalize_space_run(match: re.Match) -> str:
+    run = match.group()
+    if ' ' not in run and run.count('\n') < 3:
+        return run
+    run = EXTRA_NEWLINES.sub('\n\n', run)
+    run = REPEATED_SPACES.sub(' ', run)
+    return SPACE_BEFORE_NEWLINE.sub('\n', run)
+
+
+def normalize_whitespace(text: str) -> str:
+    """Whitespace rules, applied per whitespace run (no match crosses a non-space character)"""
+    return WHITESPACE_RUN.sub(normalize_space_run, text)
+
+
+def format_block(text: str) -> str:
+    """Formatting rules between phrase removal and whitespace normalization"""
+    text = format_labels(format_headings(text))
+    if '::' in text:
+        text = REPEATED_COLONS.sub(':', text)
+    text = drop_lines(text)
+    if '(' in text:
+        text = EMPTY_PARENS.sub('', text)
+    return text
+
+
+def clean_response(response_text: str) -> str:
+    """
+    Same result as reference_clean. Each rule only runs when its literal or
+    ': -' site occurs, and the whitespace rules only touch the runs they change.
+    """
+    return normalize_whitespace(format_block(remove_phrases(response_text))).strip()
+
+
+def has_open_citation(text: str) -> bool:
+    """True if a "(Source:" citation in text is not closed yet (after the 'Source n' citations are removed)"""
+    folded = fold_case(text)
+    if '(source:' not in folded:
+        return False
+    
+    text = SOURCE_CITATION.sub('', text)
+    folded = fold_case(text)
+    return folded.rfind('(source:') > folded.rfind(')')
+
+
+def label_may_cross(right: str, rest: str) -> Optional[bool]:
+    """
+    Whether a "Text: -" label could run across the line break just before
+    `right` (phrase-removed complete lines), with `rest` the unprocessed text
+    after it; None if that isn't known yet.
+    """
+    run_end = LABEL_RUN.match(right).end()
+    if run_end < len(right):
+        if right[run_end] != ':':
+            return False
+        after = right[run_end + 1:]
+        dash = len(after) - len(after.lstrip())
+        return after[dash] == '-' if dash < len(after) else None
+    
+    # Phrase removals start with "(" or a letter, so any other character is final
+    if rest and rest[0] not in ':(' and not LABEL_RUN.match(fold_case(rest[0])).end():
+        return False
+    return None
+
+
+class StreamingCleaner:
+    """
+    clean_response for a streamed answer. Text is held back while a later
+    chunk could still change it: the current line (lines are dropped as a
+    whole), an unclosed "(Source:" citation, and line breaks that a numbered
+    heading or "Text: -" label could still span. Everything returned by
+    feed() and flush() adds up to clean_response of the whole text.
+    """
+    
+    def __init__(self):
+        self.raw = ""                    # current line (and lines of an unclosed citation)
+        self.lines: List[str] = []       # phrase-removed complete lines, not yet formatted
+        self.pending_space = ""          # whitespace run waiting for the next character
+        self.started = False             # leading whitespace has been stripped
+    
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of the answer; returns the cleaned text that is now final"""
+        self.raw += chunk
+        if '\n' in chunk:
+            self._close_lines()
+        if not self.lines:
+            return ""
+        
+        cut = self._safe_cut()
+        if cut is None:
+            return ""
+        
+        count, formatted = cut
+        del self.lines[:count]
+        return self._normalize(formatted, final=False)
+    
+    def flush(self) -> str:
+        """End of the answer; returns the rest of the cleaned text"""
+        text = "".join(self.lines) + remove_phrases(self.raw)
+        output = self._normalize(format_block(text), final=True)
+        self.__init__()
+        return output
+    
+    def _close_lines(self):
+        start = 0
+        while True:
+            end = self.raw.find('\n', start)
+            if end < 0:
+                return
+            if has_open_citation(self.raw[:end + 1]):
+                start = end + 1
+                continue
+            self.lines.append(remove_phrases(self.raw[:end + 1]))
+            self.raw = self.raw[end + 1:]
+            start = 0
+    
+    def _safe_cut(self) -> Optional[Tuple[int, str]]:
+        """Most complete lines that can be formatted on their own, and their formatted text"""
+        for count in range(len(self.lines), 0, -1):
+            left = "".join(self.lines[:count])
+            
+            # A label or heading ending at the line break
+            if left.rstrip().endswith((':', '-')):
+                continue
+            # A numbered heading waiting for its ': -'
+            if OPEN_HEADING.search(left, left.rfind(':') + 1):
+                continue
+            if label_may_cross("".join(self.lines[count:]), self.raw) is not False:
+                continue
+            
+            formatted = format_block(left)
+            # "(" that could pair with a ")" to come
+            if formatted.rstrip().endswith('('):
+                continue
+            return count, formatted
+        
+        return None
+    
+    def _normalize(self, text: str, final: bool) -> str:
+        """Whitespace rules and strip() across chunks"""
+        text = self.pending_space + text
+        body = text.rstrip()
+        self.pending_space = "" if final else text[len(body):]
+        
+        if not self.started:
+            body = body.lstrip()
+            self.started = bool(body)
+        
+        return normalize_whitespace(body)
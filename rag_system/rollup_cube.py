@@ -0,0 +1,329 @@
+import os
+import json
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from data_pipeline.config import RAG_CONFIG, VECTOR_STORE_DIR
+from rag_system.structured_query import StructuredQueryEngine, StructuredTable, match_category_codes
+
+# Rollup grains: name -> (dimensions, metrics, category)
+ROLLUP_GRAINS = {
+    'state_crop_year': (['state', 'crop', 'year'], ['production', 'area', 'yield'], 'agriculture'),
+    'subdivision_year': (['subdivision', 'year'], ['rainfall', 'temperature'], 'climate'),
+}
+
+ROLLUP_STATS = ['sum', 'avg', 'min', 'max']
+
+# Climate tables without a subdivision column are national series
+NATIONAL_SUBDIVISION = 'all india'
+
+
+class RollupGrain:
+    """
+    Materialized rollup for one grain.
+    keys: int32 (cells x dims) codes into dim_values;
+    stats: float64 (cells x metrics x [sum, avg, min, max]), NaN where empty;
+    counts: int32 (cells x metrics)
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        dimensions: List[str],
+        metrics: List[str],
+        dim_values: Dict[str, List],
+        keys: np.ndarray,
+        stats: np.ndarray,
+        counts: np.ndarray
+    ):
+        self.name = name
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.dim_values = dim_values
+        self.dim_index = {
+            dim: {value: code for code, value in enumerate(values)}
+            for dim, values in dim_values.items()
+        }
+        self.keys = keys
+        self.stats = stats
+        self.counts = counts
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def match_codes(self, dim: str, terms: List[str]) -> np.ndarray:
+        """Codes of the dimension values the entity terms refer to"""
+        return match_category_codes(self.dim_index[dim], dim, terms)
+
+
+class RollupCube:
+    """
+    Pre-aggregated sum/avg/min/max of production, area, yield, rainfall and temperature
+    per (state, crop, year) and per (subdivision, year), built at index time
+    """
+    
+    def __init__(self, grains: Dict[str, RollupGrain]):
+        self.config = RAG_CONFIG
+        self.grains = grains
+    
+    @classmethod
+    def build(cls, data: Dict[str, List[Dict]]) -> "RollupCube":
+        """Materialize all rollup grains from the cached records"""
+        tables = StructuredQueryEngine(data).tables
+        grains = {}
+        
+        for name, (dimensions, metrics, category) in ROLLUP_GRAINS.items():
+            grain = cls._build_grain(name, dimensions, metrics, category, tables)
+            if grain is not None:
+                grains[name] = grain
+                print(f"Rollup {name}: {len(grain)} cells")
+        
+        return cls(grains)
+    
+    @staticmethod
+    def _grain_frame(
+        table: StructuredTable,
+        dimensions: List[str],
+        measure: str
+    ) -> Optional[pd.DataFrame]:
+        """Project a table onto the grain's dimensions plus one measure column"""
+        frame = pd.DataFrame(index=table.frame.index)
+        
+        for dim in dimensions:
+            if dim in table.dimensions:
+                frame[dim] = table.frame[dim].astype(object)
+            elif dim == 'subdivision':
+                frame[dim] = NATIONAL_SUBDIVISION
+            else:
+                return None
+        
+        frame['value'] = table.frame[measure]
+        return frame.dropna()
+    
+    @classmethod
+    def _build_grain(
+        cls,
+        name: str,
+        dimensions: List[str],
+        metrics: List[str],
+        category: str,
+        tables: List[StructuredTable]
+    ) -> Optional[RollupGrain]:
+        per_metric = {}
+        
+        for metric in metrics:
+            # One source table per metric so overlapping datasets aren't double counted
+            best = None
+            for table in tables:
+                if table.category != category:
+                    continue
+                measure = table.resolve_measure(metric)
+                if measure is None:
+                    continue
+                frame = cls._grain_frame(table, dimensions, measure)
+                if frame is not None and len(frame) and (best is None or len(frame) > len(best)):
+                    best = frame
+            if best is not None:
+                per_metric[metric] = best
+        
+        if not per_metric:
+            return None
+        
+        metrics = [m for m in metrics if m in per_metric]
+        
+        # Shared dimension dictionaries
+        dim_values = {}
+        for dim in dimensions:
+            values = set()
+            for frame in per_metric.values():
+                values.update(frame[dim].unique())
+            dim_values[dim] = sorted((v.item() if hasattr(v, 'item') else v for v in values), key=str)
+        
+        dim_index = {
+            dim: {value: code for code, value in enumerate(values)}
+            for dim, values in dim_values.items()
+        }
+        
+        aggregated = []
+        for metric in metrics:
+            frame = per_metric[metric]
+            for dim in dimensions:
+                frame[dim] = frame[dim].map(dim_index[dim]).astype(np.int32)
+            grouped = frame.groupby(dimensions)['value'].agg(['sum', 'mean', 'min', 'max', 'count'])
+            grouped.columns = [f"{metric}:{c}" for c in grouped.columns]
+            aggregated.append(grouped)
+        
+        combined = pd.concat(aggregated, axis=1).sort_index()
+        
+        keys = np.array(combined.index.tolist(), dtype=np.int32).reshape(len(combined), len(dimensions))
+        stats = np.full((len(combined), len(metrics), len(ROLLUP_STATS)), np.nan, dtype=np.float64)
+        counts = np.zeros((len(combined), len(metrics)), dtype=np.int32)
+        
+        for m, metric in enumerate(metrics):
+            for s, stat in enumerate(['sum', 'mean', 'min', 'max']):
+                stats[:, m, s] = combined[f"{metric}:{stat}"].to_numpy(dtype=np.float64)
+            counts[:, m] = combined[f"{metric}:count"].fillna(0).to_numpy(dtype=np.int32)
+        
+        return RollupGrain(name, dimensions, metrics, dim_values, keys, stats, counts)
+    
+    def save(self, name: str = "main", directory: str = VECTOR_STORE_DIR):
+        """Save arrays as .npz and dimension dictionaries as JSON"""
+        arrays = {}
+        meta = {}
+        
+        for grain_name, grain in self.grains.items():
+            arrays[f"{grain_name}__keys"] = grain.keys
+            arrays[f"{grain_name}__stats"] = grain.stats
+            arrays[f"{grain_name}__counts"] = grain.counts
+            meta[grain_name] = {
+                'dimensions': grain.dimensions,
+                'metrics': grain.metrics,
+                'dim_values': grain.dim_values
+            }
+        
+        os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(os.path.join(directory, f"{name}_rollups.npz"), **arrays)
+        with open(os.path.join(directory, f"{name}_rollups.json"), 'w') as f:
+            json.dump(meta, f)
+        
+        print(f"Rollups saved to {os.path.join(directory, f'{name}_rollups.npz')}")
+    
+    @classmethod
+    def load(cls, name: str = "main", directory: str = VECTOR_STORE_DIR) -> Optional["RollupCube"]:
+        """Load rollups saved by save(); None if missing"""
+        array_path = os.path.join(directory, f"{name}_rollups.npz")
+        meta_path = os.path.join(directory, f"{name}_rollups.json")
+        
+        if not (os.path.exists(array_path) and os.path.exists(meta_path)):
+            return None
+        
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        
+        grains = {}
+        with np.load(array_path) as arrays:
+            for grain_name, info in meta.items():
+                grains[grain_name] = RollupGrain(
+                    grain_name,
+                    info['dimensions'],
+                    info['metrics'],
+                    info['dim_values'],
+                    arrays[f"{grain_name}__keys"],
+                    arrays[f"{grain_name}__stats"],
+                    arrays[f"{grain_name}__counts"]
+                )
+        
+        print(f"Rollups loaded from {array_path}")
+        return cls(grains)
+    
+    def lookup(
+        self,
+        entities: Dict[str, List[str]],
+        year_range: Optional[Tuple[int, int]] = None,
+        max_rows: int = None
+    ) -> Tuple[List[Dict], int]:
+        """
+        Rows of the rollups matching the extracted entities, most recent years
+        first, cut at max_rows; returned with the number of matching rows.
+        Only grains constrained by at least one location or crop entity are used.
+        """
+        max_rows = max_rows or self.config["rollup_max_rows"]
+        states = entities.get('states', [])
+        crops = entities.get('crops', [])
+        wanted_metrics = set(entities.get('metrics', []))
+        if 'monsoon' in entities.get('climate_terms', []):
+            wanted_metrics.add('rainfall')
+        
+        rows = []
+        total_rows = 0
+        
+        for grain in self.grains.values():
+            mask = np.ones(len(grain), dtype=bool)
+            constrained = False
+            
+            for dim, terms in (('state', states), ('subdivision', states), ('crop', crops)):
+                if terms and dim in grain.dimensions:
+                    column = grain.dimensions.index(dim)
+                    mask &= np.isin(grain.keys[:, column], grain.match_codes(dim, terms))
+                    constrained = True
+            
+            if not constrained:
+                continue
+            
+            years = None
+            if 'year' in grain.dimensions:
+                column = grain.dimensions.index('year')
+                years = np.array(grain.dim_values['year'], dtype=np.int64)[grain.keys[:, column]]
+                if year_range:
+                    mask &= (years >= year_range[0]) & (years <= year_range[1])
+            
+            metrics = [
+                (m, metric) for m, metric in enumerate(grain.metrics)
+                if not wanted_metrics or metric in wanted_metrics
+            ]
+            if not metrics:
+                continue
+            
+            cells = np.flatnonzero(mask)
+            if years is not None:
+                cells = cells[np.argsort(-years[cells], kind='stable')]
+            total_rows += int((grain.counts[np.ix_(cells, [m for m, _ in metrics])] > 0).sum())
+            
+            # The most recent max_rows rows of each grain cover the overall cut
+            grain_rows = 0
+            for cell in cells:
+                if grain_rows >= max_rows:
+                    break
+                labels = {
+                    dim: grain.dim_values[dim][grain.keys[cell, d]]
+                    for d, dim in enumerate(grain.dimensions)
+                }
+                for m, metric in metrics:
+                    if grain.counts[cell, m] == 0:
+                        continue
+                    row = dict(labels)
+                    row['grain'] = grain.name
+                    row['metric'] = metric
+                    row['count'] = int(grain.counts[cell, m])
+                    for s, stat in enumerate(ROLLUP_STATS):
+                        row[stat] = float(grain.stats[cell, m, s])
+                    rows.append(row)
+                    grain_rows += 1
+        
+        rows.sort(key=lambda row: -int(row.get('year', 0)))
+        return rows[:max_rows], total_rows
+    
+    def to_document(self, rows: List[Dict], total_rows: Optional[int] = None) -> Optional[Document]:
+        """Render rollup rows as a synthetic high-priority context document"""
+        if not rows:
+            return None
+        
+        lines = ["# Pre-aggregated rollups (exact totals over all cached records)"]
+        if total_rows and total_rows > len(rows):
+            lines.append(
+                f"Showing the {len(rows)} most recent of {total_rows} matching rows; "
+                f"earlier years are not listed."
+            )
+        categories = set()
+        
+        for row in rows:
+            dimensions, _, category = ROLLUP_GRAINS[row['grain']]
+            categories.add(category)
+            label = ", ".join(f"{dim}: {row[dim]}" for dim in dimensions)
+            lines.append(
+                f"{label} | {row['metric']}: sum {row['sum']:,.2f}, avg {row['avg']:,.2f}, "
+                f"min {row['min']:,.2f}, max {row['max']:,.2f} (n={row['count']})"
+            )
+        
+        return Document(
+            page_content="\n".join(lines),
+            metadata={
+                'dataset_id': 'rollups',
+                'dataset_name': 'Pre-aggregated Rollups',
+                'source': 'Pre-aggregated Rollups',
+                'category': categories.pop() if len(categories) == 1 else 'mixed',
+                'synthetic': True,
+                'priority': 'high'
+            }
+        )
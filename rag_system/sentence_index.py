@@ -0,0 +1,191 @@
+import os
+import re
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from rag_system.cache import document_fingerprint
+
+# Segmentation and scoring rules of ContextCompressor.extract_key_sentences;
+# bump SENTENCE_INDEX_FORMAT whenever they change so stored indexes are rebuilt
+SENTENCE_INDEX_FORMAT = "1"
+SENTENCE_BOUNDARY = re.compile(r'[.!?]\s+')
+NUMBER_PATTERN = re.compile(r'\d+')
+ENTITY_TERMS = ['state', 'district', 'region', 'crop']
+MIN_SENTENCE_CHARS = 20
+NUMBER_BONUS = 0.3
+ENTITY_BONUS = 0.2
+
+
+def hash_terms(terms: Iterable[str]) -> np.ndarray:
+    """Stable 64-bit ids for terms"""
+    digests = b"".join(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest() for term in terms)
+    return np.frombuffer(digests, dtype=np.int64)
+
+
+@lru_cache(maxsize=256)
+def query_term_hashes(query: str) -> np.ndarray:
+    """Sorted ids of the query's lowercased terms (memoized: every document of a request shares them)"""
+    return np.sort(hash_terms(set(query.lower().split())))
+
+
+def segment(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the stripped sentences longer than MIN_SENTENCE_CHARS"""
+    spans = []
+    start = 0
+    for boundary in list(SENTENCE_BOUNDARY.finditer(text)) + [None]:
+        end = boundary.start() if boundary else len(text)
+        piece = text[start:end]
+        stripped = piece.strip()
+        if len(stripped) > MIN_SENTENCE_CHARS:
+            left = start + len(piece) - len(piece.lstrip())
+            spans.append((left, left + len(stripped)))
+        if boundary:
+            start = boundary.end()
+    return spans
+
+
+class SentenceIndex:
+    """
+    Sentences of every indexed chunk, segmented once per index build.
+    Stores sentence spans, each sentence's hashed term set and its number /
+    entity flags as flat arrays, so per-query sentence scoring is a
+    vectorized set intersection instead of re-splitting and re-tokenizing.
+    """
+    
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.sentence_offsets = np.zeros(1, dtype=np.int64)  # per document, into sentences
+        self.spans = np.zeros((0, 2), dtype=np.int32)
+        self.term_offsets = np.zeros(1, dtype=np.int64)  # per sentence, into term_hashes
+        self.term_hashes = np.zeros(0, dtype=np.int64)
+        self.has_number = np.zeros(0, dtype=bool)
+        self.has_entity = np.zeros(0, dtype=bool)
+        self.version = None
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def build(self, documents: List[Document], version: str):
+        """Segment every distinct document once"""
+        self.rows = {}
+        sentence_counts = []
+        spans = []
+        term_counts = []
+        terms = []
+        has_number = []
+        has_entity = []
+        
+        for doc in documents:
+            key = document_fingerprint(doc.page_content)
+            if key in self.rows:
+                continue
+            self.rows[key] = len(sentence_counts)
+            
+            text = doc.page_content
+            doc_spans = segment(text)
+            sentence_counts.append(len(doc_spans))
+            
+            for start, end in doc_spans:
+                sentence = text[start:end]
+                lowered = sentence.lower()
+                sentence_terms = set(lowered.split())
+                
+                spans.append((start, end))
+                term_counts.append(len(sentence_terms))
+                terms.extend(sentence_terms)
+                has_number.append(bool(NUMBER_PATTERN.search(sentence)))
+                has_entity.append(any(term in lowered for term in ENTITY_TERMS))
+        
+        self.sentence_offsets = np.concatenate([[0], np.cumsum(sentence_counts, dtype=np.int64)]).astype(np.int64)
+        self.spans = np.array(spans, dtype=np.int32).reshape(-1, 2)
+        self.term_offsets = np.concatenate([[0], np.cumsum(term_counts, dtype=np.int64)]).astype(np.int64)
+        self.term_hashes = hash_terms(terms).copy()
+        self.has_number = np.array(has_number, dtype=bool)
+        self.has_entity = np.array(has_entity, dtype=bool)
+        self.version = version
+    
+    def save(self, path: str):
+        keys = sorted(self.rows, key=self.rows.get)
+        np.savez(
+            path,
+            keys=np.array(keys),
+            sentence_offsets=self.sentence_offsets,
+            spans=self.spans,
+            term_offsets=self.term_offsets,
+            term_hashes=self.term_hashes,
+            has_number=self.has_number,
+            has_entity=self.has_entity,
+            version=np.array(self.version)
+        )
+    
+    def load(self, path: str, version: str) -> bool:
+        """Load a stored index if it was built for this version; returns success"""
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            with np.load(path) as data:
+                if str(data['version']) != version:
+                    return False
+                self.rows = {str(key): row for row, key in enumerate(data['keys'])}
+                self.sentence_offsets = data['sentence_offsets']
+                self.spans = data['spans']
+                self.term_offsets = data['term_offsets']
+                self.term_hashes = data['term_hashes']
+                self.has_number = data['has_number']
+                self.has_entity = data['has_entity']
+            self.version = version
+            return True
+        except Exception as e:
+            print(f"Could not load sentence index: {e}")
+            return False
+    
+    def key_sentences_batch(self, texts: List[str], query: str, max_sentences: int = 5) -> List[Optional[List[str]]]:
+        """
+        Same result as ContextCompressor.extract_key_sentences for each text,
+        scored together in one vectorized pass; None for texts not in the index
+        """
+        rows = [self.rows.get(document_fingerprint(text)) for text in texts]
+        indexed = [(i, row) for i, row in enumerate(rows) if row is not None]
+        results: List[Optional[List[str]]] = [None] * len(texts)
+        if not indexed:
+            return results
+        
+        # Stored sentences of the indexed texts (and their terms), concatenated
+        ranges = [(self.sentence_offsets[row], self.sentence_offsets[row + 1]) for _, row in indexed]
+        sentence_ids = np.concatenate([np.arange(first, last) for first, last in ranges])
+        counts = [last - first for first, last in ranges]
+        term_ids = np.concatenate([
+            np.arange(self.term_offsets[first], self.term_offsets[last]) for first, last in ranges
+        ])
+        term_owner = np.repeat(np.arange(len(sentence_ids)), np.diff(self.term_offsets)[sentence_ids])
+        
+        overlap = np.zeros(len(sentence_ids), dtype=np.int64)
+        query_hashes = query_term_hashes(query)
+        if len(query_hashes) and len(term_ids):
+            # Membership in the sorted query ids (cheaper than np.isin for a handful of terms)
+            terms = self.term_hashes[term_ids]
+            positions = np.minimum(np.searchsorted(query_hashes, terms), len(query_hashes) - 1)
+            hits = query_hashes[positions] == terms
+            overlap = np.bincount(term_owner[hits], minlength=len(sentence_ids))
+        
+        scores = (
+            overlap +
+            np.where(self.has_number[sentence_ids], NUMBER_BONUS, 0) +
+            np.where(self.has_entity[sentence_ids], ENTITY_BONUS, 0)
+        )
+        
+        # Per text: positive scores, highest first, ties in sentence order
+        owner = np.repeat(np.arange(len(indexed)), counts)
+        order = np.lexsort((-scores, owner))
+        order = order[scores[order] > 0]
+        starts = np.searchsorted(owner[order], np.arange(len(indexed) + 1))
+        spans = self.spans[sentence_ids[order]].tolist()
+        
+        for n, (i, _) in enumerate(indexed):
+            text = texts[i]
+            results[i] = [text[start:end] for start, end in spans[starts[n]:min(starts[n + 1], starts[n] + max_sentences)]]
+        
+        return results
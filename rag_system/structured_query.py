@@ -0,0 +1,470 @@
+import re
+import time
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from data_pipeline.config import DATASET_IDS, RAG_CONFIG
+from data_pipeline.extractor import DataExtractor
+
+# Canonical dimension -> raw column names used across data.gov.in datasets
+DIMENSION_ALIASES = {
+    'state': ['state_name', 'state', 'state_ut', 'state_ut_name', 'states_uts'],
+    'district': ['district_name', 'district'],
+    'crop': ['crop', 'crop_name', 'commodity'],
+    'year': ['year', 'crop_year'],
+    'season': ['season'],
+    'subdivision': ['subdivision', 'region'],
+}
+
+# Metric keyword -> column name fragments (in priority order)
+MEASURE_KEYWORDS = {
+    'production': ['production'],
+    'area': ['area'],
+    'yield': ['yield'],
+    'rainfall': ['annual', 'ann', 'rainfall', 'total'],
+    'temperature': ['annual', 'temp', 'temperature'],
+    'price': ['modal_price', 'price'],
+}
+
+MONSOON_COLUMNS = ['jun_sep', 'june_september', 'monsoon', 'sw_monsoon']
+
+# Metrics that are additive across rows; everything else defaults to mean
+ADDITIVE_MEASURES = {'production', 'area'}
+
+AGGREGATE_PATTERNS = {
+    'sum': re.compile(r'\b(total|sum|overall|combined|cumulative)\b'),
+    'mean': re.compile(r'\b(average|avg|mean|typical)\b'),
+    'max': re.compile(r'\b(highest|maximum|max|peak|most|largest|top)\b'),
+    'min': re.compile(r'\b(lowest|minimum|min|least|smallest)\b'),
+}
+
+TREND_PATTERN = re.compile(r'\b(trend|trends|year[- ]wise|yearly|each year|per year|over the years|over time)\b')
+RANK_PATTERN = re.compile(r'\bwhich (state|crop|year)s?\b|\b(states|crops|years)\b')
+YEAR_RANGE_PATTERN = re.compile(
+    r'\b((?:19|20)\d{2})\s*(?:-|–|—|to|through|till|until)\s*((?:19|20)?\d{2})\b'
+)
+YEAR_PATTERN = re.compile(r'\b((?:19|20)\d{2})\b')
+LAST_YEARS_PATTERN = re.compile(r'\b(?:last|past|previous)\s+(\d{1,2})\s+years?\b')
+
+# Crop values list alternative names: 'arhar/tur', 'moong(green gram)', 'rapeseed &mustard'
+CATEGORY_NAME_SEPARATORS = re.compile(r'[/&,()]')
+
+
+def normalize_column(name: str) -> str:
+    """Lowercase column name with non-alphanumerics collapsed to underscores"""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_')
+
+
+def parse_year(value) -> Optional[int]:
+    """Extract a 4-digit year from values like 2010, '2010.0' or '2010-11'"""
+    if value is None:
+        return None
+    match = YEAR_PATTERN.search(str(value))
+    return int(match.group(1)) if match else None
+
+
+def match_category_codes(index: Dict, dim: str, terms: List[str]) -> np.ndarray:
+    """
+    Codes of the category values an entity term refers to. Terms match whole
+    words (plural 's' allowed); crop terms must be one of the value's names,
+    so 'gram' is not 'horse-gram' or 'moong(green gram)' and 'tur' is not
+    'turmeric', while locations match inside subdivisions ('madhya maharashtra').
+    """
+    alternatives = "|".join(re.escape(term.lower()) for term in terms)
+    if not alternatives:
+        return np.array([], dtype=np.int32)
+    
+    if dim == 'crop':
+        pattern = re.compile(rf'(?:{alternatives})s?')
+        return np.array([
+            code for value, code in index.items()
+            if any(pattern.fullmatch(name.strip()) for name in CATEGORY_NAME_SEPARATORS.split(str(value)))
+        ], dtype=np.int32)
+    
+    pattern = re.compile(rf'(?<![a-z0-9])(?:{alternatives})s?(?![a-z0-9])')
+    return np.array([
+        code for value, code in index.items()
+        if pattern.search(str(value))
+    ], dtype=np.int32)
+
+
+def extract_year_range(query: str) -> Optional[Tuple[int, int]]:
+    """Year span mentioned in a query ('2010-2015', '2010 to 15', or single years)"""
+    range_match = YEAR_RANGE_PATTERN.search(query)
+    if range_match:
+        start = int(range_match.group(1))
+        end_text = range_match.group(2)
+        end = int(end_text) if len(end_text) == 4 else (start // 100) * 100 + int(end_text)
+        return (min(start, end), max(start, end))
+    
+    years = [int(y) for y in YEAR_PATTERN.findall(query)]
+    if years:
+        return (min(years), max(years))
+    
+    return None
+
+
+class StructuredTable:
+    """
+    One cached dataset loaded as a typed in-memory table.
+    Dimension columns are categoricals (value -> code index), measures are float64.
+    """
+    
+    def __init__(self, dataset_info: Dict, records: List[Dict]):
+        self.dataset_id = dataset_info['id']
+        self.name = dataset_info['name']
+        self.category = dataset_info['category']
+        
+        raw = pd.DataFrame.from_records(records)
+        raw = raw[[c for c in raw.columns if not str(c).startswith('_')]]
+        raw.columns = [normalize_column(c) for c in raw.columns]
+        raw = raw.loc[:, ~raw.columns.duplicated()]
+        
+        columns = {}
+        self.dimensions = []
+        
+        for dim, aliases in DIMENSION_ALIASES.items():
+            source = next((a for a in aliases if a in raw.columns), None)
+            if source is None:
+                continue
+            
+            if dim == 'year':
+                columns[dim] = raw[source].map(parse_year).astype('Int64')
+            else:
+                values = raw[source].astype(str).str.strip().str.lower()
+                columns[dim] = values.where(raw[source].notna()).astype('category')
+            
+            self.dimensions.append(dim)
+            raw = raw.drop(columns=source)
+        
+        self.measures = []
+        for column in raw.columns:
+            numeric = pd.to_numeric(raw[column], errors='coerce')
+            if numeric.notna().sum() >= max(1, len(numeric) // 2):
+                columns[column] = numeric.astype('float64')
+                self.measures.append(column)
+        
+        self.frame = pd.DataFrame(columns, index=raw.index)
+        
+        # Value -> category code lookup per dimension
+        self.index = {
+            dim: {value: code for code, value in enumerate(self.frame[dim].cat.categories)}
+            for dim in self.dimensions if dim != 'year'
+        }
+    
+    def __len__(self) -> int:
+        return len(self.frame)
+    
+    def resolve_measure(self, metric: str, monsoon: bool = False) -> Optional[str]:
+        """Pick the measure column answering a metric keyword"""
+        fragments = MEASURE_KEYWORDS.get(metric, [metric])
+        if metric == 'rainfall' and monsoon:
+            fragments = MONSOON_COLUMNS + fragments
+        
+        # Temperature tables only expose generic columns such as 'annual'
+        if metric == 'temperature' and 'temp' not in self.name.lower():
+            return None
+        if metric == 'rainfall' and 'rainfall' not in self.name.lower():
+            return None
+        
+        for fragment in fragments:
+            for column in self.measures:
+                if column == fragment or column.startswith(fragment) or fragment in column.split('_'):
+                    return column
+        return None
+    
+    def match_codes(self, dim: str, terms: List[str]) -> np.ndarray:
+        """Category codes of the values the entity terms refer to"""
+        return match_category_codes(self.index[dim], dim, terms)
+    
+    def location_dimension(self) -> Optional[str]:
+        if 'state' in self.dimensions:
+            return 'state'
+        if 'subdivision' in self.dimensions:
+            return 'subdivision'
+        return None
+
+
+class StructuredQueryEngine:
+    """
+    Exact analytical answers (filters, group-bys, aggregates) over the cached datasets
+    """
+    
+    def __init__(self, data: Optional[Dict[str, List[Dict]]] = None):
+        self.config = RAG_CONFIG
+        self.tables = self._build_tables(data)
+        total_rows = sum(len(t) for t in self.tables)
+        print(f"Structured query engine loaded {len(self.tables)} tables ({total_rows} rows)")
+    
+    def _build_tables(self, data: Optional[Dict[str, List[Dict]]]) -> List[StructuredTable]:
+        """Load every dataset from the extractor cache (or supplied records)"""
+        extractor = DataExtractor() if data is None else None
+        tables = []
+        
+        for category in ['agriculture', 'climate']:
+            for dataset_info in DATASET_IDS[category]:
+                if data is None:
+                    records = extractor.load_from_cache(dataset_info['id'])
+                else:
+                    records = [
+                        r for r in data.get(category, [])
+                        if r.get('_dataset_id') == dataset_info['id']
+                    ]
+                
+                if not records:
+                    continue
+                
+                try:
+                    table = StructuredTable(dataset_info, records)
+                except Exception as e:
+                    print(f"Error loading table {dataset_info['name']}: {e}")
+                    continue
+                
+                if table.dimensions and table.measures:
+                    tables.append(table)
+        
+        return tables
+    
+    def detect_intent(
+        self,
+        query: str,
+        entities: Dict[str, List[str]]
+    ) -> Optional[Dict]:
+        """
+        Detect an aggregate/lookup intent from the query and extracted entities.
+        Returns None when the question is not a structured data question.
+        """
+        query_lower = query.lower()
+        
+        metrics = [m for m in entities.get('metrics', []) if m in MEASURE_KEYWORDS]
+        monsoon = 'monsoon' in entities.get('climate_terms', []) or 'monsoon' in query_lower
+        if not metrics and monsoon:
+            metrics = ['rainfall']
+        if not metrics:
+            return None
+        
+        aggregate = next(
+            (name for name, pattern in AGGREGATE_PATTERNS.items() if pattern.search(query_lower)),
+            None
+        )
+        
+        states = entities.get('states', [])
+        crops = entities.get('crops', [])
+        
+        year_range = extract_year_range(query_lower)
+        last_years = LAST_YEARS_PATTERN.search(query_lower)
+        
+        # Group-by dimensions
+        group_by = []
+        rank_match = RANK_PATTERN.search(query_lower)
+        rank_dim = None
+        if rank_match and aggregate in ('max', 'min'):
+            rank_dim = (rank_match.group(1) or rank_match.group(2)).rstrip('s')
+        
+        if len(states) > 1:
+            group_by.append('location')
+        if len(crops) > 1:
+            group_by.append('crop')
+        if rank_dim:
+            dim = 'location' if rank_dim == 'state' else rank_dim
+            if dim not in group_by:
+                group_by.append(dim)
+        if TREND_PATTERN.search(query_lower) and 'year' not in group_by:
+            group_by.append('year')
+        
+        if not (states or crops or aggregate or year_range):
+            return None
+        
+        if aggregate is None:
+            intent_type = 'lookup'
+        elif rank_dim:
+            intent_type = 'rank'
+        else:
+            intent_type = 'aggregate'
+        
+        # Lookups without explicit grouping are shown per year
+        if intent_type == 'lookup' and not group_by:
+            group_by.append('year')
+        
+        return {
+            'type': intent_type,
+            'metric': metrics[0],
+            'aggregate': aggregate,
+            'monsoon': monsoon,
+            'states': states,
+            'crops': crops,
+            'year_range': year_range,
+            'last_years': int(last_years.group(1)) if last_years else None,
+            'group_by': group_by,
+        }
+    
+    def _filter_mask(self, table: StructuredTable, intent: Dict) -> Optional[np.ndarray]:
+        """Vectorized row mask for the intent's filters (None if table can't apply them)"""
+        frame = table.frame
+        mask = np.ones(len(frame), dtype=bool)
+        
+        if intent['states']:
+            location = table.location_dimension()
+            if location is None:
+                return None
+            codes = table.match_codes(location, intent['states'])
+            mask &= np.isin(frame[location].cat.codes.to_numpy(), codes)
+        
+        if intent['crops']:
+            if 'crop' not in table.dimensions:
+                return None
+            codes = table.match_codes('crop', intent['crops'])
+            mask &= np.isin(frame['crop'].cat.codes.to_numpy(), codes)
+        
+        if intent['year_range'] or intent['last_years']:
+            if 'year' not in table.dimensions:
+                return None
+            years = frame['year'].to_numpy(dtype='float64', na_value=np.nan)
+            
+            if intent['year_range']:
+                start, end = intent['year_range']
+            else:
+                end = int(np.nanmax(years)) if np.isfinite(years).any() else 0
+                start = end - intent['last_years'] + 1
+            
+            mask &= (years >= start) & (years <= end)
+        
+        return mask
+    
+    def execute(self, intent: Dict) -> Optional[Dict]:
+        """Run the intent against the best matching table"""
+        started = time.perf_counter()
+        best = None
+        
+        for table in self.tables:
+            measure = table.resolve_measure(intent['metric'], intent['monsoon'])
+            if measure is None:
+                continue
+            
+            mask = self._filter_mask(table, intent)
+            if mask is None:
+                continue
+            
+            mask &= table.frame[measure].notna().to_numpy()
+            matched = int(mask.sum())
+            
+            if matched and (best is None or matched > best[2]):
+                best = (table, measure, matched, mask)
+        
+        if best is None:
+            return None
+        
+        table, measure, matched, mask = best
+        aggregate = intent['aggregate'] or (
+            'sum' if intent['metric'] in ADDITIVE_MEASURES else 'mean'
+        )
+        
+        group_cols = []
+        for dim in intent['group_by']:
+            column = table.location_dimension() if dim == 'location' else dim
+            if column and column in table.dimensions:
+                group_cols.append(column)
+        
+        subset = table.frame.loc[mask, group_cols + [measure]]
+        
+        if group_cols:
+            # Rank queries aggregate per group with the metric's natural
+            # aggregate, then order by max/min
+            group_agg = aggregate
+            if intent['type'] == 'rank':
+                group_agg = 'sum' if intent['metric'] in ADDITIVE_MEASURES else 'mean'
+            
+            grouped = subset.groupby(group_cols, observed=True)[measure].agg([group_agg, 'count'])
+            grouped = grouped.reset_index().rename(columns={group_agg: 'value'})
+            
+            if intent['type'] == 'rank':
+                grouped = grouped.sort_values('value', ascending=(aggregate == 'min')).head(5)
+            elif 'year' in group_cols:
+                grouped = grouped.sort_values(group_cols)
+            
+            rows = []
+            for record in grouped.to_dict('records'):
+                row = {col: record[col] for col in group_cols}
+                if 'year' in row:
+                    row['year'] = int(row['year'])
+                row['value'] = float(record['value'])
+                row['count'] = int(record['count'])
+                rows.append(row)
+        else:
+            value = subset[measure].agg(aggregate)
+            rows = [{'value': float(value), 'count': int(len(subset))}]
+        
+        if intent['type'] == 'rank':
+            aggregate = 'sum' if intent['metric'] in ADDITIVE_MEASURES else 'mean'
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        return {
+            'intent': intent,
+            'dataset_id': table.dataset_id,
+            'dataset_name': table.name,
+            'category': table.category,
+            'measure': measure,
+            'aggregate': aggregate,
+            'group_by': group_cols,
+            'rows': rows,
+            'matched_records': matched,
+            'elapsed_ms': round(elapsed_ms, 2),
+        }
+    
+    def format_result(self, result: Dict) -> str:
+        """Render an exact result as text for the LLM context or a direct answer"""
+        intent = result['intent']
+        
+        filters = []
+        if intent['states']:
+            filters.append(f"location: {', '.join(intent['states'])}")
+        if intent['crops']:
+            filters.append(f"crop: {', '.join(intent['crops'])}")
+        if intent['year_range']:
+            start, end = intent['year_range']
+            filters.append(f"years: {start}" if start == end else f"years: {start}-{end}")
+        elif intent['last_years']:
+            filters.append(f"years: last {intent['last_years']}")
+        
+        lines = [
+            f"# Exact computed result from {result['dataset_name']}",
+            f"Metric: {result['measure']} ({result['aggregate']} over {result['matched_records']} records)",
+        ]
+        if intent['type'] == 'rank':
+            order = 'highest' if intent['aggregate'] == 'max' else 'lowest'
+            lines.append(f"Ranking: top {len(result['rows'])} by {order} {result['aggregate']}")
+        if filters:
+            lines.append(f"Filters: {'; '.join(filters)}")
+        
+        for row in result['rows']:
+            labels = [f"{col} {row[col]}" for col in result['group_by']]
+            label = ", ".join(labels) if labels else result['aggregate']
+            lines.append(f"- {label}: {row['value']:,.2f}")
+        
+        return "\n".join(lines)
+    
+    def answer(
+        self,
+        query: str,
+        entities: Dict[str, List[str]]
+    ) -> Optional[Dict]:
+        """Detect intent and execute it; None when no structured answer applies"""
+        if not self.tables:
+            return None
+        
+        intent = self.detect_intent(query, entities)
+        if intent is None:
+            return None
+        
+        try:
+            result = self.execute(intent)
+        except Exception as e:
+            print(f"Error executing structured query: {e}")
+            return None
+        
+        if result is None:
+            return None
+        
+        result['text'] = self.format_result(result)
+        return result
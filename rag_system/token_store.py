@@ -0,0 +1,154 @@
+import os
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from rag_system.cache import document_fingerprint
+
+
+class DocumentTokenStore:
+    """
+    Document-side token ids for the cross-encoder, tokenized once per index
+    build and kept as one flat int32 array with per-document offsets.
+    Pair inputs ([CLS] query [SEP] document [SEP]) are assembled from the
+    stored ids with the tokenizer's longest-first truncation.
+    """
+    
+    def __init__(self, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        
+        self.ids = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.rows: Dict[str, int] = {}
+        self.version = None
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def tokenize(self, texts: List[str]) -> List[List[int]]:
+        """Token ids without special tokens, capped at max_length (never needed beyond that)"""
+        return self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.max_length
+        )["input_ids"]
+    
+    def build(self, documents: List[Document], version: str, batch_size: int = 256):
+        """Tokenize every distinct document once"""
+        texts = []
+        self.rows = {}
+        for doc in documents:
+            key = document_fingerprint(doc.page_content)
+            if key not in self.rows:
+                self.rows[key] = len(texts)
+                texts.append(doc.page_content)
+        
+        token_ids = []
+        for start in range(0, len(texts), batch_size):
+            token_ids.extend(self.tokenize(texts[start:start + batch_size]))
+        
+        lengths = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.ids = (
+            np.concatenate([np.asarray(ids, dtype=np.int32) for ids in token_ids])
+            if token_ids else np.zeros(0, dtype=np.int32)
+        )
+        self.version = version
+    
+    def save(self, path: str):
+        keys = sorted(self.rows, key=self.rows.get)
+        np.savez(path, ids=self.ids, offsets=self.offsets, keys=np.array(keys), version=np.array(self.version))
+    
+    def load(self, path: str, version: str) -> bool:
+        """Load stored ids if they were built for this version; returns success"""
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            with np.load(path) as data:
+                if str(data['version']) != version:
+                    return False
+                self.ids = data['ids']
+                self.offsets = data['offsets']
+                self.rows = {str(key): row for row, key in enumerate(data['keys'])}
+            self.version = version
+            return True
+        except Exception as e:
+            print(f"Could not load document token ids: {e}")
+            return False
+    
+    def document_ids(self, documents: List[Document]) -> List[np.ndarray]:
+        """Stored ids per document; documents not in the store are tokenized now"""
+        result: List[Optional[np.ndarray]] = []
+        missing = []
+        
+        for i, doc in enumerate(documents):
+            row = self.rows.get(document_fingerprint(doc.page_content))
+            if row is None:
+                result.append(None)
+                missing.append(i)
+            else:
+                result.append(self.ids[self.offsets[row]:self.offsets[row + 1]])
+        
+        if missing:
+            for i, ids in zip(missing, self.tokenize([documents[i].page_content for i in missing])):
+                result[i] = np.asarray(ids, dtype=np.int32)
+        
+        return result
+    
+    def _truncated_lengths(self, query_len: int, doc_len: int) -> Tuple[int, int]:
+        """Longest-first truncation: the shorter side is kept whole when it fits in half the budget"""
+        budget = self.max_length - 3
+        if query_len + doc_len <= budget:
+            return query_len, doc_len
+        
+        shorter = min(query_len, doc_len)
+        if shorter <= budget - shorter:
+            return (query_len, budget - query_len) if query_len <= doc_len else (budget - doc_len, doc_len)
+        
+        # Both longer than half: split evenly, the longer side (or the document on ties) gets the odd token
+        half, odd = budget // 2, budget % 2
+        return (half + odd, half) if query_len > doc_len else (half, half + odd)
+    
+    def pair_inputs(self, query_ids: List[int], doc_ids: List[np.ndarray]) -> Dict[str, np.ndarray]:
+        """Padded input_ids, token_type_ids and attention_mask for one query against documents"""
+        return self.batch_inputs([(query_ids, ids) for ids in doc_ids])
+    
+    def batch_inputs(self, rows: List[Tuple[List[int], np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Padded model inputs for (query ids, document ids) rows, possibly from different queries"""
+        cls_id, sep_id = self.tokenizer.cls_token_id, self.tokenizer.sep_token_id
+        pad_id = self.tokenizer.pad_token_id or 0
+        
+        lengths = [self._truncated_lengths(len(query_ids), len(ids)) for query_ids, ids in rows]
+        
+        width = max(query_len + doc_len + 3 for query_len, doc_len in lengths)
+        input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+        token_type_ids = np.zeros((len(rows), width), dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        
+        for i, ((query_ids, ids), (query_len, doc_len)) in enumerate(zip(rows, lengths)):
+            first_end = query_len + 2
+            total = first_end + doc_len + 1
+            input_ids[i, 0] = cls_id
+            input_ids[i, 1:query_len + 1] = query_ids[:query_len]
+            input_ids[i, query_len + 1] = sep_id
+            input_ids[i, first_end:total - 1] = ids[:doc_len]
+            input_ids[i, total - 1] = sep_id
+            token_type_ids[i, first_end:total] = 1
+            attention_mask[i, :total] = 1
+        
+        return {'input_ids': input_ids, 'token_type_ids': token_type_ids, 'attention_mask': attention_mask}
+    
+    def matches_tokenizer(self, query: str, text: str) -> bool:
+        """Check that assembled inputs equal the tokenizer's own pair encoding"""
+        expected = self.tokenizer(query, text, truncation=True, max_length=self.max_length)
+        assembled = self.pair_inputs(
+            self.tokenize([query])[0],
+            [np.asarray(self.tokenize([text])[0], dtype=np.int32)]
+        )
+        return (
+            list(assembled['input_ids'][0]) == list(expected['input_ids']) and
+            ('token_type_ids' not in expected or
+             list(assembled['token_type_ids'][0]) == list(expected['token_type_ids']))
+        )
@@ -72,6 +72,8 @@ function addMessage(content, role) {
         top: messagesContainer.scrollHeight,
         behavior: 'smooth'
     });
+    
+    return contentDiv;
 }
 
 function showLoadingMessage() {
@@ -148,6 +150,14 @@ function displayPipelineInfo(pipelineInfo) {
         { label: 'Final Context', value: pipelineInfo.final_context_count || 0 }
     ];
     
+    // Time to first token is the headline latency
+    if (pipelineInfo.latency) {
+        stats.unshift(
+            { label: 'Time to First Token', value: `${Math.round(pipelineInfo.latency.time_to_first_token_ms)} ms` },
+            { label: 'Total Time', value: `${Math.round(pipelineInfo.latency.total_ms)} ms` }
+        );
+    }
+    
     stats.forEach((stat, index) => {
         const statDiv = document.createElement('div');
         statDiv.className = 'stat-item';
@@ -180,6 +190,108 @@ function displayPipelineInfo(pipelineInfo) {
     }
 }
 
+// === STREAMING ANSWERS ===
+function parseServerEvent(raw) {
+    let event = 'message';
+    const dataLines = [];
+    
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+// Streams the answer into a new message as tokens arrive; returns the final
+// payload, or null when streaming isn't available (caller falls back)
+async function streamAnswer(question) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            question: question,
+            session_id: sessionId
+        })
+    });
+    
+    if (!response.ok || !response.body) {
+        return null;
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const messagesContainer = document.getElementById('chatMessages');
+    let buffer = '';
+    let answerText = '';
+    let contentDiv = null;
+    let renderPending = false;
+    let result = null;
+    
+    const render = () => {
+        renderPending = false;
+        contentDiv.innerHTML = marked.parse(answerText);
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    };
+    
+    const handleEvent = ({ event, data }) => {
+        if (event === 'token') {
+            if (!contentDiv) {
+                removeLoadingMessage();
+                contentDiv = addMessage('', 'assistant');
+            }
+            answerText += data.content;
+            if (!renderPending) {
+                renderPending = true;
+                requestAnimationFrame(render);
+            }
+        } else if (event === 'final') {
+            // Replace the raw streamed text with the cleaned answer
+            removeLoadingMessage();
+            if (!contentDiv) {
+                contentDiv = addMessage('', 'assistant');
+            }
+            answerText = data.answer;
+            render();
+            result = data;
+        } else if (event === 'error') {
+            result = data;
+        }
+    };
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        events.filter(raw => raw.trim()).forEach(raw => handleEvent(parseServerEvent(raw)));
+    }
+    
+    if (buffer.trim()) {
+        handleEvent(parseServerEvent(buffer));
+    }
+    
+    return result || { error: 'Stream ended before the answer was complete' };
+}
+
+async function fetchAnswer(question) {
+    const response = await fetch('/api/chat', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            question: question,
+            session_id: sessionId
+        })
+    });
+    
+    return response.json();
+}
+
 // === SEND QUESTION ===
 async function sendQuestion(question) {
     const sendBtn = document.getElementById('sendBtn');
@@ -201,16 +313,9 @@ async function sendQuestion(question) {
     updatePipelineStatus('processing');
     
     try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                question: question,
-                session_id: sessionId
-            })
-        });
-        
-        const data = await response.json();
+        // Stream the answer; fall back to the blocking endpoint
+        const streamed = await streamAnswer(question);
+        const data = streamed || await fetchAnswer(question);
         
         // Remove loading
         removeLoadingMessage();
@@ -219,7 +324,9 @@ async function sendQuestion(question) {
             addMessage(`⚠️ Error: ${data.error}`, 'assistant');
             updatePipelineStatus('error');
         } else {
-            addMessage(data.answer, 'assistant');
+            if (!streamed) {
+                addMessage(data.answer, 'assistant');
+            }
             displaySources(data.sources);
             if (data.pipeline_info) {
                 displayPipelineInfo(data.pipeline_info);